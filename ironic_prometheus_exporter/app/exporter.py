@@ -10,13 +10,16 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import configparser
 import logging
-import os
+import time
 
 from flask import abort
 from flask import Flask
+from flask import request
 from flask import Response
+from werkzeug.http import is_resource_modified
+
+from ironic_prometheus_exporter.app import scrape
 
 
 application = Flask(__name__)
@@ -25,22 +28,41 @@ LOG = logging.getLogger(__name__)
 
 @application.route('/metrics', methods=['GET'])
 def prometheus_metrics():
+    deadline = scrape.scrape_deadline(request.environ, time.monotonic())
     try:
-        config = configparser.ConfigParser()
-        config.read(os.environ.get('IRONIC_CONFIG'))
-        DIR = config['oslo_messaging_notifications']['location']
+        DIR, max_age = scrape.load_config()
     except Exception:
         LOG.exception('Unexpected error')
         abort(500)
 
-    all_files = [os.path.join(DIR, name) for name in os.listdir(DIR)
-                 if os.path.isfile(os.path.join(DIR, name))]
+    all_files = scrape.list_metrics_files(DIR)
+    stale_files = []
+    if max_age > 0:
+        all_files, stale_files = scrape.split_stale_files(
+            all_files, max_age, time.time())
+
+    etag, last_modified = scrape.version_token(
+        all_files, stale_files, max_age, DIR)
+
+    if not is_resource_modified(request.environ, etag=etag,
+                                last_modified=last_modified):
+        response = Response(status=304)
+    elif deadline is not None and scrape.CURSOR.may_overrun(
+            deadline, time.monotonic()):
+        # NOTE: The response may be truncated, it must not be validated
+        # against a version computed from all the files.
+        return Response(
+            scrape.merge_content(scrape.CURSOR.rotate(all_files),
+                                 stale_files, deadline),
+            mimetype='text/plain')
+    else:
+        response = Response(scrape.merge_content(all_files, stale_files),
+                            mimetype='text/plain')
 
-    def merge_content():
-        for file_name in all_files:
-            with open(file_name, 'r') as file:
-                yield file.read()
-    return Response(merge_content(), mimetype='text/plain')
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
 
 
 if __name__ == '__main__':
@@ -0,0 +1,119 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Plain WSGI implementation of the exporter application.
+
+It serves the same ``/metrics`` endpoint as the Flask application in
+:mod:`ironic_prometheus_exporter.app.exporter` without importing Flask, which
+keeps the start up time and the memory footprint of each application server
+worker down. Use ``ironic_prometheus_exporter.app.minimal:application`` as
+the WSGI entry point to select it.
+"""
+
+import datetime
+import email.utils
+import logging
+import time
+
+from ironic_prometheus_exporter.app import scrape
+
+
+LOG = logging.getLogger(__name__)
+
+
+def _is_not_modified(environ, etag, last_modified):
+    if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        # NOTE: If-None-Match takes precedence over If-Modified-Since and
+        # uses the weak comparison, see RFC 9110 section 13.1.2.
+        quoted = '"%s"' % etag
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            if tag == '*' or tag.removeprefix('W/') == quoted:
+                return True
+        return False
+
+    if_modified_since = environ.get('HTTP_IF_MODIFIED_SINCE')
+    if if_modified_since and last_modified is not None:
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=datetime.timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def _encode(chunks):
+    try:
+        for chunk in chunks:
+            yield chunk.encode('utf-8')
+    finally:
+        chunks.close()
+
+
+def application(environ, start_response):
+    if environ.get('PATH_INFO') != '/metrics':
+        start_response('404 Not Found',
+                       [('Content-Type', 'text/plain; charset=utf-8')])
+        return [b'Not Found']
+
+    method = environ.get('REQUEST_METHOD')
+    if method not in ('GET', 'HEAD'):
+        start_response('405 Method Not Allowed',
+                       [('Content-Type', 'text/plain; charset=utf-8'),
+                        ('Allow', 'GET, HEAD')])
+        return [b'Method Not Allowed']
+
+    deadline = scrape.scrape_deadline(environ, time.monotonic())
+    try:
+        DIR, max_age = scrape.load_config()
+    except Exception:
+        LOG.exception('Unexpected error')
+        start_response('500 Internal Server Error',
+                       [('Content-Type', 'text/plain; charset=utf-8')])
+        return [b'Internal Server Error']
+
+    all_files = scrape.list_metrics_files(DIR)
+    stale_files = []
+    if max_age > 0:
+        all_files, stale_files = scrape.split_stale_files(
+            all_files, max_age, time.time())
+    etag, last_modified = scrape.version_token(
+        all_files, stale_files, max_age, DIR)
+
+    headers = [('ETag', '"%s"' % etag)]
+    if last_modified is not None:
+        headers.append(('Last-Modified', email.utils.format_datetime(
+            last_modified, usegmt=True)))
+
+    if _is_not_modified(environ, etag, last_modified):
+        start_response('304 Not Modified', headers)
+        return []
+
+    if deadline is not None and scrape.CURSOR.may_overrun(
+            deadline, time.monotonic()):
+        # NOTE: The response may be truncated, it must not be validated
+        # against a version computed from all the files.
+        start_response('200 OK',
+                       [('Content-Type', 'text/plain; charset=utf-8')])
+        if method == 'HEAD':
+            return []
+        return _encode(scrape.merge_content(
+            scrape.CURSOR.rotate(all_files), stale_files, deadline))
+
+    headers.insert(0, ('Content-Type', 'text/plain; charset=utf-8'))
+    start_response('200 OK', headers)
+    if method == 'HEAD':
+        return []
+    return _encode(scrape.merge_content(all_files, stale_files))
@@ -0,0 +1,310 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Flask independent helpers to serve the metrics directory.
+
+They are shared by the Flask application and the plain WSGI application.
+"""
+
+import configparser
+import datetime
+import hashlib
+import os
+import re
+import threading
+import time
+
+
+# NOTE: Prometheus sends the scrape timeout in this header, the exporter stops
+# reading files once this fraction of it has elapsed so that what was read
+# so far can still be sent before Prometheus gives up on the scrape.
+SCRAPE_TIMEOUT_HEADER = 'HTTP_X_PROMETHEUS_SCRAPE_TIMEOUT_SECONDS'
+SCRAPE_TIMEOUT_FRACTION = 0.8
+
+# NOTE: messaging.write_textfile writes to <path>.<pid>.<thread id> before
+# renaming the file to <path>.
+TEMP_FILE_RE = re.compile(r'\.\d+\.\d+$')
+
+
+def load_config():
+    """Read the exporter options from the file set in IRONIC_CONFIG.
+
+    :returns: Tuple of the metrics directory and the max_age option.
+    """
+    config = configparser.ConfigParser()
+    config.read(os.environ.get('IRONIC_CONFIG'))
+    section = config['oslo_messaging_notifications']
+    return section['location'], section.getint('max_age', fallback=0)
+
+
+def list_metrics_files(directory):
+    """List the metrics files in a directory along with their stat data.
+
+    The temporary files of the notifier driver are skipped, as are the files
+    removed while the directory is listed.
+
+    :param directory: Directory the notifier driver writes the files to.
+    :returns: List of ``(path, os.stat_result)`` tuples for regular files.
+    """
+    files = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if TEMP_FILE_RE.search(entry.name):
+                continue
+            try:
+                if entry.is_file():
+                    files.append((entry.path, entry.stat()))
+            except FileNotFoundError:
+                continue
+    return files
+
+
+def split_stale_files(files, max_age, now):
+    """Separate the files that were not updated in the last max_age seconds.
+
+    Only the stat data gathered when listing the directory is used.
+
+    :param files: List of ``(path, os.stat_result)`` tuples.
+    :param max_age: Maximum age in seconds of the files to serve.
+    :param now: Current time in seconds since the epoch.
+    :returns: Tuple of the lists of fresh and stale files.
+    """
+    fresh = []
+    stale = []
+    oldest = now - max_age
+    for path, stat in files:
+        if stat.st_mtime < oldest:
+            stale.append((path, stat))
+        else:
+            fresh.append((path, stat))
+    return fresh, stale
+
+
+def _escape_label_value(value):
+    return (value.replace('\\', '\\\\').replace('\n', '\\n')
+            .replace('"', '\\"'))
+
+
+def render_stale_files(stale_files):
+    """Render the freshness gauge of the files excluded for being stale.
+
+    The metrics files are named ``<node>-<event_type>`` by the notifier
+    driver, the gauge carries both parts as labels and the last modification
+    time of the file as value, so that alerts can tell how long a node has
+    been silent.
+
+    :param stale_files: List of ``(path, os.stat_result)`` tuples.
+    :returns: The gauge in the text exposition format.
+    """
+    if not stale_files:
+        return ''
+    metric = 'ironic_exporter_stale_metrics_timestamp_seconds'
+    lines = ['# HELP %s Last update of the metrics excluded from the '
+             'scrape for being older than max_age.' % metric,
+             '# TYPE %s gauge' % metric]
+    for path, stat in stale_files:
+        node, _sep, event_type = os.path.basename(path).rpartition('-')
+        if not node:
+            node, event_type = event_type, ''
+        lines.append('%s{node="%s",event_type="%s"} %r' % (
+            metric, _escape_label_value(node),
+            _escape_label_value(event_type), float(stat.st_mtime)))
+    return '\n'.join(lines) + '\n'
+
+
+def version_token(files, stale_files=(), max_age=0, directory=None):
+    """Compute a cheap version of the metrics served for a directory index.
+
+    Files are always replaced as a whole by the notifier driver, so a change
+    in any of them shows up in its inode, size or modification time and no
+    file content needs to be read.
+
+    The last modification time must also move forward when the output
+    changes without any file being written: the modification time of the
+    directory covers files being removed, and a file excluded for being
+    stale changed the output when it passed ``max_age``.
+
+    :param files: List of ``(path, os.stat_result)`` tuples.
+    :param stale_files: List of ``(path, os.stat_result)`` tuples of the
+        files excluded for being stale.
+    :param max_age: Maximum age in seconds the stale files were split by.
+    :param directory: Directory the files were listed from.
+    :returns: Tuple of the entity tag and the last modification time as a
+        timezone aware datetime. The latter is None when there are no files
+        and no directory.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    last_mtime = None
+    for path, stat in files:
+        digest.update(b'%s\0%d\0%d\0%d\n' % (
+            os.fsencode(path), stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        if last_mtime is None or stat.st_mtime > last_mtime:
+            last_mtime = stat.st_mtime
+    for path, stat in stale_files:
+        digest.update(b'stale\0%s\0%d\0%d\n' % (
+            os.fsencode(path), stat.st_ino, stat.st_mtime_ns))
+        if last_mtime is None or stat.st_mtime + max_age > last_mtime:
+            last_mtime = stat.st_mtime + max_age
+    if directory is not None:
+        dir_mtime = os.stat(directory).st_mtime
+        if last_mtime is None or dir_mtime > last_mtime:
+            last_mtime = dir_mtime
+    last_modified = None
+    if last_mtime is not None:
+        last_modified = datetime.datetime.fromtimestamp(
+            last_mtime, tz=datetime.timezone.utc)
+    return digest.hexdigest(), last_modified
+
+
+class ScrapeCursor(object):
+    """Remember where a scrape truncated by its timeout stopped reading.
+
+    The next scrape with a timeout starts from that file, so that files that
+    were skipped get served first instead of being skipped every time. The
+    time the last complete read of the files took is kept as well, to only
+    read up to a deadline when it can actually be reached. Until a read
+    completes, the deadline is assumed to be reachable.
+
+    The cursor is shared by the requests served by the threads of a process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.next_file = None
+        self.read_time = None
+
+    def rotate(self, files):
+        """Reorder the files to start from the first one not read last time.
+
+        :param files: List of ``(path, os.stat_result)`` tuples.
+        :returns: The rotated list of files.
+        """
+        with self.lock:
+            next_file = self.next_file
+        if next_file is not None:
+            for index, (path, _stat) in enumerate(files):
+                if path == next_file:
+                    return files[index:] + files[:index]
+        return files
+
+    def may_overrun(self, deadline, now):
+        """Whether reading all the files may not be done by the deadline.
+
+        :param deadline: ``time.monotonic()`` value after which no more files
+            can be read.
+        :param now: Current ``time.monotonic()`` value.
+        """
+        with self.lock:
+            if self.next_file is not None:
+                # The files skipped last time were not served yet.
+                return True
+            return self.read_time is None or (
+                now + self.read_time >= deadline)
+
+    def stop_at(self, path):
+        with self.lock:
+            self.next_file = path
+
+    def interrupt(self, path, read_time):
+        """Record a read the client gave up on, likely for its timeout.
+
+        :param path: First file not served, None when all were.
+        :param read_time: Time spent reading until then, a lower bound of
+            the time a complete read takes.
+        """
+        with self.lock:
+            self.next_file = path
+            self.read_time = max(self.read_time or 0.0, read_time)
+
+    def finish(self, read_time):
+        with self.lock:
+            self.next_file = None
+            self.read_time = read_time
+
+    def reset(self):
+        with self.lock:
+            self.next_file = None
+            self.read_time = None
+
+
+CURSOR = ScrapeCursor()
+
+
+def scrape_deadline(environ, now):
+    """Compute until when files can be read, from the scrape timeout header.
+
+    :param environ: WSGI environment of the request.
+    :param now: Current ``time.monotonic()`` value.
+    :returns: The deadline, or None when the request has no valid timeout.
+    """
+    try:
+        timeout = float(environ[SCRAPE_TIMEOUT_HEADER])
+    except (KeyError, ValueError):
+        return None
+    if timeout <= 0:
+        return None
+    return now + timeout * SCRAPE_TIMEOUT_FRACTION
+
+
+def render_scrape_status(skipped):
+    """Render the gauges telling whether the scrape read all the files.
+
+    :param skipped: Number of files not read to honor the scrape timeout.
+    :returns: The gauges in the text exposition format.
+    """
+    return (
+        '# HELP ironic_exporter_scrape_truncated Whether the scrape stopped '
+        'reading metrics files to honor the scrape timeout.\n'
+        '# TYPE ironic_exporter_scrape_truncated gauge\n'
+        'ironic_exporter_scrape_truncated %d\n'
+        '# HELP ironic_exporter_scrape_skipped_files Metrics files not read '
+        'to honor the scrape timeout.\n'
+        '# TYPE ironic_exporter_scrape_skipped_files gauge\n'
+        'ironic_exporter_scrape_skipped_files %d\n'
+        % (bool(skipped), skipped))
+
+
+def merge_content(files, stale_files=(), deadline=None):
+    """Yield the content of the metrics files followed by the stale gauge.
+
+    When a deadline is given, reading stops once it is reached and the
+    scrape status gauges are appended to the output.
+
+    :param files: List of ``(path, os.stat_result)`` tuples to serve.
+    :param stale_files: List of ``(path, os.stat_result)`` tuples of the
+        files excluded for being stale.
+    :param deadline: ``time.monotonic()`` value after which no more files
+        are read.
+    """
+    skipped = 0
+    started = time.monotonic()
+    index = 0
+    try:
+        for index, (file_name, _stat) in enumerate(files):
+            if deadline is not None and time.monotonic() >= deadline:
+                skipped = len(files) - index
+                CURSOR.stop_at(file_name)
+                break
+            with open(file_name, 'r') as file:
+                yield file.read()
+        else:
+            CURSOR.finish(time.monotonic() - started)
+    except GeneratorExit:
+        # NOTE: the server closes the response when the client goes away,
+        # the file yielded last was served.
+        next_file = files[index + 1][0] if index + 1 < len(files) else None
+        CURSOR.interrupt(next_file, time.monotonic() - started)
+        raise
+    if stale_files:
+        yield render_stale_files(stale_files)
+    if deadline is not None:
+        yield render_scrape_status(skipped)
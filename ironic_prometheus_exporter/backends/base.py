@@ -0,0 +1,220 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Output backends pushing the parsed metrics over HTTP.
+
+With an output backend the notifier driver does not write metrics files,
+it hands the registry of each notification to the backend which converts
+its samples and buffers them. A background thread sends them in batches, so
+the notification path never waits for the network.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from ironic_prometheus_exporter import self_metrics
+
+
+LOG = logging.getLogger(__name__)
+
+GROUP = 'oslo_messaging_notifications'
+
+# NOTE: requests that could not be sent are spooled to disk when a spool
+# directory is set, the oldest ones are removed past this many files.
+SPOOL_MAX_FILES = 1000
+
+RETRY_BACKOFF = 0.5
+
+
+class BatchingBackend(object):
+    """Buffer converted samples and send them in batches.
+
+    Subclasses implement :meth:`convert` and :meth:`encode`.
+
+    :param url: URL the batches are POSTed to.
+    :param batch_size: Maximum number of items sent in a request.
+    :param flush_interval: Seconds between two flushes of the buffer, a
+        flush also happens as soon as a batch is full.
+    :param retries: Times a failed request is retried.
+    :param timeout: Seconds to wait for the receiver to answer.
+    :param max_buffer: Items kept in the buffer, the oldest ones are
+        dropped past this number. Unbounded when None.
+    :param spool_dir: Directory the requests that could not be sent are
+        written to, they are sent again after the next successful request.
+        When None they are dropped.
+    """
+
+    name = None
+    headers = {}
+
+    def __init__(self, url, batch_size, flush_interval, retries=3,
+                 timeout=10, max_buffer=None, spool_dir=None):
+        self.url = url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.timeout = timeout
+        self.max_buffer = max_buffer
+        self.spool_dir = spool_dir
+        if spool_dir and not os.path.exists(spool_dir):
+            os.makedirs(spool_dir)
+
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='%s-flush' % self.name)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def convert(self, registry, timestamp):
+        """Convert the samples of a registry to buffered items.
+
+        :param registry: Registry of the parsed notification.
+        :param timestamp: Time of the notification in seconds since the
+            epoch, used as the time of the samples.
+        :returns: List of items.
+        """
+        raise NotImplementedError()
+
+    def encode(self, items):
+        """Encode a batch of items into the body of a request."""
+        raise NotImplementedError()
+
+    def submit(self, registry, timestamp):
+        """Buffer the samples of a registry.
+
+        :returns: Number of items buffered.
+        """
+        items = self.convert(registry, timestamp)
+        with self._lock:
+            self._buffer.extend(items)
+            overflow = 0
+            if self.max_buffer is not None:
+                overflow = len(self._buffer) - self.max_buffer
+            if overflow > 0:
+                del self._buffer[:overflow]
+            full = len(self._buffer) >= self.batch_size
+        if overflow > 0:
+            LOG.warning('The %s buffer is full, dropped %d samples',
+                        self.name, overflow)
+            self._count('dropped', overflow)
+        if full:
+            self._wakeup.set()
+        return len(items)
+
+    def _count(self, result, count):
+        self_metrics.BACKEND_SAMPLES.labels(self.name, result).inc(count)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                LOG.exception('Failed to flush the %s buffer', self.name)
+
+    def flush(self):
+        """Send everything buffered so far."""
+        while True:
+            with self._lock:
+                batch = self._buffer[:self.batch_size]
+                del self._buffer[:self.batch_size]
+            if not batch:
+                return
+            self._send_batch(batch)
+
+    def close(self):
+        """Stop the flush thread and send what is left in the buffer."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join()
+        self.flush()
+
+    def _send_batch(self, batch):
+        body = self.encode(batch)
+        result = self._post(body)
+        if result == 'sent':
+            self._count('sent', len(batch))
+            self._send_spooled()
+        elif result == 'failed' and self.spool_dir:
+            self._spool(body)
+            self._count('spooled', len(batch))
+        else:
+            self._count('dropped', len(batch))
+
+    def _post(self, body):
+        """POST a request body, retrying on server and network errors.
+
+        :returns: 'sent', 'failed' when the retries are exhausted or
+            'rejected' when the receiver refused the request.
+        """
+        for attempt in range(self.retries + 1):
+            request = urllib.request.Request(self.url, data=body,
+                                             headers=self.headers,
+                                             method='POST')
+            try:
+                with urllib.request.urlopen(request,
+                                            timeout=self.timeout) as resp:
+                    resp.read()
+                return 'sent'
+            except urllib.error.HTTPError as e:
+                if e.code < 500 and e.code != 429:
+                    LOG.error('%s rejected a %s request: %s', self.url,
+                              self.name, e)
+                    return 'rejected'
+                error = e
+            except OSError as e:
+                error = e
+            LOG.warning('Failed to send a %s request to %s (attempt %d of '
+                        '%d): %s', self.name, self.url, attempt + 1,
+                        self.retries + 1, error)
+            if attempt < self.retries:
+                time.sleep(RETRY_BACKOFF * 2 ** attempt)
+        return 'failed'
+
+    def _spool(self, body):
+        path = os.path.join(self.spool_dir, '%020d-%d.%s' % (
+            time.time_ns(), os.getpid(), self.name))
+        with open(path + '.tmp', 'wb') as f:
+            f.write(body)
+        os.replace(path + '.tmp', path)
+        spooled = self._spooled_files()
+        for old in spooled[:len(spooled) - SPOOL_MAX_FILES]:
+            LOG.warning('Removing spooled %s request %s', self.name, old)
+            os.remove(old)
+
+    def _spooled_files(self):
+        suffix = '.' + self.name
+        return [os.path.join(self.spool_dir, name)
+                for name in sorted(os.listdir(self.spool_dir))
+                if name.endswith(suffix)]
+
+    def _send_spooled(self):
+        if not self.spool_dir:
+            return
+        for path in self._spooled_files():
+            with open(path, 'rb') as f:
+                body = f.read()
+            result = self._post(body)
+            if result == 'failed':
+                return
+            os.remove(path)
@@ -0,0 +1,67 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compression of the requests sent by the output backends.
+
+Gzip is used by the OTLP backend. Snappy, in the block format required by
+the remote write protocol, uses the python-snappy library when it is
+installed. Otherwise the data is wrapped in literal elements only: the result
+is valid for any snappy decoder but not compressed, trading bandwidth for not
+requiring the library.
+"""
+
+import gzip
+import struct
+
+from ironic_prometheus_exporter.backends import protobuf
+
+try:
+    import snappy as _snappy
+except ImportError:
+    _snappy = None
+
+
+# NOTE: the longest literal a snappy element can describe with a 2 bytes
+# length, larger inputs are split in several literals.
+MAX_LITERAL = 1 << 16
+
+
+def _literal(chunk):
+    length = len(chunk) - 1
+    if length < 60:
+        return bytes([length << 2]) + chunk
+    if length < 1 << 8:
+        return bytes([60 << 2, length]) + chunk
+    return bytes([61 << 2]) + struct.pack('<H', length) + chunk
+
+
+def compress_literals(data):
+    """Encode data in the snappy block format without compressing it."""
+    out = [protobuf.varint(len(data))]
+    view = memoryview(data)
+    for start in range(0, len(data), MAX_LITERAL):
+        out.append(_literal(bytes(view[start:start + MAX_LITERAL])))
+    return b''.join(out)
+
+
+def snappy_compress(data):
+    """Encode data in the snappy block format."""
+    if _snappy is not None:
+        return _snappy.compress(data)
+    return compress_literals(data)
+
+
+def gzip_compress(data):
+    """Compress data with gzip."""
+    # NOTE: a low level is enough for the protobuf requests, most of their
+    # size is in repeated label names and values.
+    return gzip.compress(data, compresslevel=1)
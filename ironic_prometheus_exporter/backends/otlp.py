@@ -0,0 +1,160 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""OpenTelemetry (OTLP/HTTP) output backend.
+
+The samples are sent as an ``ExportMetricsServiceRequest``, protobuf
+encoded, to the ``/v1/metrics`` endpoint of a collector. The fields used
+are::
+
+    message ExportMetricsServiceRequest {
+        repeated ResourceMetrics resource_metrics = 1; }
+    message ResourceMetrics { Resource resource = 1;
+                              repeated ScopeMetrics scope_metrics = 2; }
+    message Resource { repeated KeyValue attributes = 1; }
+    message ScopeMetrics { InstrumentationScope scope = 1;
+                           repeated Metric metrics = 2; }
+    message InstrumentationScope { string name = 1; }
+    message Metric { string name = 1; string description = 2;
+                     oneof data { Gauge gauge = 5; Sum sum = 7; } }
+    message Gauge { repeated NumberDataPoint data_points = 1; }
+    message Sum { repeated NumberDataPoint data_points = 1;
+                  AggregationTemporality aggregation_temporality = 2;
+                  bool is_monotonic = 3; }
+    message NumberDataPoint { fixed64 time_unix_nano = 3;
+                              double as_double = 4;
+                              repeated KeyValue attributes = 7; }
+    message KeyValue { string key = 1; AnyValue value = 2; }
+    message AnyValue { string string_value = 1; }
+
+Prometheus counters become monotonic cumulative sums, every other sample a
+gauge named after the sample.
+"""
+
+import socket
+
+from oslo_config import cfg
+
+from ironic_prometheus_exporter.backends import base
+from ironic_prometheus_exporter.backends import compression
+from ironic_prometheus_exporter.backends import protobuf
+
+
+SCOPE = 'ironic_prometheus_exporter'
+
+GAUGE = 5
+SUM = 7
+
+AGGREGATION_TEMPORALITY_CUMULATIVE = 2
+
+
+def key_value(field, key, value):
+    """Encode a string attribute as a ``KeyValue`` field."""
+    return protobuf.message_field(
+        field, protobuf.string_field(1, key),
+        protobuf.message_field(2, protobuf.string_field(1, value)))
+
+
+def encode_data_point(labels, value, time_unix_nano):
+    """Encode a sample as a ``data_points`` field."""
+    fields = [protobuf.fixed64_field(3, time_unix_nano),
+              protobuf.double_field(4, value)]
+    for label, label_value in sorted(labels.items()):
+        fields.append(key_value(7, label, label_value))
+    return protobuf.message_field(1, *fields)
+
+
+def encode_metric(name, description, kind, data_points):
+    """Encode the data points of a metric as a ``metrics`` field."""
+    data = list(data_points)
+    if kind == SUM:
+        data.append(protobuf.int64_field(
+            2, AGGREGATION_TEMPORALITY_CUMULATIVE))
+        data.append(protobuf.int64_field(3, 1))
+    return protobuf.message_field(
+        2, protobuf.string_field(1, name),
+        protobuf.string_field(2, description),
+        protobuf.message_field(kind, *data))
+
+
+class OTLPBackend(base.BatchingBackend):
+    """Push the samples to an OpenTelemetry collector.
+
+    :param compress: Whether the requests are compressed with gzip.
+    :param headers: Extra HTTP headers sent with the requests, e.g. for
+        authentication.
+    :param resource_attributes: Attributes of the resource the metrics are
+        reported for.
+    """
+
+    name = 'otlp'
+
+    def __init__(self, url, batch_size, flush_interval, compress=True,
+                 headers=None, resource_attributes=None, **kwargs):
+        self.compress = compress
+        self.headers = {'Content-Type': 'application/x-protobuf'}
+        if compress:
+            self.headers['Content-Encoding'] = 'gzip'
+        self.headers.update(headers or {})
+        attributes = sorted((resource_attributes or {}).items())
+        self.resource = protobuf.message_field(
+            1, *[key_value(1, key, value) for key, value in attributes])
+        super(OTLPBackend, self).__init__(url, batch_size, flush_interval,
+                                          **kwargs)
+
+    @classmethod
+    def from_conf(cls, conf):
+        options = conf.oslo_messaging_notifications
+        if not options.otlp_endpoint:
+            raise cfg.RequiredOptError('otlp_endpoint',
+                                       cfg.OptGroup(base.GROUP))
+        return cls(options.otlp_endpoint,
+                   batch_size=options.otlp_batch_size,
+                   flush_interval=options.otlp_flush_interval,
+                   compress=options.otlp_compression == 'gzip',
+                   headers=options.otlp_headers,
+                   resource_attributes={'service.name': SCOPE,
+                                        'host.name': socket.gethostname()},
+                   retries=options.otlp_retries,
+                   timeout=options.otlp_timeout,
+                   max_buffer=options.otlp_max_buffer)
+
+    def convert(self, registry, timestamp):
+        default_ns = round(timestamp * 1e6) * 1000
+        items = []
+        for metric in registry.collect():
+            kind = SUM if metric.type == 'counter' else GAUGE
+            for sample in metric.samples:
+                if kind == SUM and sample.name.endswith('_created'):
+                    continue
+                time_ns = default_ns
+                if sample.timestamp is not None:
+                    time_ns = round(float(sample.timestamp) * 1e6) * 1000
+                items.append((
+                    (sample.name, metric.documentation, kind),
+                    encode_data_point(sample.labels, sample.value, time_ns)))
+        return items
+
+    def encode(self, items):
+        # NOTE: the data points of a batch are grouped by metric, in the
+        # order the metrics were first seen.
+        metrics = {}
+        for metric, data_point in items:
+            metrics.setdefault(metric, []).append(data_point)
+        scope_metrics = protobuf.message_field(
+            2, protobuf.message_field(1, protobuf.string_field(1, SCOPE)),
+            *[encode_metric(name, description, kind, data_points)
+              for (name, description, kind), data_points in metrics.items()])
+        body = protobuf.message_field(1, self.resource, scope_metrics)
+        if self.compress:
+            return compression.gzip_compress(body)
+        return body
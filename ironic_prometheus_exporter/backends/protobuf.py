@@ -0,0 +1,72 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Minimal protocol buffers encoder.
+
+The output backends only need to write a few small messages, encoding them
+by hand avoids depending on the protobuf library and on generated code.
+Only the wire types they use are supported. Fields are encoded with the
+functions below and a message is the concatenation of its fields.
+"""
+
+import struct
+
+
+VARINT = 0
+FIXED64 = 1
+LENGTH_DELIMITED = 2
+
+_DOUBLE = struct.Struct('<d')
+_FIXED64 = struct.Struct('<Q')
+
+
+def varint(value):
+    """Encode an unsigned integer as a base 128 varint."""
+    if value < 0:
+        # NOTE: negative int64 values are encoded as their 64 bits two's
+        # complement, on ten bytes.
+        value += 1 << 64
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _key(field, wire_type):
+    return varint(field << 3 | wire_type)
+
+
+def int64_field(field, value):
+    return _key(field, VARINT) + varint(value)
+
+
+def double_field(field, value):
+    return _key(field, FIXED64) + _DOUBLE.pack(value)
+
+
+def fixed64_field(field, value):
+    return _key(field, FIXED64) + _FIXED64.pack(value)
+
+
+def bytes_field(field, value):
+    return _key(field, LENGTH_DELIMITED) + varint(len(value)) + value
+
+
+def string_field(field, value):
+    return bytes_field(field, value.encode('utf-8'))
+
+
+def message_field(field, *fields):
+    """Encode an embedded message made of already encoded fields."""
+    return bytes_field(field, b''.join(fields))
@@ -0,0 +1,90 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Prometheus remote write output backend.
+
+Each sample becomes a ``TimeSeries`` of a ``WriteRequest``, version 1 of the
+protocol, timestamped with the time of the notification::
+
+    message WriteRequest { repeated TimeSeries timeseries = 1; }
+    message TimeSeries { repeated Label labels = 1;
+                         repeated Sample samples = 2; }
+    message Label { string name = 1; string value = 2; }
+    message Sample { double value = 1; int64 timestamp = 2; }
+"""
+
+import logging
+
+from oslo_config import cfg
+
+from ironic_prometheus_exporter.backends import base
+from ironic_prometheus_exporter.backends import compression
+from ironic_prometheus_exporter.backends import protobuf
+
+
+LOG = logging.getLogger(__name__)
+
+
+def encode_timeseries(name, labels, value, timestamp_ms):
+    """Encode a sample as a ``timeseries`` field of a ``WriteRequest``."""
+    fields = [protobuf.message_field(1, protobuf.string_field(1, '__name__'),
+                                     protobuf.string_field(2, name))]
+    for label, label_value in sorted(labels.items()):
+        fields.append(protobuf.message_field(
+            1, protobuf.string_field(1, label),
+            protobuf.string_field(2, label_value)))
+    fields.append(protobuf.message_field(
+        2, protobuf.double_field(1, value),
+        protobuf.int64_field(2, timestamp_ms)))
+    return protobuf.message_field(1, *fields)
+
+
+class RemoteWriteBackend(base.BatchingBackend):
+    """Push the samples to a Prometheus remote write receiver."""
+
+    name = 'remote_write'
+    headers = {'Content-Encoding': 'snappy',
+               'Content-Type': 'application/x-protobuf',
+               'X-Prometheus-Remote-Write-Version': '0.1.0'}
+
+    @classmethod
+    def from_conf(cls, conf):
+        options = conf.oslo_messaging_notifications
+        if not options.remote_write_url:
+            raise cfg.RequiredOptError('remote_write_url',
+                                       cfg.OptGroup(base.GROUP))
+        if compression._snappy is None:
+            LOG.warning('python-snappy is not installed, the remote write '
+                        'requests are sent uncompressed. Install the '
+                        'remote_write extra to compress them.')
+        return cls(options.remote_write_url,
+                   batch_size=options.remote_write_batch_size,
+                   flush_interval=options.remote_write_flush_interval,
+                   retries=options.remote_write_retries,
+                   timeout=options.remote_write_timeout,
+                   max_buffer=options.remote_write_max_buffer,
+                   spool_dir=options.remote_write_spool_dir)
+
+    def convert(self, registry, timestamp):
+        default_ms = int(timestamp * 1000)
+        items = []
+        for metric in registry.collect():
+            for sample in metric.samples:
+                timestamp_ms = default_ms
+                if sample.timestamp is not None:
+                    timestamp_ms = int(float(sample.timestamp) * 1000)
+                items.append(encode_timeseries(
+                    sample.name, sample.labels, sample.value, timestamp_ms))
+        return items
+
+    def encode(self, items):
+        return compression.snappy_compress(b''.join(items))
@@ -0,0 +1,181 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Limit the labels and series produced from a notification.
+
+The Redfish parser turns every ``Extra`` field of a node and every field of
+a sensor into a label, so new fields sent by a firmware update multiply the
+number of series. The guard runs on the families collected from the
+registry of a notification, before they are rendered or sent, and:
+
+* removes the labels that are not allowed, or that are denied, for the
+  event type of the notification;
+* trims the series having more than ``max_labels`` labels;
+* drops the series of a metric family past ``max_series``.
+
+The labels joining the series of a node or a conductor together,
+``JOIN_LABELS``, are never removed by the lists nor by the labels limit.
+"""
+
+import functools
+import logging
+
+from ironic_prometheus_exporter import self_metrics
+from ironic_prometheus_exporter import utils as ipe_utils
+
+
+LOG = logging.getLogger(__name__)
+
+JOIN_LABELS = frozenset(['hostname', 'instance_uuid', 'node_name',
+                         'node_uuid', 'sensor_id'])
+
+# NOTE: labels prometheus_client adds to the samples of histograms and
+# summaries, they are not part of the identity of a series.
+SAMPLE_LABELS = frozenset(['le', 'quantile'])
+
+KEPT_LABELS = JOIN_LABELS | SAMPLE_LABELS
+
+ANY = '*'
+
+
+def parse_label_rules(entries):
+    """Parse ``<event_type>:<label>`` entries.
+
+    :param entries: List of entries, ``*`` matches any event type or any
+        label.
+    :returns: Dict of the labels of each event type.
+    :raises ValueError: if an entry is not in the expected format.
+    """
+    rules = {}
+    for entry in entries:
+        event_type, sep, label = entry.partition(':')
+        if not sep or not event_type or not label:
+            raise ValueError('Invalid label rule "%s", expected '
+                             '<event_type>:<label>' % entry)
+        rules.setdefault(event_type, set()).add(label)
+    return {event_type: frozenset(labels)
+            for event_type, labels in rules.items()}
+
+
+class CardinalityGuard(object):
+    """Filter the labels and limit the series of metric families.
+
+    :param allowlist: ``<event_type>:<label>`` entries. When an event type
+        has entries, only these labels are kept on its series.
+    :param denylist: ``<event_type>:<label>`` entries of labels removed.
+    :param max_series: Series kept per metric family, 0 for no limit.
+    :param max_labels: Labels kept per series, 0 for no limit.
+    """
+
+    def __init__(self, allowlist=(), denylist=(), max_series=0,
+                 max_labels=0):
+        self.allowlist = parse_label_rules(allowlist)
+        self.denylist = parse_label_rules(denylist)
+        self.max_series = max_series
+        self.max_labels = max_labels
+        self._kept_labels = functools.lru_cache(maxsize=1024)(
+            self._compute_kept_labels)
+
+    @classmethod
+    def from_conf(cls, conf):
+        """Build the guard, None when the options do not enable it."""
+        options = conf.oslo_messaging_notifications
+        if not (options.label_allowlist or options.label_denylist
+                or options.max_series_per_metric
+                or options.max_labels_per_series):
+            return None
+        return cls(allowlist=options.label_allowlist,
+                   denylist=options.label_denylist,
+                   max_series=options.max_series_per_metric,
+                   max_labels=options.max_labels_per_series)
+
+    def _rules(self, rules, event_type):
+        return rules.get(event_type, frozenset()) | rules.get(ANY,
+                                                              frozenset())
+
+    def _compute_kept_labels(self, event_type, names):
+        """Names of the labels kept out of the names of a series."""
+        allowed = self._rules(self.allowlist, event_type)
+        denied = self._rules(self.denylist, event_type)
+        kept = []
+        for name in names:
+            if name not in KEPT_LABELS:
+                if allowed and ANY not in allowed and name not in allowed:
+                    continue
+                if ANY in denied or name in denied:
+                    continue
+            kept.append(name)
+        if self.max_labels and len(kept) > self.max_labels:
+            # The join labels first, then the others in their order.
+            limit = self.max_labels - sum(
+                1 for name in kept if name in KEPT_LABELS)
+            trimmed = []
+            for name in kept:
+                if name not in KEPT_LABELS:
+                    if limit <= 0:
+                        continue
+                    limit -= 1
+                trimmed.append(name)
+            return tuple(trimmed), True
+        return tuple(kept), False
+
+    def apply(self, event_type, registry):
+        """Guard the families of a registry.
+
+        :param event_type: Event type of the notification.
+        :param registry: Registry the parsers filled.
+        :returns: Registry like object serving the guarded families.
+        """
+        families = []
+        dropped = dict.fromkeys(('max_series', 'max_labels', 'duplicate'), 0)
+        for metric in registry.collect():
+            families.append(self._guard_family(event_type, metric, dropped))
+
+        for reason, count in dropped.items():
+            if count:
+                self_metrics.CARDINALITY_DROPS.labels(
+                    event_type, reason).inc(count)
+        if dropped['max_series'] or dropped['max_labels']:
+            LOG.warning('Limited the cardinality of the %s metrics: %d '
+                        'series dropped, %d series with labels dropped',
+                        event_type, dropped['max_series'],
+                        dropped['max_labels'])
+        return ipe_utils.MetricFamilies(families)
+
+    def _guard_family(self, event_type, metric, dropped):
+        samples = []
+        series = set()
+        over_limit = set()
+        seen = set()
+        for sample in metric.samples:
+            names, trimmed = self._kept_labels(event_type,
+                                               tuple(sample.labels))
+            labels = {name: sample.labels[name] for name in names}
+            key = frozenset((name, value) for name, value in labels.items()
+                            if name not in SAMPLE_LABELS)
+            if key not in series:
+                if self.max_series and len(series) >= self.max_series:
+                    if key not in over_limit:
+                        over_limit.add(key)
+                        dropped['max_series'] += 1
+                    continue
+                series.add(key)
+                if trimmed:
+                    dropped['max_labels'] += 1
+            sample_key = (sample.name, frozenset(labels.items()))
+            if sample_key in seen:
+                # The series only differed by the labels removed.
+                dropped['duplicate'] += 1
+                continue
+            seen.add(sample_key)
+            samples.append(sample._replace(labels=labels))
+        return ipe_utils.copy_family(metric, samples)
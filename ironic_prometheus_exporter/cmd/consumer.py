@@ -0,0 +1,166 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Consume the ironic notifications outside of the conductor.
+
+Instead of loading the prometheus_exporter notifier driver in every
+ironic-conductor process, the conductors send their notifications with the
+``messaging`` driver and this service consumes them, in batches, from the
+``[oslo_messaging_notifications]/topics`` topics of the notification
+transport. The notifications go through ``PrometheusFileDriver``, so the
+files written are the same::
+
+    ironic-prometheus-exporter-consumer --config-file /etc/ironic/ironic.conf
+"""
+
+import logging
+import signal
+import sys
+import threading
+
+from oslo_config import cfg
+import oslo_messaging
+
+from ironic_prometheus_exporter import messaging
+from ironic_prometheus_exporter import workers
+
+
+LOG = logging.getLogger(__name__)
+
+# NOTE: the event types PrometheusFileDriver writes metrics for, the other
+# notifications are filtered out by oslo.messaging before reaching the
+# endpoint.
+EVENT_TYPES = (r'^(hardware\.(ipmi|redfish|idrac)\.metrics'
+               r'|ironic\.metrics)$')
+
+
+class NotificationEndpoint(object):
+    """Batch notification endpoint writing the metrics files.
+
+    :param driver: ``PrometheusFileDriver``, or ``WorkerPool``, the
+        notifications are given to.
+    """
+
+    filter_rule = oslo_messaging.NotificationFilter(event_type=EVENT_TYPES)
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def info(self, messages):
+        self._notify(messages, 'INFO')
+
+    def warn(self, messages):
+        self._notify(messages, 'WARN')
+
+    def error(self, messages):
+        self._notify(messages, 'ERROR')
+
+    def _notify(self, messages, priority):
+        for message in latest_messages(messages):
+            metadata = message.get('metadata') or {}
+            notification = {'message_id': metadata.get('message_id'),
+                            'publisher_id': message['publisher_id'],
+                            'event_type': message['event_type'],
+                            'priority': priority,
+                            'payload': message['payload'],
+                            'timestamp': metadata.get('timestamp')}
+            try:
+                self.driver.notify(message['ctxt'], notification, priority,
+                                   0)
+            except Exception:
+                # NOTE: the driver already logged the error, the rest of
+                # the batch is still written and the failed notification
+                # is not requeued, it would fail again.
+                pass
+
+
+def output_key(message):
+    """Key of the metrics file a notification is written to."""
+    payload = message['payload'] or {}
+    return (message['event_type'],
+            payload.get('node_name') or payload.get('node_uuid')
+            or payload.get('hostname'))
+
+
+def latest_messages(messages):
+    """Keep the latest notification of each metrics file of a batch.
+
+    When the consumer is late, a batch can hold several notifications for
+    the same node, each of them replacing the file written by the previous
+    one. Only the latest is parsed, the batch order is kept otherwise.
+    """
+    latest = {}
+    for index, message in enumerate(messages):
+        latest[output_key(message)] = index
+    if len(latest) < len(messages):
+        LOG.debug('Skipping %d notifications superseded in their batch',
+                  len(messages) - len(latest))
+    return [messages[index] for index in sorted(latest.values())]
+
+
+def get_listener(conf, transport, driver):
+    """Build the batch notification listener of the consumer."""
+    options = conf.oslo_messaging_notifications
+    targets = [oslo_messaging.Target(topic=topic)
+               for topic in options.topics]
+    return oslo_messaging.get_batch_notification_listener(
+        transport, targets, [NotificationEndpoint(driver)],
+        executor='threading', pool=options.consumer_pool,
+        batch_size=options.consumer_batch_size,
+        batch_timeout=options.consumer_batch_timeout)
+
+
+def main(argv=None):
+    conf = cfg.ConfigOpts()
+    messaging.register_opts(conf)
+    conf(argv if argv is not None else sys.argv[1:], project='ironic',
+         prog='ironic-prometheus-exporter-consumer')
+    logging.basicConfig(level=logging.INFO)
+
+    transport = oslo_messaging.get_notification_transport(conf)
+    options = conf.oslo_messaging_notifications
+    pool = None
+    if options.consumer_workers:
+        # NOTE: the workers are forked before the listener starts its
+        # threads, and restarted from this thread only.
+        pool = workers.WorkerPool(conf, options.consumer_workers,
+                                  queue_size=options.consumer_batch_size)
+        pool.start()
+        driver = pool
+    else:
+        driver = messaging.PrometheusFileDriver(conf, None, transport)
+    listener = get_listener(conf, transport, driver)
+
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    listener.start()
+    LOG.info('Consuming notifications from %s',
+             ', '.join(conf.oslo_messaging_notifications.topics))
+    while not stopping.wait(1):
+        if pool is not None:
+            pool.check()
+    listener.stop()
+    listener.wait()
+    if pool is not None:
+        pool.stop()
+    transport.cleanup()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Replay notifications recorded by the file_exporter driver.
+
+The recorded notifications are fed to the prometheus_exporter driver,
+configured from the usual ``[oslo_messaging_notifications]`` options, at
+their original pace, scaled by ``--speed``, or as fast as possible with
+``--speed 0``. The throughput is reported once the replay is done::
+
+    ironic-prometheus-exporter-replay --config-file replay.conf \\
+        --speed 0 /var/lib/ironic/metrics/recordings
+"""
+
+import collections
+import itertools
+import logging
+import sys
+import time
+
+from oslo_config import cfg
+
+from ironic_prometheus_exporter import messaging
+from ironic_prometheus_exporter import recording
+
+
+LOG = logging.getLogger(__name__)
+
+cli_opts = [
+    cfg.MultiStrOpt('recording', positional=True, required=True,
+                    help='Recording files, or directories of recording '
+                         'files including their rotated files.'),
+    cfg.FloatOpt('speed', default=1.0, min=0,
+                 help='Replay speed relative to the recorded pace, 0 '
+                      'replays the notifications as fast as possible.'),
+    cfg.IntOpt('limit', default=0, min=0,
+               help='Stop after replaying this many notifications, 0 '
+                    'replays all of them.'),
+]
+
+
+def iter_recordings(paths):
+    """Iterate over the records of recording files and directories."""
+    files = itertools.chain.from_iterable(
+        recording.recording_files(path) for path in paths)
+    return itertools.chain.from_iterable(
+        recording.read_records(path) for path in files)
+
+
+def replay(driver, records, speed=1.0, limit=0, clock=time.monotonic,
+           sleep=time.sleep):
+    """Feed recorded notifications to a notifier driver.
+
+    :param driver: Notifier driver, e.g. a ``PrometheusFileDriver``.
+    :param records: Iterable of records, see
+        :func:`ironic_prometheus_exporter.recording.read_records`.
+    :param speed: Replay speed relative to the recorded pace, 0 does not
+        wait between notifications.
+    :param limit: Maximum number of notifications to replay, 0 for all.
+    :returns: Dict of replay statistics.
+    """
+    notifications = collections.Counter()
+    failures = collections.Counter()
+    busy = collections.Counter()
+    first_received = None
+    start = clock()
+    for count, record in enumerate(records, 1):
+        if speed:
+            if first_received is None:
+                first_received = record['received_at']
+            delay = (start + (record['received_at'] - first_received) / speed
+                     - clock())
+            if delay > 0:
+                sleep(delay)
+
+        message = record['message']
+        event_type = message.get('event_type', 'unknown')
+        before = clock()
+        try:
+            driver.notify(None, message, record['priority'], 0)
+        except Exception as e:
+            LOG.warning('Failed to replay a %s notification: %s',
+                        event_type, e)
+            failures[event_type] += 1
+        busy[event_type] += clock() - before
+        notifications[event_type] += 1
+        if limit and count >= limit:
+            break
+
+    return {'elapsed': clock() - start,
+            'notifications': notifications,
+            'failures': failures,
+            'busy': busy}
+
+
+def format_report(stats):
+    total = sum(stats['notifications'].values())
+    elapsed = stats['elapsed']
+    lines = ['Replayed %d notifications in %.3f s (%.1f/s), %d failed.'
+             % (total, elapsed, total / elapsed if elapsed else 0,
+                sum(stats['failures'].values()))]
+    for event_type, count in sorted(stats['notifications'].items()):
+        busy = stats['busy'][event_type]
+        lines.append('  %s: %d notifications, %.3f ms each, %.1f/s when '
+                     'busy, %d failed'
+                     % (event_type, count, busy * 1000 / count,
+                        count / busy if busy else 0,
+                        stats['failures'][event_type]))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    conf = cfg.ConfigOpts()
+    messaging.register_opts(conf)
+    conf.register_cli_opts(cli_opts)
+    conf(argv if argv is not None else sys.argv[1:], project='ironic',
+         prog='ironic-prometheus-exporter-replay')
+    logging.basicConfig(level=logging.INFO)
+
+    driver = messaging.PrometheusFileDriver(conf, None, None)
+    stats = replay(driver, iter_recordings(conf.recording),
+                   speed=conf.speed, limit=conf.limit)
+    print(format_report(stats))
+    return 1 if sum(stats['failures'].values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
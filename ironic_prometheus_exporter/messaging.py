@@ -12,16 +12,26 @@
 
 import logging
 import os
+import socket
+import threading
+import time
 
 from oslo_config import cfg
 from oslo_messaging.notify import notifier
 from prometheus_client import CollectorRegistry
-from prometheus_client import write_to_textfile
+from prometheus_client import generate_latest
 
+from ironic_prometheus_exporter.backends import otlp
+from ironic_prometheus_exporter.backends import remote_write
+from ironic_prometheus_exporter import cardinality
 from ironic_prometheus_exporter.parsers import header
 from ironic_prometheus_exporter.parsers import ipmi
 from ironic_prometheus_exporter.parsers import ironic as ironic_parser
 from ironic_prometheus_exporter.parsers import redfish
+from ironic_prometheus_exporter import recording
+from ironic_prometheus_exporter import relabel
+from ironic_prometheus_exporter import self_metrics
+from ironic_prometheus_exporter import utils as ipe_utils
 
 
 LOG = logging.getLogger(__name__)
@@ -29,7 +39,140 @@ LOG = logging.getLogger(__name__)
 
 prometheus_opts = [
     cfg.StrOpt('location', required=True,
-               help='Directory where the files will be written.')
+               help='Directory where the files will be written.'),
+    cfg.BoolOpt('self_metrics', default=False,
+                help='Write metrics about the time the exporter spends '
+                     'parsing, rendering and writing each notification '
+                     'to a dedicated file of each process in the metrics '
+                     'directory.'),
+    cfg.IntOpt('max_age', default=0, min=0,
+               help='Used by the exporter application. Metrics files that '
+                    'were not updated in this many seconds are not served, '
+                    'a gauge with the time of their last update is served '
+                    'instead. 0 disables the check.'),
+    cfg.BoolOpt('derive_timer_rates', default=False,
+                help='Keep the previous ironic.metrics timers of each '
+                     'conductor and also write the calls per second, the '
+                     'calls and the mean time (ms) per call since the '
+                     'previous message.'),
+    cfg.StrOpt('recorder_location',
+               help='Directory where the file_exporter driver records the '
+                    'notifications. Defaults to a "recordings" directory '
+                    'inside location, which is not served by the exporter '
+                    'application.'),
+    cfg.IntOpt('recorder_max_bytes', default=100 * 1024 * 1024, min=0,
+               help='Size in bytes of a recording file before it is '
+                    'rotated. 0 disables the rotation.'),
+    cfg.IntOpt('recorder_backup_count', default=5, min=0,
+               help='Rotated recording files to keep.'),
+    cfg.BoolOpt('recorder_compress', default=False,
+                help='Compress the recording files with gzip, each '
+                     'notification as a gzip member of its own.'),
+    cfg.IntOpt('consumer_batch_size', default=100, min=1,
+               help='Used by ironic-prometheus-exporter-consumer. Maximum '
+                    'number of notifications handled in a batch.'),
+    cfg.IntOpt('consumer_batch_timeout', default=5, min=1,
+               help='Used by ironic-prometheus-exporter-consumer. Seconds '
+                    'to wait for a batch to fill up before handling the '
+                    'notifications received so far.'),
+    cfg.StrOpt('consumer_pool',
+               help='Used by ironic-prometheus-exporter-consumer. Name of '
+                    'the listener pool, consumers sharing a pool split the '
+                    'notifications between them.'),
+    cfg.IntOpt('consumer_workers', default=0, min=0,
+               help='Used by ironic-prometheus-exporter-consumer. Number '
+                    'of processes parsing the notifications, partitioned '
+                    'by node. 0 parses them in the consumer process.'),
+    cfg.BoolOpt('node_info_metric', default=False,
+                help='Write the node name, instance UUID and Extra fields '
+                     'of the Redfish and iDRAC nodes once, in the '
+                     'baremetal_node_info metric, instead of on every '
+                     'sensor series. The sensor series only keep the '
+                     'node_uuid label to be joined with it.'),
+    cfg.StrOpt('relabel_rules_file',
+               help='JSON file of rules renaming, dropping or relabeling '
+                    'the metrics when they are produced, see the '
+                    'documentation for its format. The rules are applied '
+                    'before the label lists and limits below.'),
+    cfg.ListOpt('label_allowlist', default=[],
+                help='Labels kept on the series of an event type, as '
+                     '<event_type>:<label> entries, e.g. '
+                     'hardware.redfish.metrics:model. "*" matches any event '
+                     'type or label. Event types without entries keep all '
+                     'their labels. The node_uuid, node_name, '
+                     'instance_uuid, sensor_id and hostname labels are '
+                     'always kept.'),
+    cfg.ListOpt('label_denylist', default=[],
+                help='Labels removed from the series of an event type, as '
+                     '<event_type>:<label> entries. "*" matches any event '
+                     'type or label. The node_uuid, node_name, '
+                     'instance_uuid, sensor_id and hostname labels are '
+                     'never removed.'),
+    cfg.IntOpt('max_series_per_metric', default=0, min=0,
+               help='Series of a metric written for a notification, the '
+                    'following ones are dropped and counted in the '
+                    'ironic_exporter_cardinality_drops self metric. 0 '
+                    'disables the limit.'),
+    cfg.IntOpt('max_labels_per_series', default=0, min=0,
+               help='Labels of a series, the labels past the limit are '
+                    'removed, keeping the node_uuid, node_name, '
+                    'instance_uuid, sensor_id and hostname labels. 0 '
+                    'disables the limit.'),
+    cfg.StrOpt('output_backend', default='textfile',
+               choices=[('textfile', 'Write a metrics file per node for '
+                                     'the exporter application.'),
+                        ('remote_write', 'Push the samples to a Prometheus '
+                                         'remote write endpoint.'),
+                        ('otlp', 'Push the samples to an OpenTelemetry '
+                                 'collector with OTLP/HTTP.')],
+               help='Where the prometheus_exporter driver sends the parsed '
+                    'metrics.'),
+    cfg.URIOpt('remote_write_url',
+               help='URL of the Prometheus remote write endpoint, e.g. '
+                    'http://prometheus:9090/api/v1/write.'),
+    cfg.IntOpt('remote_write_batch_size', default=5000, min=1,
+               help='Maximum number of samples sent in a remote write '
+                    'request.'),
+    cfg.IntOpt('remote_write_flush_interval', default=10, min=1,
+               help='Seconds between two remote write requests when the '
+                    'batches are not full.'),
+    cfg.IntOpt('remote_write_retries', default=3, min=0,
+               help='Times a remote write request failing with a network '
+                    'or server error is retried.'),
+    cfg.IntOpt('remote_write_timeout', default=10, min=1,
+               help='Seconds to wait for the remote write endpoint to '
+                    'answer.'),
+    cfg.IntOpt('remote_write_max_buffer', default=100000, min=1,
+               help='Samples waiting to be sent before the oldest ones are '
+                    'dropped.'),
+    cfg.StrOpt('remote_write_spool_dir',
+               help='Directory where the remote write requests that still '
+                    'failed after the retries are written. They are sent '
+                    'again after the next successful request. When unset '
+                    'they are dropped.'),
+    cfg.URIOpt('otlp_endpoint',
+               help='OTLP/HTTP metrics endpoint of the OpenTelemetry '
+                    'collector, e.g. http://collector:4318/v1/metrics.'),
+    cfg.IntOpt('otlp_batch_size', default=5000, min=1,
+               help='Maximum number of data points sent in an OTLP '
+                    'request.'),
+    cfg.IntOpt('otlp_flush_interval', default=10, min=1,
+               help='Seconds between two OTLP requests when the batches '
+                    'are not full.'),
+    cfg.IntOpt('otlp_retries', default=3, min=0,
+               help='Times an OTLP request failing with a network or '
+                    'server error is retried.'),
+    cfg.IntOpt('otlp_timeout', default=10, min=1,
+               help='Seconds to wait for the collector to answer.'),
+    cfg.IntOpt('otlp_max_buffer', default=100000, min=1,
+               help='Data points waiting to be sent before the oldest ones '
+                    'are dropped.'),
+    cfg.StrOpt('otlp_compression', default='gzip',
+               choices=['gzip', 'none'],
+               help='Compression of the OTLP requests.'),
+    cfg.DictOpt('otlp_headers', default={},
+                help='Extra HTTP headers sent with the OTLP requests, e.g. '
+                     'Authorization:Bearer <token>.'),
 ]
 
 
@@ -37,6 +180,27 @@ def register_opts(conf):
     conf.register_opts(prometheus_opts, group='oslo_messaging_notifications')
 
 
+CONF = cfg.CONF
+register_opts(CONF)
+
+
+def write_textfile(path, content):
+    """Atomically replace the file at ``path`` with ``content``.
+
+    The content is written to a temporary file in the same directory that is
+    then renamed, so the exporter never serves a partially written file.
+    """
+    tmppath = '%s.%s.%s' % (path, os.getpid(), threading.get_ident())
+    try:
+        with open(tmppath, 'wb') as f:
+            f.write(content)
+        os.replace(tmppath, path)
+    except Exception:
+        if os.path.exists(tmppath):
+            os.remove(tmppath)
+        raise
+
+
 class PrometheusFileDriver(notifier.Driver):
     """Publish notifications into a File to be used by Prometheus"""
 
@@ -44,10 +208,32 @@ class PrometheusFileDriver(notifier.Driver):
         self.location = conf.oslo_messaging_notifications.location
         if not os.path.exists(self.location):
             os.makedirs(self.location)
+        self.self_metrics = conf.oslo_messaging_notifications.self_metrics
+        # NOTE: every process loading the driver, the conductor but also the
+        # API workers, has its own self metrics. They are told apart by the
+        # process id unless the owner of the driver names the process.
+        self.self_metrics_process = None
+        self.derive_timer_rates = (
+            conf.oslo_messaging_notifications.derive_timer_rates)
+        self.node_info_metric = (
+            conf.oslo_messaging_notifications.node_info_metric)
+        self.relabel_rules = None
+        if conf.oslo_messaging_notifications.relabel_rules_file:
+            self.relabel_rules = relabel.load_rules(
+                conf.oslo_messaging_notifications.relabel_rules_file)
+        self.cardinality_guard = cardinality.CardinalityGuard.from_conf(conf)
+        self.backend = None
+        output_backend = conf.oslo_messaging_notifications.output_backend
+        if output_backend == 'remote_write':
+            self.backend = remote_write.RemoteWriteBackend.from_conf(conf)
+        elif output_backend == 'otlp':
+            self.backend = otlp.OTLPBackend.from_conf(conf)
         super(PrometheusFileDriver, self).__init__(conf, topics, transport)
 
     def notify(self, ctxt, message, priority, retry):
+        event_type = message.get('event_type', 'unknown')
         try:
+            start = time.perf_counter()
             registry = CollectorRegistry()
             event_type = message['event_type']
             payload = message['payload']
@@ -55,7 +241,9 @@ class PrometheusFileDriver(notifier.Driver):
                 # We know this message payload is from a conductor itself
                 # and not for node drivers.
                 header.timestamp_conductor_registry(payload, registry)
-                ironic_parser.category_registry(payload, registry)
+                ironic_parser.category_registry(
+                    payload, registry,
+                    derive_timer_rates=self.derive_timer_rates)
 
             else:
                 header.timestamp_registry(payload, registry)
@@ -63,10 +251,27 @@ class PrometheusFileDriver(notifier.Driver):
                     ipmi.category_registry(payload, registry)
 
                 elif event_type == 'hardware.redfish.metrics':
-                    redfish.category_registry(payload, registry)
+                    redfish.category_registry(
+                        payload, registry, node_info=self.node_info_metric)
 
                 elif event_type == 'hardware.idrac.metrics':
-                    redfish.category_registry(payload, registry)
+                    redfish.category_registry(
+                        payload, registry, node_info=self.node_info_metric)
+            if self.relabel_rules is not None:
+                registry = self.relabel_rules.apply(registry)
+            if self.cardinality_guard is not None:
+                registry = self.cardinality_guard.apply(event_type, registry)
+            parsed = time.perf_counter()
+
+            if self.backend is not None:
+                series = self.backend.submit(registry,
+                                             _message_time(payload))
+                self_metrics.PARSE_SECONDS.labels(event_type).observe(
+                    parsed - start)
+                self_metrics.WRITE_SECONDS.labels(event_type).observe(
+                    time.perf_counter() - parsed)
+                self_metrics.SERIES.labels(event_type).inc(series)
+                return
 
             # Order of preference is for a node Name, UUID, or
             # payload hostname field to be used (i.e. for conductor
@@ -79,22 +284,89 @@ class PrometheusFileDriver(notifier.Driver):
             statFile = os.path.join(
                 self.location, field + '-' + event_type)
 
+            content = generate_latest(registry)
+            rendered = time.perf_counter()
+
             # Writes to file for server pickup
-            write_to_textfile(statFile, registry)
+            write_textfile(statFile, content)
+            written = time.perf_counter()
+
+            self_metrics.PARSE_SECONDS.labels(event_type).observe(
+                parsed - start)
+            self_metrics.RENDER_SECONDS.labels(event_type).observe(
+                rendered - parsed)
+            self_metrics.WRITE_SECONDS.labels(event_type).observe(
+                written - rendered)
+            self_metrics.SERIES.labels(event_type).inc(
+                _count_series(content))
 
         except Exception as e:
+            self_metrics.FAILURES.labels(event_type).inc()
             LOG.error(e)
             raise
 
+        finally:
+            self_metrics.MESSAGES.labels(event_type).inc()
+            if self.self_metrics_file:
+                self._write_self_metrics()
+
+    @property
+    def self_metrics_file(self):
+        """File of the self metrics of the process, None when disabled."""
+        if not self.self_metrics:
+            return None
+        return os.path.join(
+            self.location, '%s.%s-ironic_prometheus_exporter'
+            % (socket.gethostname(), self._self_metrics_process()))
+
+    def _self_metrics_process(self):
+        # NOTE: computed when writing, the driver may be loaded before the
+        # process forks.
+        return self.self_metrics_process or str(os.getpid())
+
+    def _write_self_metrics(self):
+        process = self._self_metrics_process()
+        families = [
+            ipe_utils.copy_family(metric, [
+                sample._replace(labels=dict(sample.labels, process=process))
+                for sample in metric.samples])
+            for metric in self_metrics.REGISTRY.collect()]
+        try:
+            write_textfile(self.self_metrics_file, generate_latest(
+                ipe_utils.MetricFamilies(families)))
+        except Exception as e:
+            LOG.warning('Failed to write the exporter self metrics to %s: '
+                        '%s', self.self_metrics_file, e)
+
+
+def _message_time(payload):
+    """Time of a notification payload, in seconds since the epoch."""
+    try:
+        return ipe_utils.parse_timestamp(payload['timestamp'])
+    except (KeyError, ValueError):
+        return time.time()
+
+
+def _count_series(content):
+    """Count the samples in a text exposition, skipping HELP/TYPE lines."""
+    return sum(1 for line in content.splitlines()
+               if line and not line.startswith(b'#'))
+
 
 class SimpleFileDriver(notifier.Driver):
+    """Record notifications as JSON lines to replay them later"""
 
     def __init__(self, conf, topics, transport):
-        self.location = conf.oslo_messaging_notifications.location
+        options = conf.oslo_messaging_notifications
+        self.location = options.recorder_location or os.path.join(
+            options.location, 'recordings')
         if not os.path.exists(self.location):
-            os.makedirs(os.path.dirname(self.location))
+            os.makedirs(self.location)
+        self.writer = recording.RecordingWriter(
+            self.location, max_bytes=options.recorder_max_bytes,
+            backup_count=options.recorder_backup_count,
+            compress=options.recorder_compress)
         super(SimpleFileDriver, self).__init__(conf, topics, transport)
 
     def notify(self, ctx, message, priority, retry):
-        with open(os.path.join(self.location, 'simplefile'), 'w') as file:
-            file.write(message)
+        self.writer.write(message, priority)
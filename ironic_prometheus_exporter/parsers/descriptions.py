@@ -14,25 +14,43 @@
 import importlib.resources
 import json
 import logging
-
-DESCRIPTIONS = {}
+import types
 
 LOG = logging.getLogger(__name__)
 
+EMPTY = types.MappingProxyType({})
 
-def get_metric_description(source, metric_name):
-    if source not in DESCRIPTIONS:
-        try:
-            json_file = importlib.resources.files(
-                'ironic_prometheus_exporter'
-            ).joinpath('parsers/metrics_information/' + source + '.json')
 
-            with open(json_file) as fl:
-                DESCRIPTIONS[source] = json.load(fl)
+def _load_descriptions():
+    """Load every metrics_information/<source>.json file.
 
+    The catalog is built once, at import, so the parsers never do I/O nor
+    share mutable state when looking up a description.
+    """
+    directory = importlib.resources.files(
+        'ironic_prometheus_exporter'
+    ).joinpath('parsers/metrics_information')
+
+    descriptions = {}
+    for json_file in sorted(directory.iterdir(), key=lambda f: f.name):
+        if not json_file.name.endswith('.json'):
+            continue
+        source = json_file.name[:-len('.json')]
+        try:
+            with json_file.open() as fl:
+                source_descriptions = json.load(fl)
         except Exception as exc:
             LOG.warning(
                 'Failed to load metrics descriptions '
                 'for metrics source %s: %s', source, exc)
+            continue
+        descriptions[source] = types.MappingProxyType(source_descriptions)
 
-    return DESCRIPTIONS.get(source, {}).get(metric_name, '')
+    return types.MappingProxyType(descriptions)
+
+
+DESCRIPTIONS = _load_descriptions()
+
+
+def get_metric_description(source, metric_name):
+    return DESCRIPTIONS.get(source, EMPTY).get(metric_name, '')
@@ -10,7 +10,6 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from datetime import datetime
 import logging
 
 from prometheus_client import Gauge
@@ -29,8 +28,7 @@ def timestamp_registry(node_information, metric_registry):
         return
 
     try:
-        dt_timestamp = datetime.strptime(timestamp_str,
-                                         '%Y-%m-%dT%H:%M:%S.%f')
+        value = int(ipe_utils.parse_timestamp(timestamp_str))
     except ValueError:
         LOG.warning("Invalid timestamp format: %s", timestamp_str)
         return
@@ -43,8 +41,6 @@ def timestamp_registry(node_information, metric_registry):
     if node_information.get('node_name') or node_information.get('name'):
         labels['node_name'] = node_information.get('node_name') \
             or node_information.get('name')
-    dt_1970 = datetime(1970, 1, 1, 0, 0, 0)
-    value = int((dt_timestamp - dt_1970).total_seconds())
 
     desc = descriptions.get_metric_description('header', metric)
 
@@ -71,16 +67,13 @@ def timestamp_conductor_registry(payload, metric_registry):
         return
 
     try:
-        dt_timestamp = datetime.strptime(timestamp_str,
-                                         '%Y-%m-%dT%H:%M:%S.%f')
+        value = int(ipe_utils.parse_timestamp(timestamp_str))
     except ValueError:
         LOG.warning("Invalid conductor timestamp format: %s", timestamp_str)
         return
 
     metric = 'conductor_service_last_payload_timestamp_seconds'
     labels = {'hostname': hostname}
-    dt_1970 = datetime(1970, 1, 1, 0, 0, 0)
-    value = int((dt_timestamp - dt_1970).total_seconds())
 
     desc = descriptions.get_metric_description('header', metric)
 
@@ -10,14 +10,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import importlib.resources
-import json
+import collections
+import functools
 import logging
 import re
 
 from prometheus_client import Gauge
 
 from ironic_prometheus_exporter.parsers import descriptions
+from ironic_prometheus_exporter import self_metrics
 from ironic_prometheus_exporter import utils as ipe_utils
 
 
@@ -76,63 +77,81 @@ CATEGORY_PARAMS = {
 }
 
 
-IPMI_JSON = importlib.resources.files(
-    'ironic_prometheus_exporter'
-).joinpath('parsers/metrics_information/ipmi.json')
+# NOTE (iurygregory): regex to remove a sequence of numbers and letters that
+# comes after the fan sensor name.
+# e.g: 'Fan4B (0x43)' will be 'fan (0x43)'
+#      'Fan Redundancy (0x78)' will be 'fan redundancy (0x78)'
+FAN_NUMBER_RE = re.compile(r'fan\d*[a-z]*')
+# NOTE (iurygregory): regex to remove brackets and their content
+# e.g: 'fan (0x43)' will turn into ['fan']
+#      'fan redundancy (0x78)' will turn into ['fan', 'redundancy']
+BRACKETS_RE = re.compile(r'\(.*\)')
+# NOTE (iurygregory): regex to remove Voltage value from sensor_id
+# e.g: '3.3V B PG (0x15)' will be 'b pg (0x15)'
+#      '5V SW PG (0x10)' will be 'sw pg (0x10)'
+VOLTAGE_VALUE_RE = re.compile(r'([\d+]v)|([\d+].[\d*]v)')
+# NOTE (iurygregory): regex to remove all numbers
+# e.g: 'Voltage 1 (0x6d)' will turn into ['voltage', '(xd)']
+NUMBERS_RE = re.compile(r'[\d]+')
+NON_WORD_RE = re.compile(r'[\W]')
+UNDERSCORES_RE = re.compile(r'[_]+')
+NUMBER_RE = re.compile(r'(\d+(\.\d*)?|\.\d+)')
 
-with open(IPMI_JSON) as f:
-    IPMI_METRICS_DESCRIPTION = json.load(f)
+# A BMC reports the same sensors on every poll, so the number of distinct
+# names is bounded by the number of hardware models in the deployment.
+METRIC_NAME_CACHE_SIZE = 8192
 
 
-def metric_names(category_info):
-    metric_dic = {}
-    extract_unit = category_info.get('extra_params').get('extract_unit')
-    special_label = category_info.get('extra_params').get('special_label')
-    payload = category_info['data']
-    for entry in payload:
-        if special_label == 'fan':
-            # NOTE (iurygregory): regex to remove a sequence of numbers and
-            # letters that comes after the fan sensor name.
-            # e.g: 'Fan4B (0x43)' will be 'fan (0x43)'
-            #      'Fan Redundancy (0x78)' will be 'fan redundancy (0x78)'
-            e = re.sub(r'fan\d*[a-z]*', 'fan', entry.lower())
-            # NOTE (iurygregory): regex to remove brackets and their content
-            # e.g: 'fan (0x43)' will turn into ['fan']
-            #      'fan redundancy (0x78)' will turn into ['fan', 'redundancy']
-            e = re.sub(r'\(.*\)', '', e).split()
-            label = '_'.join(e)
-        elif special_label == 'voltage':
-            # NOTE (iurygregory): regex to remove Voltage value from sensor_id
-            # e.g: '3.3V B PG (0x15)' will be 'b pg (0x15)'
-            #      '5V SW PG (0x10)' will be 'sw pg (0x10)'
-            e = re.sub(r'([\d+]v)|([\d+].[\d*]v)', '', entry.lower())
-            # NOTE (iurygregory): regex to remove all numbers
-            # e.g: 'Voltage 1 (0x6d)' will turn into ['voltage', '(xd)']
-            e = re.sub(r'[\d]+', '', e).lower().split()
-            label = '_'.join(e[:-1]).replace('-', '_')
-            if label in category_info['prefix']:
-                label = ''
-        else:
-            # NOTE (iurygregory): regex to remove all numbers
-            e = re.sub(r'[\d]+', '', entry).lower().split()
-            label = '_'.join(e[:-1]).replace('-', '_')
+@functools.lru_cache(maxsize=METRIC_NAME_CACHE_SIZE)
+def _metric_name(prefix, sufix, special_label, entry, unit):
+    """Build the metric name for a sensor entry of a category.
+
+    The prefix, sufix and special label identify the category, the result is
+    cached since it only depends on the arguments.
+    """
+    if special_label == 'fan':
+        e = FAN_NUMBER_RE.sub('fan', entry.lower())
+        e = BRACKETS_RE.sub('', e).split()
+        label = '_'.join(e)
+    elif special_label == 'voltage':
+        e = VOLTAGE_VALUE_RE.sub('', entry.lower())
+        e = NUMBERS_RE.sub('', e).lower().split()
+        label = '_'.join(e[:-1]).replace('-', '_')
+        if label in prefix:
+            label = ''
+    else:
+        e = NUMBERS_RE.sub('', entry).lower().split()
+        label = '_'.join(e[:-1]).replace('-', '_')
+
+    if special_label == 'memory':
+        if 'mem' not in label and 'memory' not in label:
+            label = 'memory_' + label
+
+    metric_name = NON_WORD_RE.sub('_', prefix + label + sufix + unit)
+    metric_name = UNDERSCORES_RE.sub('_', metric_name)
+    if metric_name[0].isdigit():
+        metric_name = metric_name.lstrip('0123456789')
+    return metric_name
+
 
+self_metrics.register_cache('ipmi_metric_names', _metric_name)
+
+
+def _entry_units(payload, extract_unit):
+    """Yield the unit to use in the metric name of each sensor entry."""
+    for entry in payload:
         unit = ''
-        if extract_unit and payload[entry]['Sensor Reading'] != 'No Reading':
-            sensor_read = payload[entry]['Sensor Reading'].split()
-            if len(sensor_read) > 1:
-                unit = '_' + sensor_read[-1].lower()
-
-        if special_label == 'memory':
-            if 'mem' not in label and 'memory' not in label:
-                label = 'memory_' + label
-
-        prefix = category_info['prefix']
-        sufix = category_info['sufix']
-        metric_name = re.sub(r'[\W]', '_', prefix + label + sufix + unit)
-        metric_name = re.sub(r'[_]+', '_', metric_name)
-        if metric_name[0].isdigit():
-            metric_name = metric_name.lstrip('0123456789')
+        if extract_unit:
+            reading = parse_sensor_reading(payload[entry]['Sensor Reading'])
+            if reading.unit:
+                unit = '_' + reading.unit.lower()
+        yield entry, unit
+
+
+def _group_metric_names(prefix, sufix, special_label, entry_units):
+    metric_dic = {}
+    for entry, unit in entry_units:
+        metric_name = _metric_name(prefix, sufix, special_label, entry, unit)
         if metric_name in metric_dic:
             metric_dic[metric_name].append(entry)
         else:
@@ -140,6 +159,66 @@ def metric_names(category_info):
     return metric_dic
 
 
+def metric_names(category_info):
+    extract_unit = category_info.get('extra_params').get('extract_unit')
+    special_label = category_info.get('extra_params').get('special_label')
+    return _group_metric_names(
+        category_info['prefix'], category_info['sufix'], special_label,
+        _entry_units(category_info['data'], extract_unit))
+
+
+# Nodes of the same hardware model send payloads with the same structure,
+# a parse plan is kept for each structure seen recently.
+PARSE_PLAN_CACHE_SIZE = 256
+
+
+def _fingerprint(payload):
+    """Describe the structure of an IPMI payload.
+
+    The fingerprint holds, for each known category, its sensor entries in
+    payload order and, for the categories with the unit in the metric name,
+    the units found in the readings. It is all a parse plan depends on.
+    """
+    fingerprint = []
+    for ipmi_category in payload:
+        category_params = CATEGORY_PARAMS.get(ipmi_category.lower())
+        if category_params is None:
+            continue
+        data = payload[ipmi_category]
+        units = None
+        if category_params['extra_params'].get('extract_unit'):
+            units = tuple(unit for _entry, unit in _entry_units(data, True))
+        fingerprint.append((ipmi_category, tuple(data), units))
+    return tuple(fingerprint)
+
+
+@functools.lru_cache(maxsize=PARSE_PLAN_CACHE_SIZE)
+def _parse_plan(fingerprint):
+    """Compile the parse plan of an IPMI payload structure.
+
+    :param fingerprint: Structure of the payload, see :func:`_fingerprint`.
+    :returns: Tuple of ``(category, category params, available metrics)``
+        where the available metrics map each metric name to the tuple of
+        its sensor entries, as :func:`metric_names` would.
+    """
+    plan = []
+    for ipmi_category, entries, units in fingerprint:
+        category_params = CATEGORY_PARAMS[ipmi_category.lower()]
+        if units is None:
+            units = ('',) * len(entries)
+        available_metrics = _group_metric_names(
+            category_params['prefix'], category_params['sufix'],
+            category_params['extra_params'].get('special_label'),
+            zip(entries, units))
+        plan.append((ipmi_category, category_params,
+                     {metric: tuple(metric_entries) for metric, metric_entries
+                      in available_metrics.items()}))
+    return tuple(plan)
+
+
+self_metrics.register_cache('ipmi_parse_plans', _parse_plan)
+
+
 def extract_labels(entries, category_info):
     """This function extract the labels to be used by a metric
 
@@ -192,57 +271,141 @@ def extract_labels(entries, category_info):
     return entries_labels
 
 
+NO_READING_VALUES = ('No Reading', 'Disabled')
+
+SensorReading = collections.namedtuple(
+    'SensorReading', ['value', 'unit', 'state', 'numeric'])
+
+# The same readings come back on every poll, especially the discrete ones
+# like '0h', so the tokenized readings are cached.
+SENSOR_READING_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=SENSOR_READING_CACHE_SIZE)
+def parse_sensor_reading(sensor_reading):
+    """Tokenize an IPMI 'Sensor Reading' string.
+
+    e.g: '23 (+/- 0) degrees C' gives SensorReading(23.0, 'C', None, True)
+         '5880 (+/- 0) RPM' gives SensorReading(5880.0, 'RPM', None, True)
+         '0h' gives SensorReading(0.0, '', '0h', True)
+         '2eh' gives SensorReading(1.0, '', '2eh', True)
+         'No Reading' gives SensorReading(None, '', 'No Reading', False)
+
+    :param sensor_reading: The 'Sensor Reading' of a sensor.
+    :returns: A SensorReading with the value as a float, None if there is
+        no valid value, the unit of analog readings, the state of discrete
+        readings and whether the reading starts with a number.
+    """
+    if sensor_reading in NO_READING_VALUES:
+        return SensorReading(None, '', sensor_reading, False)
+    tokens = sensor_reading.split()
+    if not tokens:
+        return SensorReading(None, '', None, False)
+    first = tokens[0]
+    numeric = NUMBER_RE.search(first) is not None
+    if len(tokens) > 1:
+        try:
+            value = float(first)
+        except ValueError:
+            value = None
+        return SensorReading(value, tokens[-1], None, numeric)
+    # NOTE: discrete readings are in the ipmi format, 0h is published as 0
+    # and the other values as 1.
+    return SensorReading(0.0 if first == '0h' else 1.0, '', first, numeric)
+
+
+self_metrics.register_cache('ipmi_sensor_readings', parse_sensor_reading)
+
+
+def _sensor_value(sensor_reading, use_ipmi_format):
+    """Extract the value of a sensor from its reading.
+
+    :param sensor_reading: The 'Sensor Reading' of the sensor, which must
+        not be one of NO_READING_VALUES.
+    :param use_ipmi_format: Whether single word readings are in the ipmi
+        format. Otherwise the reading must start with a number.
+    :raises ValueError: if the reading has no valid value.
+    """
+    reading = parse_sensor_reading(sensor_reading)
+    if reading.value is None or (not use_ipmi_format and
+                                 not reading.numeric):
+        raise ValueError("No valid value in Sensor Reading")
+    return reading.value
+
+
 def extract_values(entries, category_info):
     values = {}
     for entry in entries:
         try:
-            no_values = ['No Reading', 'Disabled']
-            if category_info['data'][entry]['Sensor Reading'] in no_values:
+            sensor_reading = category_info['data'][entry]['Sensor Reading']
+            if sensor_reading in NO_READING_VALUES:
                 values[entry] = None
             else:
-                sensor_values = (category_info['data'][entry]
-                                 ['Sensor Reading'].split())
-                if not category_info['use_ipmi_format']:
-                    if not re.search(r'(\d+(\.\d*)?|\.\d+)', sensor_values[0]):
-                        raise Exception("No valid value in Sensor Reading")
-                    values[entry] = sensor_values[0]
-                if len(sensor_values) > 1:
-                    values[entry] = sensor_values[0]
-                elif sensor_values[0] == "0h":
-                    values[entry] = 0
-                else:
-                    values[entry] = 1
+                values[entry] = _sensor_value(
+                    sensor_reading, category_info['use_ipmi_format'])
         except Exception as e:
             LOG.exception(e)
     return values
 
 
 def prometheus_format(category_info, ipmi_metric_registry, available_metrics):
-    for metric in available_metrics:
-        entries = available_metrics[metric]
-        labels = extract_labels(entries, category_info)
-        values = extract_values(entries, category_info)
-        if all(v is None for v in values.values()):
+    """Register the metrics of a category reading each sensor only once.
+
+    Produces the same metrics as combining :func:`extract_labels` and
+    :func:`extract_values` for every metric, but labels and value of each
+    sensor entry are built in a single pass over it. Entries that can't be
+    parsed are logged and skipped.
+    """
+    data = category_info['data']
+    use_ipmi_format = category_info['use_ipmi_format']
+    node_labels = {'node_name': category_info['node_name'],
+                   'node_uuid': category_info['node_uuid'],
+                   'instance_uuid': category_info['instance_uuid']}
+    if not category_info['node_name']:
+        del node_labels['node_name']
+    ipe_utils.update_instance_uuid(node_labels)
+
+    for metric, entries in available_metrics.items():
+        samples = []
+        has_value = False
+        for entry in entries:
+            try:
+                sensor = data[entry]
+                sensor_reading = sensor['Sensor Reading']
+                value = None
+                if sensor_reading not in NO_READING_VALUES:
+                    value = _sensor_value(sensor_reading, use_ipmi_format)
+                labels = dict(node_labels, entity_id=sensor['Entity ID'],
+                              sensor_id=sensor['Sensor ID'])
+                status = sensor.get('Status')
+                if status:
+                    labels['status'] = status
+            except Exception as e:
+                LOG.exception(e)
+                continue
+            samples.append((labels, value))
+            has_value = has_value or value is not None
+
+        if not has_value:
             continue
         desc = descriptions.get_metric_description('ipmi', metric)
         g = Gauge(metric, desc,
-                  labelnames=list(labels.get(entries[0])),
+                  labelnames=list(samples[0][0]),
                   registry=ipmi_metric_registry)
-        for e in entries:
-            if values[e] is None:
+        for labels, value in samples:
+            if value is None:
                 continue
-            valid_labels = ipe_utils.update_instance_uuid(labels[e])
-            g.labels(**valid_labels).set(values[e])
+            g.labels(**labels).set(value)
 
 
 def category_registry(node_message, ipmi_metric_registry):
-    for ipmi_category in node_message['payload']:
-        if ipmi_category.lower() in CATEGORY_PARAMS:
-            category_dict = CATEGORY_PARAMS[ipmi_category.lower()].copy()
-            category_dict['data'] = node_message['payload'][ipmi_category]
-            category_dict['node_name'] = node_message['node_name']
-            category_dict['node_uuid'] = node_message['node_uuid']
-            category_dict['instance_uuid'] = node_message['instance_uuid']
-            available_metrics = metric_names(category_dict)
-            prometheus_format(category_dict, ipmi_metric_registry,
-                              available_metrics)
+    payload = node_message['payload']
+    plan = _parse_plan(_fingerprint(payload))
+    for ipmi_category, category_params, available_metrics in plan:
+        category_dict = category_params.copy()
+        category_dict['data'] = payload[ipmi_category]
+        category_dict['node_name'] = node_message['node_name']
+        category_dict['node_uuid'] = node_message['node_uuid']
+        category_dict['instance_uuid'] = node_message['instance_uuid']
+        prometheus_format(category_dict, ipmi_metric_registry,
+                          available_metrics)
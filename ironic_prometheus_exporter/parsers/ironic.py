@@ -10,120 +10,235 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import functools
 import logging
+import time
 
 from prometheus_client import Gauge
 
+from ironic_prometheus_exporter import self_metrics
+from ironic_prometheus_exporter import utils as ipe_utils
+
 
 LOG = logging.getLogger(__name__)
 
 
-def category_registry(message, metrics_registry):
+# NOTE: The metric keys only depend on the ironic release, so there are as
+# many translations to cache as there are timers, gauges and counters
+# defined in ironic.
+KEY_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=KEY_CACHE_SIZE)
+def _translate_key(key):
+    """Translate a dotted ironic metric key into a Prometheus metric name.
+
+    :param key: Metric key from the ironic.metrics payload
+    :returns: Tuple of the metric name, the component and the driver (None
+        when the component is not a driver), or None for unknown keys.
+    """
+    driver = None
+    if key.startswith('ironic.api'):
+        # This is only *really* to be expected in a combined single
+        # process mode, or if someone is using the exporter coupled
+        # with the API service itself.
+        formatted_key = key.replace(
+            'ironic.api.controllers.',
+            'ironic_rest_api_')
+        component = 'api'
+
+    elif key.startswith('ironic.drivers.modules'):
+        # Deconstruct driver entries/counters to be more sane and attach
+        # labeling to them.
+        formatted_key = 'ironic.' + key.removeprefix(
+            'ironic.drivers.modules.')
+
+        for driver_label in ['ipmi', 'redfish', 'agent', 'pxe',
+                             'ilo', 'drac', 'irmc', 'inspector', 'ansible',
+                             'ibmc', 'xclarity']:
+            if driver_label in key:
+                # since Dell's driver name doesn't match the code
+                # classpath drac, driver name is idrac.
+                driver = driver_label
+        # NOTE(TheJulia): WRT, drac, Technically this should be idrac
+
+        # To have the names of the metrics make sense, we need to handle
+        # structural folder names in the file/driver structure, which
+        # varies from driver to driver.
+        for driver_dir in ['redfish', 'ipmi', 'network', 'storage', 'drac',
+                           'ilo', 'irmc', 'intel_ipmi', 'ansible', 'ibmc',
+                           'xclarity']:
+            if driver_dir in formatted_key:
+                formatted_key = formatted_key.replace(
+                    f'.{driver_dir}.', '.')
+                # Everything here should be one and done...
+                # Famous. Last. Words.
+                break
+
+        # Now remove the filenames. This is extraineous ironic internal
+        # structural information where the classes are housed, not the
+        # actual methods or class names.
+        for filename in ['boot', 'raid', 'power', 'bios', 'inspect',
+                         'management', 'agent_base', 'agent_client',
+                         'agent', 'deploy_utils', 'deploy', 'ipmitool',
+                         'pxe_base', 'pxe', 'ramdisk', 'vendor_passthru',
+                         'vendor']:
+            if filename in formatted_key:
+                formatted_key = formatted_key.replace(f'.{filename}.', '.')
+                break
+
+        component = 'driver'
+
+    elif key.startswith('ironic.conductor'):
+        # Catches entries from:
+        # - ironic.conductor.manager
+        # - ironic.conductor.deployments
+        component = 'conductor'
+
+        formatted_key = 'ironic_' + key.removeprefix(
+            'ironic.conductor.manager.')
+        for filename in ['manager', 'deployments', 'allocations']:
+            if filename in key:
+                formatted_key = key.replace(f'conductor.{filename}', '')
+                break
+
+    else:
+        return None
+
+    # Prometheus does not use dot delimited data structures
+    # so we need to rename it to be underscore delimited.
+    # Downside of this is we end up with things like double
+    # underscores from method names, but it should be still clear
+    # where something is coming from.
+    # i.e.
+    # In: ironic.conductor.manager.ConductorManager.do_sync_power_state
+    # Out: ironic_conductormanager_do_sync_power_state
+
+    formatted_key = formatted_key.replace('.', '_')
+    if '__' in formatted_key:
+        # Remove entries introduced via private methods with metrics
+        # decorators defined on them.
+        formatted_key = formatted_key.replace('__', '_')
+    formatted_key = formatted_key.lower()
+    # Remove ConductorManager, because it gets confusing as that is the
+    # Internal class name
+    return formatted_key, component, driver
+
+
+self_metrics.register_cache('ironic_metric_keys', _translate_key)
+
+
+class TimerHistory(object):
+    """Previous timer samples of each conductor.
+
+    Ironic timers are only reported as a running total time and call count,
+    keeping the previous sample allows to derive what happened during the
+    last interval without relying on PromQL.
+    """
+
+    def __init__(self):
+        self.samples = {}
+
+    def update(self, hostname, key, timestamp, total, count):
+        """Record a timer sample and compute the change since the last one.
+
+        :param hostname: Conductor reporting the timer
+        :param key: Metric key from the ironic.metrics payload
+        :param timestamp: Time of the payload, in seconds since the epoch
+        :param total: Total time (ms) spent in the timer
+        :param count: Number of calls recorded by the timer
+        :returns: Tuple of the interval in seconds, the calls and the time
+            (ms) spent during the interval, or None when there is no usable
+            previous sample.
+        """
+        previous = self.samples.get((hostname, key))
+        if previous is not None and timestamp <= previous[0]:
+            # Duplicated or out of order message, keep the newest sample.
+            return None
+        self.samples[(hostname, key)] = (timestamp, total, count)
+        if previous is None:
+            return None
+
+        previous_timestamp, previous_total, previous_count = previous
+        calls = count - previous_count
+        spent = total - previous_total
+        if calls < 0 or spent < 0:
+            # The conductor restarted, its timers started again from zero.
+            calls, spent = count, total
+        return timestamp - previous_timestamp, calls, spent
+
+    def reset(self):
+        self.samples.clear()
+
+
+TIMER_HISTORY = TimerHistory()
+
+
+def _payload_time(message):
+    """Time of an ironic.metrics payload in seconds since the epoch."""
+    timestamp = message.get('timestamp')
+    if timestamp:
+        try:
+            return ipe_utils.parse_timestamp(timestamp)
+        except ValueError:
+            LOG.warning('Invalid conductor timestamp format: %s', timestamp)
+    return time.time()
+
+
+def _timer_rates_registry(formatted_key, labels, rates, metrics_registry):
+    interval, calls, spent = rates
+    metric = Gauge(formatted_key + '_calls_per_second',
+                   'Calls per second during the last interval.',
+                   labelnames=list(labels.keys()),
+                   registry=metrics_registry)
+    metric.labels(**labels).set(calls / interval)
+    metric = Gauge(formatted_key + '_call_count_delta',
+                   'Calls recorded during the last interval.',
+                   labelnames=list(labels.keys()),
+                   registry=metrics_registry)
+    metric.labels(**labels).set(calls)
+    if calls:
+        # There is no mean time without calls, the series is left out
+        # rather than reported as 0 ms.
+        metric = Gauge(formatted_key + '_mean_ms',
+                       'Mean time (ms) per call during the last interval.',
+                       labelnames=list(labels.keys()),
+                       registry=metrics_registry)
+        metric.labels(**labels).set(spent / calls)
+
+
+def category_registry(message, metrics_registry, derive_timer_rates=False):
     """Parse ironic metrics and submit them to Prometheus
 
     :param node_message: Oslo notification message
     :param metrics_registry: Prometheus registry
+    :param derive_timer_rates: Whether to also submit the calls per second,
+        calls and mean time per call of the timers since the previous
+        message of the same conductor.
     """
 
     hostname = message.get('hostname')
     payload = message.get('payload')
     service = 'ironic'
+    if derive_timer_rates:
+        timestamp = _payload_time(message)
     for key in payload.keys():
         value = payload[key]
         metric_type = value['type']
-        driver = None
-        labels = {'hostname': hostname,
-                  'service': service}
-
-        if key.startswith('ironic.api'):
-            # This is only *really* to be expected in a combined single
-            # process mode, or if someone is using the exporter coupled
-            # with the API service itself.
-            formatted_key = key.replace(
-                'ironic.api.controllers.',
-                'ironic_rest_api_')
-            labels['component'] = 'api'
-
-        elif key.startswith('ironic.drivers.modules'):
-            # Deconstruct driver entries/counters to be more sane and attach
-            # labeling to them.
-            formatted_key = 'ironic.' + key.removeprefix(
-                'ironic.drivers.modules.')
-
-            for driver_label in ['ipmi', 'redfish', 'agent', 'pxe',
-                                 'ilo', 'drac', 'irmc', 'inspector', 'ansible',
-                                 'ibmc', 'xclarity']:
-                if driver_label in key:
-                    # since Dell's driver name doesn't match the code
-                    # classpath drac, driver name is idrac.
-                    driver = driver_label
-            # NOTE(TheJulia): WRT, drac, Technically this should be idrac
-
-            # To have the names of the metrics make sense, we need to handle
-            # structural folder names in the file/driver structure, which
-            # varies from driver to driver.
-            for driver_dir in ['redfish', 'ipmi', 'network', 'storage', 'drac',
-                               'ilo', 'irmc', 'intel_ipmi', 'ansible', 'ibmc',
-                               'xclarity']:
-                if driver_dir in formatted_key:
-                    formatted_key = formatted_key.replace(
-                        f'.{driver_dir}.', '.')
-                    # Everything here should be one and done...
-                    # Famous. Last. Words.
-                    break
-
-            # Now remove the filenames. This is extraineous ironic internal
-            # structural information where the classes are housed, not the
-            # actual methods or class names.
-            for filename in ['boot', 'raid', 'power', 'bios', 'inspect',
-                             'management', 'agent_base', 'agent_client',
-                             'agent', 'deploy_utils', 'deploy', 'ipmitool',
-                             'pxe_base', 'pxe', 'ramdisk', 'vendor_passthru',
-                             'vendor']:
-                if filename in formatted_key:
-                    formatted_key = formatted_key.replace(f'.{filename}.', '.')
-                    break
-
-            labels['component'] = 'driver'
-            labels['driver'] = driver
-
-        elif key.startswith('ironic.conductor'):
-            # Catches entries from:
-            # - ironic.conductor.manager
-            # - ironic.conductor.deployments
-            labels['component'] = 'conductor'
-
-            formatted_key = 'ironic_' + key.removeprefix(
-                'ironic.conductor.manager.')
-            for filename in ['manager', 'deployments', 'allocations']:
-                if filename in key:
-                    formatted_key = key.replace(f'conductor.{filename}', '')
-                    break
-
-        else:
+        translation = _translate_key(key)
+        if translation is None:
             # Unknown key type, skip it
-            LOG.debug(f'Skipping unknown metric key: {key}')
+            LOG.debug('Skipping unknown metric key: %s', key)
             continue
 
-        # Prometheus does not use dot delimited data structures
-        # so we need to rename it to be underscore delimited.
-        # Downside of this is we end up with things like double
-        # underscores from method names, but it should be still clear
-        # where something is coming from.
-        # i.e.
-        # In: ironic.conductor.manager.ConductorManager.do_sync_power_state
-        # Out: ironic_conductormanager_do_sync_power_state
-
-        formatted_key = formatted_key.replace('.', '_')
-        if '__' in formatted_key:
-            # Remove entries introduced via private methods with metrics
-            # decorators defined on them.
-            formatted_key = formatted_key.replace('__', '_')
-        formatted_key = formatted_key.lower()
-        # Remove ConductorManager, because it gets confusing as that is the
-        # Internal class name
-
-        LOG.debug(f'Creating metric {key} using {formatted_key}.')
+        formatted_key, component, driver = translation
+        labels = {'hostname': hostname,
+                  'service': service,
+                  'component': component}
+        if component == 'driver':
+            labels['driver'] = driver
+
+        LOG.debug('Creating metric %s using %s.', key, formatted_key)
 
         # Always process timer first. The bulk of our Metrics in Ironic
         # are timer counters.
@@ -136,9 +251,6 @@ def category_registry(message, metrics_registry):
             # Hopefully this will be useful. The reason it is not just
             # two counter values, is each counter value in prometheus_client
             # gets a _created child sample, which creates a lot of confusion.
-            LOG.debug(f'Details of the metric {formatted_key} with labels '
-                      '{labels}, sum: %s, count: %s', value['sum'],
-                      value['count'])
             metric = Gauge(formatted_key + '_time', 'Total time (ms) spent.',
                            labelnames=list(labels.keys()),
                            registry=metrics_registry)
@@ -148,9 +260,15 @@ def category_registry(message, metrics_registry):
                            labelnames=list(labels.keys()),
                            registry=metrics_registry)
             metric.labels(**labels).set(value['count'])
-            LOG.debug(f'Details of the metric {formatted_key} with labels '
-                      '{labels}, sum: %s, count: %s', value['sum'],
+            LOG.debug('Details of the metric %s with labels %s, sum: %s, '
+                      'count: %s', formatted_key, labels, value['sum'],
                       value['count'])
+            if derive_timer_rates:
+                rates = TIMER_HISTORY.update(hostname, key, timestamp,
+                                             value['sum'], value['count'])
+                if rates is not None:
+                    _timer_rates_registry(formatted_key, labels, rates,
+                                          metrics_registry)
             next
 
         elif metric_type == 'gauge':
@@ -158,8 +276,8 @@ def category_registry(message, metrics_registry):
                            labelnames=list(labels.keys()),
                            registry=metrics_registry)
             metric.labels(**labels).set(value['value'])
-            LOG.debug(f'Details of the metric {formatted_key} with labels '
-                      '{labels}, value: %s', value['value'])
+            LOG.debug('Details of the metric %s with labels %s, value: %s',
+                      formatted_key, labels, value['value'])
 
         elif metric_type == 'counter':
             # NOTE(TheJulia): We use a gauge instead of of a counter because
@@ -173,5 +291,5 @@ def category_registry(message, metrics_registry):
             # Prometheus_client doesn't directly expose a counter method
             # to set a counter value directly.
             metric.labels(**labels).set(value['count'])
-            LOG.debug(f'Details of the metric {formatted_key} with labels '
-                      '{labels}, value: %s', value['count'])
+            LOG.debug('Details of the metric %s with labels %s, value: %s',
+                      formatted_key, labels, value['count'])
@@ -12,6 +12,7 @@
 
 import collections
 import logging
+import types
 
 from prometheus_client import Gauge
 
@@ -29,6 +30,66 @@ HEALTH_MAP = {
 }
 
 
+# Describes how the sensors of a section of the Redfish payload become
+# metrics:
+# - sensor_type: key of the section in the payload.
+# - reading_field: sensor field holding a reading published as is, if any.
+# - reading_metric: name template of the reading metric, formatted with the
+#   lowercased values of the name_fields of the sensor.
+# - name_fields: sensor fields required to build the reading metric name.
+# - status_metric: name of the metric publishing the health of the sensor.
+# - health_map: health of the sensor to status metric value.
+# - require_health: skip sensors without a known health, otherwise their
+#   status metric is published without value.
+# - ignore_keys: sensor fields not to use as labels.
+SensorRule = collections.namedtuple(
+    'SensorRule', ['sensor_type', 'reading_field', 'reading_metric',
+                   'name_fields', 'status_metric', 'health_map',
+                   'require_health', 'ignore_keys'])
+
+TEMPERATURE_RULE = SensorRule(
+    sensor_type='Temperature',
+    reading_field='reading_celsius',
+    reading_metric='baremetal_temp_{physical_context}_celsius',
+    name_fields=('physical_context',),
+    status_metric='baremetal_temperature_status',
+    health_map=HEALTH_MAP,
+    require_health=False,
+    ignore_keys=('reading_celsius',))
+
+POWER_RULE = SensorRule(
+    sensor_type='Power',
+    reading_field=None,
+    reading_metric=None,
+    name_fields=(),
+    status_metric='baremetal_power_status',
+    health_map=HEALTH_MAP,
+    require_health=True,
+    ignore_keys=('last_power_output_watts', 'line_input_voltage'))
+
+FAN_RULE = SensorRule(
+    sensor_type='Fan',
+    reading_field=None,
+    reading_metric=None,
+    name_fields=(),
+    status_metric='baremetal_fan_status',
+    health_map=HEALTH_MAP,
+    require_health=True,
+    ignore_keys=('reading', 'reading_units'))
+
+DRIVE_RULE = SensorRule(
+    sensor_type='Drive',
+    reading_field=None,
+    reading_metric=None,
+    name_fields=(),
+    status_metric='baremetal_drive_status',
+    health_map=HEALTH_MAP,
+    require_health=True,
+    ignore_keys=())
+
+SENSOR_RULES = (TEMPERATURE_RULE, POWER_RULE, FAN_RULE, DRIVE_RULE)
+
+
 def _build_labels(node_message):
     fields = ['node_name', 'node_uuid', 'instance_uuid']
     if not node_message['node_name']:
@@ -49,6 +110,35 @@ def _build_labels(node_message):
     return labels
 
 
+def _build_node_labels(node_message):
+    """Build the labels shared by all the sensors of a node message.
+
+    :param node_message: Oslo notification message
+    :returns: Read-only mapping of the node labels, the sensors labels are
+        layered on top of it without copying it.
+    """
+    labels = _build_labels(node_message)
+    ipe_utils.update_instance_uuid(labels)
+    return types.MappingProxyType(labels)
+
+
+def node_info_registry(node_message, metrics_registry):
+    """Write the node attributes once, in the baremetal_node_info metric.
+
+    :param node_message: Oslo notification message
+    :param metrics_registry: Prometheus registry
+    :returns: Node labels the sensors keep, only the node UUID joining them
+        with the info metric.
+    """
+    labels = _build_node_labels(node_message)
+    metric = 'baremetal_node_info'
+    desc = descriptions.get_metric_description('redfish', metric)
+    gauge = Gauge(metric, desc, labelnames=list(labels),
+                  registry=metrics_registry)
+    gauge.labels(**labels).set(1)
+    return types.MappingProxyType({'node_uuid': labels['node_uuid']})
+
+
 def _build_sensor_labels(sensor_labels, sensor_id, sensor_data, ignore_keys):
     for k, v in sensor_data.items():
         if k not in ignore_keys and v is not None:
@@ -70,42 +160,76 @@ def _extract_sensor_payload(node_message, sensor_type):
     return payload
 
 
-def _build_generic_sensor_metrics(
-        node_message, sensor_type, metrics_builder_fn, ignore_keys=None):
-    """Generic function to build sensor metrics from Oslo message.
+def _apply_sensor_rule(rule, sensor_data):
+    """Build the metrics of a sensor following its sensor type rule.
 
-    :param node_message: Oslo notification message
-    :param sensor_type: Type of sensor (Temperature, Power, Fan, Drive)
-    :param metrics_builder_fn: Function to build metrics dict from sensor_data
-    :param ignore_keys: List of keys to ignore when building sensor labels
-    :returns: Dictionary of metrics with (value, labels) tuples
+    :param rule: SensorRule of the sensor type
+    :param sensor_data: Sensor fields
+    :returns: Dictionary of metric name to value, or None if the sensor
+        must be skipped
     """
-    if ignore_keys is None:
-        ignore_keys = []
+    metrics = {}
+    if rule.reading_field:
+        name_values = {}
+        for field in rule.name_fields:
+            if not sensor_data.get(field):
+                LOG.debug('Missing %s in %s sensor', field,
+                          rule.sensor_type.lower())
+                return None
+            name_values[field] = sensor_data[field].lower()
+        reading = sensor_data.get(rule.reading_field)
+        if reading is None:
+            LOG.debug('Missing %s in %s sensor', rule.reading_field,
+                      rule.sensor_type.lower())
+            return None
+        metrics[rule.reading_metric.format(**name_values)] = reading
 
-    payload = _extract_sensor_payload(node_message, sensor_type)
-    metrics = collections.defaultdict(list)
+    health = sensor_data.get('health')
+    health_value = rule.health_map.get(health)
+    if rule.require_health:
+        if not health:
+            LOG.debug('Missing health field in %s sensor',
+                      rule.sensor_type.lower())
+            return None
+        if health_value is None:
+            LOG.debug('Unknown health value %s in %s sensor', health,
+                      rule.sensor_type.lower())
+            return None
+    metrics[rule.status_metric] = health_value
+    return metrics
+
+
+def _build_sensor_metrics(rule, sensors, node_labels, metrics):
+    """Add the metrics of the sensors of a payload section to metrics.
 
-    for sensor_id, sensor_data in payload.items():
+    :param rule: SensorRule of the section
+    :param sensors: The section of the payload, sensor id to sensor fields
+    :param node_labels: Node labels from _build_node_labels
+    :param metrics: Dictionary of metric name to the list of
+        (value, labels) tuples to add the metrics to
+    """
+    for sensor_id, sensor_data in sensors.items():
         try:
             state = sensor_data.get('state')
             if not state:
                 LOG.debug('Skipping %s sensor %s: missing state field',
-                          sensor_type, sensor_id)
+                          rule.sensor_type, sensor_id)
                 continue
             if state.lower() != 'enabled':
                 LOG.debug('Skipping %s sensor %s: state is %s',
-                          sensor_type, sensor_id, state)
+                          rule.sensor_type, sensor_id, state)
                 continue
 
-            # Build metrics using the provided function
-            sensor_metrics = metrics_builder_fn(sensor_data)
+            sensor_metrics = _apply_sensor_rule(rule, sensor_data)
             if sensor_metrics is None:
                 continue
 
-            # Build labels
-            labels = _build_labels(node_message)
-            _build_sensor_labels(labels, sensor_id, sensor_data, ignore_keys)
+            # Build labels, only the sensor labels are allocated for each
+            # sensor, the node labels are shared.
+            labels = collections.ChainMap(
+                _build_sensor_labels({}, sensor_id, sensor_data,
+                                     rule.ignore_keys),
+                node_labels)
 
             # Add metrics to result
             for name, value in sensor_metrics.items():
@@ -113,19 +237,42 @@ def _build_generic_sensor_metrics(
 
         except Exception as e:
             LOG.exception('Error processing %s sensor %s: %s',
-                          sensor_type, sensor_id, e)
+                          rule.sensor_type, sensor_id, e)
             continue
 
+
+def build_metrics(node_message, node_labels=None, rules=SENSOR_RULES):
+    """Build Prometheus metrics of all the sensor types from Oslo message.
+
+    The payload is walked once, each of its sections is handled by the rule
+    of its sensor type. Metrics with the same name coming from different
+    sections are merged.
+
+    :param node_message: Oslo notification message
+    :param node_labels: Node labels shared by the sensors, built from the
+        message if not provided.
+    :param rules: SensorRule of the sensor types to build metrics for
+    :returns: Dictionary of metrics with (value, labels) tuples, where the
+        labels are a mapping of the sensor labels over the node labels.
+    """
+    if node_labels is None:
+        node_labels = _build_node_labels(node_message)
+    metrics = collections.defaultdict(list)
+    for rule in rules:
+        sensors = _extract_sensor_payload(node_message, rule.sensor_type)
+        _build_sensor_metrics(rule, sensors, node_labels, metrics)
     return metrics
 
 
-def build_temperature_metrics(node_message):
+def build_temperature_metrics(node_message, node_labels=None):
     """Build Prometheus temperature metrics from Oslo message.
 
     Takes Oslo notification message carrying Redfish sensor data and
     produces a data structure suitable for submitting to Prometheus.
 
     :param node_message: Oslo notification message
+    :param node_labels: Node labels shared by the sensors, built from the
+        message if not provided.
 
     Examples::
 
@@ -160,41 +307,18 @@ def build_temperature_metrics(node_message):
             ]
         }
     """
-    def _build_temp_metrics(sensor_data):
-        physical_context = sensor_data.get('physical_context')
-        reading_celsius = sensor_data.get('reading_celsius')
-        health = sensor_data.get('health')
-
-        if not physical_context:
-            LOG.debug('Missing physical_context in temperature sensor')
-            return None
-        if reading_celsius is None:
-            LOG.debug('Missing reading_celsius in temperature sensor')
-            return None
+    return build_metrics(node_message, node_labels, rules=(TEMPERATURE_RULE,))
 
-        metric_name = 'baremetal_temp_%s_celsius' % physical_context.lower()
-        health_value = HEALTH_MAP.get(health)
 
-        return {
-            metric_name: reading_celsius,
-            'baremetal_temperature_status': health_value
-        }
-
-    return _build_generic_sensor_metrics(
-        node_message,
-        'Temperature',
-        _build_temp_metrics,
-        ignore_keys=['reading_celsius']
-    )
-
-
-def build_power_metrics(node_message):
+def build_power_metrics(node_message, node_labels=None):
     """Build Prometheus power metrics from Oslo message.
 
     Takes Oslo notification message carrying Redfish sensor data and
     produces a data structure suitable for submitting to Prometheus.
 
     :param node_message: Oslo notification message
+    :param node_labels: Node labels shared by the sensors, built from the
+        message if not provided.
 
     Examples::
 
@@ -218,32 +342,18 @@ def build_power_metrics(node_message):
             ]
         }
     """
-    def _build_power_metrics(sensor_data):
-        health = sensor_data.get('health')
-        if not health:
-            LOG.debug('Missing health field in power sensor')
-            return None
-        health_value = HEALTH_MAP.get(health)
-        if health_value is None:
-            LOG.debug('Unknown health value %s in power sensor', health)
-            return None
-        return {'baremetal_power_status': health_value}
-
-    return _build_generic_sensor_metrics(
-        node_message,
-        'Power',
-        _build_power_metrics,
-        ignore_keys=['last_power_output_watts', 'line_input_voltage']
-    )
+    return build_metrics(node_message, node_labels, rules=(POWER_RULE,))
 
 
-def build_fan_metrics(node_message):
+def build_fan_metrics(node_message, node_labels=None):
     """Build Prometheus fan metrics from Oslo message.
 
     Takes Oslo notification message carrying Redfish sensor data and
     produces a data structure suitable for submitting to Prometheus.
 
     :param node_message: Oslo notification message
+    :param node_labels: Node labels shared by the sensors, built from the
+        message if not provided.
 
     Examples::
 
@@ -267,32 +377,18 @@ def build_fan_metrics(node_message):
             ]
         }
     """
-    def _build_fan_metrics(sensor_data):
-        health = sensor_data.get('health')
-        if not health:
-            LOG.debug('Missing health field in fan sensor')
-            return None
-        health_value = HEALTH_MAP.get(health)
-        if health_value is None:
-            LOG.debug('Unknown health value %s in fan sensor', health)
-            return None
-        return {'baremetal_fan_status': health_value}
-
-    return _build_generic_sensor_metrics(
-        node_message,
-        'Fan',
-        _build_fan_metrics,
-        ignore_keys=['reading', 'reading_units']
-    )
+    return build_metrics(node_message, node_labels, rules=(FAN_RULE,))
 
 
-def build_drive_metrics(node_message):
+def build_drive_metrics(node_message, node_labels=None):
     """Build Prometheus drive metrics from Oslo message.
 
     Takes Oslo notification message carrying Redfish sensor data and
     produces a data structure suitable for submitting to Prometheus.
 
     :param node_message: Oslo notification message
+    :param node_labels: Node labels shared by the sensors, built from the
+        message if not provided.
 
     Examples::
 
@@ -316,49 +412,42 @@ def build_drive_metrics(node_message):
             ]
         }
     """
-    def _build_drive_metrics(sensor_data):
-        health = sensor_data.get('health')
-        if not health:
-            LOG.debug('Missing health field in drive sensor')
-            return None
-        health_value = HEALTH_MAP.get(health)
-        if health_value is None:
-            LOG.debug('Unknown health value %s in drive sensor', health)
-            return None
-        return {'baremetal_drive_status': health_value}
-
-    return _build_generic_sensor_metrics(
-        node_message,
-        'Drive',
-        _build_drive_metrics,
-        ignore_keys=[]
-    )
+    return build_metrics(node_message, node_labels, rules=(DRIVE_RULE,))
 
 
-def category_registry(node_message, metrics_registry):
+def category_registry(node_message, metrics_registry, node_info=False,
+                      rules=SENSOR_RULES):
     """Parse Redfish metrics and submit them to Prometheus
 
     :param node_message: Oslo notification message
     :param metrics_registry: Prometheus registry
+    :param node_info: Write the node name, instance UUID and ``Extra``
+        fields in the ``baremetal_node_info`` metric instead of on every
+        sensor series, which only keep the node UUID.
+    :param rules: SensorRule of the sensor types to build metrics for
     """
-    metrics = build_temperature_metrics(node_message)
-    metrics.update(build_power_metrics(node_message))
-    metrics.update(build_fan_metrics(node_message))
-    metrics.update(build_drive_metrics(node_message))
+    node_labels = None
+    if node_info:
+        node_labels = node_info_registry(node_message, metrics_registry)
+    metrics = build_metrics(node_message, node_labels, rules=rules)
 
     for metric, details in metrics.items():
 
         LOG.debug('Creating metric %s', metric)
         LOG.debug('Details of the metric: %s', details)
         # details is a list of tuples that contains 2 elements (value, labels)
-        # let's get the first tuple and the dict of labels to extract the
-        # list of labels necessary for the Gauge
-        metric_labels = details[0][1]
+        # the samples of a metric can come from sensors, or rules, with
+        # different fields, the Gauge gets the union of their label names
+        # and the labels a sample lacks are set empty.
+        labelnames = list(dict.fromkeys(
+            name for _value, labels in details for name in labels))
         desc = descriptions.get_metric_description('redfish', metric)
-        gauge = Gauge(metric, desc, labelnames=list(metric_labels),
+        gauge = Gauge(metric, desc, labelnames=labelnames,
                       registry=metrics_registry)
 
         for value, labels in details:
-            valid_labels = ipe_utils.update_instance_uuid(labels)
-            if value is not None:
-                gauge.labels(**valid_labels).set(value)
+            if value is None:
+                continue
+            if len(labels) != len(labelnames):
+                labels = {name: labels.get(name, '') for name in labelnames}
+            gauge.labels(**labels).set(value)
@@ -0,0 +1,146 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Recordings of notifications, one JSON document per line.
+
+Each line holds the time the notification was received, its priority and
+the notification itself, so it can be fed again to the notifier driver by
+the ``ironic-prometheus-exporter-replay`` command.
+
+Compressed recordings hold one gzip member per line. A process stopping
+without closing its writer, or another one appending to the same file, then
+never leaves a member without its trailer that would break the reading of
+the lines following it.
+"""
+
+import gzip
+import json
+import os
+import re
+import threading
+import time
+
+
+RECORDING_NAME = 'notifications.jsonl'
+GZIP_MAGIC = b'\x1f\x8b'
+
+ROTATED_RE = re.compile(r'\.(\d+)$')
+
+
+class RecordingWriter(object):
+    """Append notifications to a recording file, rotating it by size.
+
+    Like ``logging.handlers.RotatingFileHandler``, once the file reaches
+    ``max_bytes`` it is renamed with a ``.1`` suffix, the previous ``.1``
+    becoming ``.2`` and so on up to ``backup_count`` files.
+
+    :param directory: Directory of the recording files.
+    :param max_bytes: Size in bytes of a recording file before it is
+        rotated, 0 never rotates it.
+    :param backup_count: Rotated files to keep.
+    :param compress: Whether to compress the recording files with gzip.
+    """
+
+    def __init__(self, directory, max_bytes=0, backup_count=0,
+                 compress=False):
+        self.path = os.path.join(directory, RECORDING_NAME)
+        if compress:
+            self.path += '.gz'
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.compress = compress
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        self._file = open(self.path, 'ab')
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+
+    def _rotate(self):
+        self._close()
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = '%s.%d' % (self.path, index)
+                if os.path.exists(source):
+                    os.replace(source, '%s.%d' % (self.path, index + 1))
+            os.replace(self.path, self.path + '.1')
+        else:
+            os.remove(self.path)
+
+    def write(self, message, priority, received_at=None):
+        """Append a notification to the recording.
+
+        :param message: Notification, as given to the notifier driver.
+        :param priority: Priority of the notification.
+        :param received_at: Time the notification was received, in seconds
+            since the epoch, now by default.
+        """
+        if received_at is None:
+            received_at = time.time()
+        line = json.dumps({'received_at': received_at,
+                           'priority': priority,
+                           'message': message},
+                          separators=(',', ':'), default=str)
+        data = line.encode('utf-8') + b'\n'
+        if self.compress:
+            data = gzip.compress(data)
+        with self._lock:
+            if self._file is None:
+                self._open()
+            self._file.write(data)
+            self._file.flush()
+            if self.max_bytes and self._file.tell() >= self.max_bytes:
+                self._rotate()
+
+
+def recording_files(path):
+    """List the recording files of a path, oldest first.
+
+    :param path: Recording file, or directory written by
+        :class:`RecordingWriter` in which case its rotated files are
+        included, the most rotated being the oldest.
+    """
+    if not os.path.isdir(path):
+        return [path]
+
+    def rotation(name):
+        match = ROTATED_RE.search(name)
+        return -int(match.group(1)) if match else 0
+
+    names = [name for name in os.listdir(path)
+             if name.startswith(RECORDING_NAME)]
+    return [os.path.join(path, name) for name in sorted(names, key=rotation)]
+
+
+def read_records(path):
+    """Iterate over the records of a recording file.
+
+    Compressed files are detected from their content, not their name.
+
+    :returns: Iterator of dicts with the ``received_at``, ``priority`` and
+        ``message`` keys.
+    """
+    with open(path, 'rb') as f:
+        compressed = f.read(2) == GZIP_MAGIC
+    opener = gzip.open if compressed else open
+    with opener(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,233 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Rename and relabel the metrics when they are produced.
+
+The rules are read from a JSON file, a list of rules applied in order::
+
+    [
+        {"action": "drop", "regex": "baremetal_temp_.*_status"},
+        {"action": "rename", "regex": "baremetal_temp_(.*)_celsius",
+         "replacement": "baremetal_temperature_\\1_celsius"},
+        {"action": "label_replace", "metric": "baremetal_.*",
+         "source_label": "sensor_id", "regex": "([^@]*)@.*",
+         "target_label": "sensor", "replacement": "\\1"}
+    ]
+
+* ``drop`` removes the metrics whose name matches ``regex``;
+* ``keep`` removes the metrics whose name does not match ``regex``;
+* ``rename`` renames the metrics whose name matches ``regex`` to
+  ``replacement``, where ``\\1`` or ``\\g<name>`` refer to the groups;
+* ``label_replace`` sets ``target_label`` to ``replacement`` when the value
+  of ``source_label`` matches ``regex``, ``(.*)`` by default, on the
+  metrics whose name matches ``metric``, all of them by default. The label
+  is removed when the replacement is empty.
+
+Regular expressions must match the whole name or value. The rules are
+compiled once, and what they do to a metric name is cached, so the
+regular expressions run once per name rather than on every sample.
+"""
+
+import functools
+import json
+import logging
+import re
+
+from ironic_prometheus_exporter import self_metrics
+from ironic_prometheus_exporter import utils as ipe_utils
+
+
+LOG = logging.getLogger(__name__)
+
+NAME_CACHE_SIZE = 4096
+VALUE_CACHE_SIZE = 4096
+
+ACTIONS = ('drop', 'keep', 'rename', 'label_replace')
+
+METRIC_NAME = re.compile(r'[a-zA-Z_:][a-zA-Z0-9_:]*')
+LABEL_NAME = re.compile(r'[a-zA-Z_][a-zA-Z0-9_]*')
+
+
+def _compile(rule, key, default=None):
+    pattern = rule.get(key, default)
+    if not isinstance(pattern, str):
+        raise ValueError('Relabel rule %s requires a "%s" regular '
+                         'expression' % (rule, key))
+    try:
+        return re.compile(pattern)
+    except re.error as e:
+        raise ValueError('Invalid "%s" regular expression in relabel rule '
+                         '%s: %s' % (key, rule, e))
+
+
+def _label_name(rule, key):
+    name = rule.get(key)
+    if not isinstance(name, str) or not LABEL_NAME.fullmatch(name):
+        raise ValueError('Relabel rule %s requires a valid "%s" label '
+                         'name' % (rule, key))
+    return name
+
+
+def _check_replacement(rule, regex, replacement):
+    """Check the groups a replacement refers to exist in its regex."""
+    # NOTE: the alternative matches the empty string, the groups of the
+    # regex are then all defined, without a value.
+    try:
+        match = re.compile('(?:%s)|(?:)' % regex.pattern).fullmatch('')
+    except re.error:
+        # Global flags can't be nested, the check is skipped.
+        return
+    try:
+        match.expand(replacement)
+    except (re.error, IndexError) as e:
+        raise ValueError('Invalid "replacement" in relabel rule %s: %s'
+                         % (rule, e))
+
+
+class LabelReplace(object):
+    """Compiled ``label_replace`` rule."""
+
+    def __init__(self, rule):
+        self.metric = _compile(rule, 'metric', '.*')
+        self.source_label = _label_name(rule, 'source_label')
+        self.regex = _compile(rule, 'regex', '(.*)')
+        self.target_label = _label_name(rule, 'target_label')
+        self.replacement = rule.get('replacement', '\\1')
+        if not isinstance(self.replacement, str):
+            raise ValueError('Relabel rule %s requires a "replacement" '
+                             'string' % rule)
+        _check_replacement(rule, self.regex, self.replacement)
+        self.replace_value = functools.lru_cache(maxsize=VALUE_CACHE_SIZE)(
+            self._replace_value)
+
+    def _replace_value(self, value):
+        """Replacement of a label value, None when it does not match."""
+        match = self.regex.fullmatch(value)
+        if match is None:
+            return None
+        return match.expand(self.replacement)
+
+    def apply(self, labels):
+        value = labels.get(self.source_label)
+        if value is None:
+            return labels
+        replacement = self.replace_value(value)
+        if replacement is None:
+            return labels
+        labels = dict(labels)
+        if replacement:
+            labels[self.target_label] = replacement
+        else:
+            labels.pop(self.target_label, None)
+        return labels
+
+
+class RelabelRules(object):
+    """Compiled list of relabel rules.
+
+    :param rules: List of rules, as loaded from the rules file.
+    :raises ValueError: if a rule is invalid.
+    """
+
+    def __init__(self, rules):
+        if not isinstance(rules, list):
+            raise ValueError('The relabel rules must be a list')
+        self.rules = []
+        for rule in rules:
+            if not isinstance(rule, dict) or rule.get('action') not in ACTIONS:
+                raise ValueError('Relabel rule %s must have an action out of '
+                                 '%s' % (rule, ', '.join(ACTIONS)))
+            action = rule['action']
+            if action == 'label_replace':
+                compiled = LabelReplace(rule)
+            else:
+                compiled = _compile(rule, 'regex')
+                if action == 'rename':
+                    if not isinstance(rule.get('replacement'), str):
+                        raise ValueError('Relabel rule %s requires a '
+                                         '"replacement" name' % rule)
+                    _check_replacement(rule, compiled, rule['replacement'])
+                    compiled = (compiled, rule['replacement'])
+            self.rules.append((action, compiled))
+        self.plan = functools.lru_cache(maxsize=NAME_CACHE_SIZE)(
+            self._plan)
+        self_metrics.register_cache('relabel_names', self.plan)
+
+    def _plan(self, name):
+        """What the rules do to the metrics of a name.
+
+        :returns: Tuple of the new name, None when the metric is dropped,
+            and of the label replacements applying to its samples.
+        """
+        label_replaces = []
+        for action, rule in self.rules:
+            if action == 'drop':
+                if rule.fullmatch(name):
+                    return None, ()
+            elif action == 'keep':
+                if not rule.fullmatch(name):
+                    return None, ()
+            elif action == 'rename':
+                regex, replacement = rule
+                match = regex.fullmatch(name)
+                if match is None:
+                    continue
+                renamed = match.expand(replacement)
+                if not METRIC_NAME.fullmatch(renamed):
+                    LOG.warning('Not renaming %s to the invalid metric name '
+                                '"%s"', name, renamed)
+                    continue
+                name = renamed
+            elif rule.metric.fullmatch(name):
+                label_replaces.append(rule)
+        return name, tuple(label_replaces)
+
+    def apply(self, registry):
+        """Relabel the families of a registry.
+
+        :param registry: Registry the parsers filled.
+        :returns: Registry like object serving the relabeled families.
+        """
+        families = {}
+        for metric in registry.collect():
+            name, label_replaces = self.plan(metric.name)
+            if name is None:
+                continue
+            samples = []
+            for sample in metric.samples:
+                labels = sample.labels
+                for rule in label_replaces:
+                    labels = rule.apply(labels)
+                samples.append(sample._replace(
+                    name=name + sample.name[len(metric.name):],
+                    labels=labels))
+            if name in families:
+                # Metrics renamed to the same name are merged.
+                families[name].samples.extend(samples)
+                continue
+            family = ipe_utils.copy_family(metric, samples)
+            family.name = name
+            families[name] = family
+        return ipe_utils.MetricFamilies(list(families.values()))
+
+
+def load_rules(path):
+    """Load and compile the relabel rules of a JSON file.
+
+    :raises ValueError: if the file is not valid JSON or a rule is invalid.
+    """
+    with open(path) as f:
+        try:
+            rules = json.load(f)
+        except ValueError as e:
+            raise ValueError('Invalid relabel rules file %s: %s' % (path, e))
+    return RelabelRules(rules)
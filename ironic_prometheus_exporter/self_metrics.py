@@ -0,0 +1,122 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Metrics about the exporter itself.
+
+The notifier driver runs inside the ironic-conductor process, so the time it
+spends parsing and writing is time taken away from the conductor. These
+metrics live in a dedicated registry that the driver writes to its own file,
+next to the node files, when ``[oslo_messaging_notifications]/self_metrics``
+is enabled.
+"""
+
+from prometheus_client import CollectorRegistry
+from prometheus_client.core import CounterMetricFamily
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client import Counter
+from prometheus_client import Histogram
+
+
+REGISTRY = CollectorRegistry()
+
+# NOTE: parsing a single payload is expected to take from a fraction of a
+# millisecond up to a few hundred milliseconds for very large nodes, the
+# default prometheus_client buckets are too coarse on the lower end.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, float('inf'))
+
+PARSE_SECONDS = Histogram(
+    'ironic_exporter_parse_seconds',
+    'Time spent parsing a notification payload into metrics.',
+    labelnames=['event_type'], buckets=LATENCY_BUCKETS, registry=REGISTRY)
+
+RENDER_SECONDS = Histogram(
+    'ironic_exporter_render_seconds',
+    'Time spent rendering the parsed metrics in the text format.',
+    labelnames=['event_type'], buckets=LATENCY_BUCKETS, registry=REGISTRY)
+
+WRITE_SECONDS = Histogram(
+    'ironic_exporter_write_seconds',
+    'Time spent writing the rendered metrics to the output.',
+    labelnames=['event_type'], buckets=LATENCY_BUCKETS, registry=REGISTRY)
+
+MESSAGES = Counter(
+    'ironic_exporter_messages',
+    'Notifications handled by the exporter.',
+    labelnames=['event_type'], registry=REGISTRY)
+
+FAILURES = Counter(
+    'ironic_exporter_failures',
+    'Notifications the exporter failed to handle.',
+    labelnames=['event_type'], registry=REGISTRY)
+
+SERIES = Counter(
+    'ironic_exporter_series',
+    'Series produced from the handled notifications.',
+    labelnames=['event_type'], registry=REGISTRY)
+
+BACKEND_SAMPLES = Counter(
+    'ironic_exporter_backend_samples',
+    'Samples handled by the output backend, by result: sent, spooled to '
+    'disk after a failed request, or dropped.',
+    labelnames=['backend', 'result'], registry=REGISTRY)
+
+CARDINALITY_DROPS = Counter(
+    'ironic_exporter_cardinality_drops',
+    'Series affected by the cardinality guard, by reason: max_series when '
+    'dropped past the series limit of their metric, max_labels when their '
+    'labels were trimmed, duplicate when dropped because they only '
+    'differed by removed labels.',
+    labelnames=['event_type', 'reason'], registry=REGISTRY)
+
+
+class CacheCollector(object):
+    """Expose the statistics of the caches used by the parsers.
+
+    Caches are registered with :func:`register_cache`, they only need to
+    provide a ``cache_info()`` method like the ones wrapped with
+    ``functools.lru_cache``.
+    """
+
+    def __init__(self):
+        self.caches = {}
+
+    def collect(self):
+        hits = CounterMetricFamily(
+            'ironic_exporter_cache_hits',
+            'Lookups answered by a parser cache.', labels=['cache'])
+        misses = CounterMetricFamily(
+            'ironic_exporter_cache_misses',
+            'Lookups a parser cache had to compute.', labels=['cache'])
+        size = GaugeMetricFamily(
+            'ironic_exporter_cache_size',
+            'Entries currently held by a parser cache.', labels=['cache'])
+        for name, cache in sorted(self.caches.items()):
+            info = cache.cache_info()
+            hits.add_metric([name], info.hits)
+            misses.add_metric([name], info.misses)
+            size.add_metric([name], info.currsize)
+        return [hits, misses, size]
+
+
+CACHES = CacheCollector()
+REGISTRY.register(CACHES)
+
+
+def register_cache(name, cache):
+    """Expose the hit and miss counters of a cache in the self metrics.
+
+    :param name: Value of the ``cache`` label of the cache metrics.
+    :param cache: Object with a ``functools.lru_cache`` like
+        ``cache_info()`` method.
+    """
+    CACHES.caches[name] = cache
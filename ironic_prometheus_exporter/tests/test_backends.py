@@ -0,0 +1,455 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import gzip
+import http.server
+import json
+import os
+import struct
+import threading
+import unittest
+from unittest import mock
+
+import fixtures
+from oslo_config import cfg
+from oslo_messaging.tests import utils as test_utils
+from prometheus_client import CollectorRegistry
+from prometheus_client import Counter
+from prometheus_client import Gauge
+
+import ironic_prometheus_exporter
+from ironic_prometheus_exporter.backends import base
+from ironic_prometheus_exporter.backends import compression
+from ironic_prometheus_exporter.backends import otlp
+from ironic_prometheus_exporter.backends import protobuf
+from ironic_prometheus_exporter.backends import remote_write
+from ironic_prometheus_exporter.messaging import PrometheusFileDriver
+
+
+def read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, pos
+
+
+def decode_message(data):
+    """Decode protobuf fields as a list of (field, value) pairs."""
+    fields = []
+    pos = 0
+    while pos < len(data):
+        key, pos = read_varint(data, pos)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == protobuf.VARINT:
+            value, pos = read_varint(data, pos)
+        elif wire_type == protobuf.FIXED64:
+            value = data[pos:pos + 8]
+            pos += 8
+        else:
+            length, pos = read_varint(data, pos)
+            value = data[pos:pos + length]
+            pos += length
+        fields.append((field, value))
+    return fields
+
+
+def snappy_decompress(data):
+    """Decode a snappy block made of literal elements only."""
+    length, pos = read_varint(data, 0)
+    out = bytearray()
+    while pos < len(data):
+        tag = data[pos] >> 2
+        pos += 1
+        if tag == 60:
+            size = data[pos] + 1
+            pos += 1
+        elif tag == 61:
+            size = struct.unpack('<H', data[pos:pos + 2])[0] + 1
+            pos += 2
+        else:
+            size = tag + 1
+        out += data[pos:pos + size]
+        pos += size
+    assert len(out) == length
+    return bytes(out)
+
+
+def decode_write_request(body):
+    """Decode a remote write request as a list of (labels, samples)."""
+    series = []
+    for _, timeseries in decode_message(body):
+        labels = {}
+        samples = []
+        for field, value in decode_message(timeseries):
+            pairs = dict(decode_message(value))
+            if field == 1:
+                labels[pairs[1].decode()] = pairs[2].decode()
+            else:
+                samples.append((struct.unpack('<d', pairs[1])[0], pairs[2]))
+        series.append((labels, samples))
+    return series
+
+
+def decode_attributes(fields):
+    return {dict(decode_message(pair))[1].decode():
+            dict(decode_message(dict(decode_message(pair))[2]))[1].decode()
+            for pair in fields}
+
+
+def decode_otlp_request(body):
+    """Decode an OTLP metrics request.
+
+    :returns: Resource attributes, scope name and a list of
+        (name, description, kind, data points) where the data points are
+        (attributes, value, time_unix_nano).
+    """
+    [(_, resource_metrics)] = decode_message(body)
+    fields = decode_message(resource_metrics)
+    resource = decode_attributes(v for f, v in decode_message(fields[0][1]))
+    scope_fields = decode_message(fields[1][1])
+    scope = dict(decode_message(scope_fields[0][1]))[1].decode()
+    metrics = []
+    for _, metric in scope_fields[1:]:
+        metric = decode_message(metric)
+        kind, data = metric[2]
+        points = []
+        for field, value in decode_message(data):
+            if field != 1:
+                continue
+            point = decode_message(value)
+            points.append((
+                decode_attributes(v for f, v in point if f == 7),
+                struct.unpack('<d', dict(point)[4])[0],
+                struct.unpack('<Q', dict(point)[3])[0]))
+        metrics.append((metric[0][1].decode(), metric[1][1].decode(), kind,
+                        points))
+    return resource, scope, metrics
+
+
+class StubReceiver(http.server.BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append((dict(self.headers), body))
+        status = self.server.statuses.pop(0) if self.server.statuses else 204
+        self.send_response(status)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubReceiverFixture(fixtures.Fixture):
+    """Local HTTP server recording the requests it receives."""
+
+    def _setUp(self):
+        self.server = http.server.HTTPServer(('127.0.0.1', 0), StubReceiver)
+        self.server.requests = []
+        self.server.statuses = []
+        thread = threading.Thread(target=self._serve, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.url = 'http://127.0.0.1:%d/api/v1/write' % (
+            self.server.server_port)
+
+    def _serve(self):
+        # NOTE: serve_forever() polls with the selectors module, which is
+        # not green when eventlet is monkey patched by the oslo.messaging
+        # tests, accepting the connections on the socket is.
+        while True:
+            try:
+                request, address = self.server.get_request()
+            except OSError:
+                return
+            self.server.process_request(request, address)
+
+
+class TestProtobuf(unittest.TestCase):
+
+    def test_varint(self):
+        self.assertEqual(b'\x01', protobuf.varint(1))
+        self.assertEqual(b'\xac\x02', protobuf.varint(300))
+        self.assertEqual(b'\xff' * 9 + b'\x01', protobuf.varint(-1))
+
+    def test_fields(self):
+        self.assertEqual(b'\x08\x96\x01', protobuf.int64_field(1, 150))
+        self.assertEqual(b'\x12\x07testing',
+                         protobuf.string_field(2, 'testing'))
+        self.assertEqual(b'\x1a\x03\x08\x96\x01',
+                         protobuf.message_field(
+                             3, protobuf.int64_field(1, 150)))
+
+
+class TestCompression(unittest.TestCase):
+
+    def test_compress_literals(self):
+        for size in (0, 1, 60, 61, 256, 257, 70000, 200000):
+            data = os.urandom(size)
+            self.assertEqual(
+                data, snappy_decompress(compression.compress_literals(data)))
+
+
+class TestRemoteWriteBackend(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestRemoteWriteBackend, self).setUp()
+        self.receiver = self.useFixture(StubReceiverFixture())
+        self.useFixture(fixtures.MockPatchObject(base, 'RETRY_BACKOFF', 0))
+        # NOTE: the stub receiver only decodes the literals fallback.
+        patcher = mock.patch.object(compression, '_snappy', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.registry = CollectorRegistry()
+        gauge = Gauge('baremetal_temperature_celsius', 'Temperature',
+                      ['node_uuid', 'sensor_id'], registry=self.registry)
+        gauge.labels('uuid', 'CPU1').set(42)
+        gauge.labels('uuid', 'CPU2').set(43.5)
+
+    def backend(self, **kwargs):
+        kwargs.setdefault('batch_size', 10)
+        backend = remote_write.RemoteWriteBackend(
+            self.receiver.url, flush_interval=60, **kwargs)
+        self.addCleanup(backend.close)
+        return backend
+
+    def test_submit_flush(self):
+        backend = self.backend()
+        self.assertEqual(2, backend.submit(self.registry, 1553890342.5))
+        self.assertEqual([], self.receiver.server.requests)
+        backend.flush()
+
+        [(headers, body)] = self.receiver.server.requests
+        self.assertEqual('snappy', headers['Content-Encoding'])
+        self.assertEqual('application/x-protobuf', headers['Content-Type'])
+        self.assertEqual('0.1.0', headers['X-Prometheus-Remote-Write-Version'])
+        self.assertEqual(
+            [({'__name__': 'baremetal_temperature_celsius',
+               'node_uuid': 'uuid', 'sensor_id': 'CPU1'},
+              [(42.0, 1553890342500)]),
+             ({'__name__': 'baremetal_temperature_celsius',
+               'node_uuid': 'uuid', 'sensor_id': 'CPU2'},
+              [(43.5, 1553890342500)])],
+            decode_write_request(snappy_decompress(body)))
+
+    def test_full_batch_sent_in_background(self):
+        backend = self.backend(batch_size=2)
+        backend.submit(self.registry, 0)
+        for _ in range(100):
+            if self.receiver.server.requests:
+                break
+            backend._stopped.wait(0.05)
+        self.assertEqual(1, len(self.receiver.server.requests))
+
+    def test_batch_size(self):
+        backend = self.backend(batch_size=1)
+        # Stop the flush thread, so the batches are only sent below.
+        backend.close()
+        backend.submit(self.registry, 0)
+        backend.flush()
+        self.assertEqual(2, len(self.receiver.server.requests))
+
+    def test_max_buffer(self):
+        backend = self.backend(max_buffer=1)
+        backend.submit(self.registry, 0)
+        backend.flush()
+        [(_, body)] = self.receiver.server.requests
+        [(labels, _)] = decode_write_request(snappy_decompress(body))
+        self.assertEqual('CPU2', labels['sensor_id'])
+
+    def test_retry(self):
+        self.receiver.server.statuses = [503, 429]
+        backend = self.backend(retries=2)
+        backend.submit(self.registry, 0)
+        backend.flush()
+        self.assertEqual(3, len(self.receiver.server.requests))
+
+    def test_rejected_not_retried(self):
+        self.receiver.server.statuses = [400]
+        backend = self.backend(retries=2)
+        backend.submit(self.registry, 0)
+        backend.flush()
+        self.assertEqual(1, len(self.receiver.server.requests))
+
+    def test_spool(self):
+        spool_dir = self.useFixture(fixtures.TempDir()).path
+        self.receiver.server.statuses = [500, 500]
+        backend = self.backend(retries=1, spool_dir=spool_dir)
+        backend.submit(self.registry, 0)
+        backend.flush()
+        self.assertEqual(1, len(os.listdir(spool_dir)))
+        spooled = self.receiver.server.requests[0][1]
+
+        backend.submit(self.registry, 1)
+        backend.flush()
+        self.assertEqual([], os.listdir(spool_dir))
+        self.assertEqual(4, len(self.receiver.server.requests))
+        self.assertEqual(spooled, self.receiver.server.requests[3][1])
+
+
+class TestOTLPBackend(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestOTLPBackend, self).setUp()
+        self.receiver = self.useFixture(StubReceiverFixture())
+        self.registry = CollectorRegistry()
+        gauge = Gauge('baremetal_temperature_celsius', 'Temperature',
+                      ['node_uuid', 'sensor_id'], registry=self.registry)
+        gauge.labels('uuid', 'CPU1').set(42)
+        gauge.labels('uuid', 'CPU2').set(43.5)
+        Counter('baremetal_errors', 'Errors', ['node_uuid'],
+                registry=self.registry).labels('uuid').inc(3)
+
+    def backend(self, **kwargs):
+        backend = otlp.OTLPBackend(
+            self.receiver.url, batch_size=10, flush_interval=60,
+            resource_attributes={'service.name': 'ipe'}, **kwargs)
+        self.addCleanup(backend.close)
+        return backend
+
+    def test_submit_flush(self):
+        backend = self.backend(headers={'Authorization': 'Bearer token'})
+        self.assertEqual(3, backend.submit(self.registry, 1553890342.5))
+        backend.flush()
+
+        [(headers, body)] = self.receiver.server.requests
+        self.assertEqual('gzip', headers['Content-Encoding'])
+        self.assertEqual('application/x-protobuf', headers['Content-Type'])
+        self.assertEqual('Bearer token', headers['Authorization'])
+        resource, scope, metrics = decode_otlp_request(gzip.decompress(body))
+        self.assertEqual({'service.name': 'ipe'}, resource)
+        self.assertEqual('ironic_prometheus_exporter', scope)
+        time_ns = 1553890342500000000
+        self.assertEqual(
+            [('baremetal_temperature_celsius', 'Temperature', otlp.GAUGE,
+              [({'node_uuid': 'uuid', 'sensor_id': 'CPU1'}, 42.0, time_ns),
+               ({'node_uuid': 'uuid', 'sensor_id': 'CPU2'}, 43.5, time_ns)]),
+             ('baremetal_errors_total', 'Errors', otlp.SUM,
+              [({'node_uuid': 'uuid'}, 3.0, time_ns)])],
+            metrics)
+
+    def test_metrics_grouped_in_batch(self):
+        backend = self.backend(compress=False)
+        backend.submit(self.registry, 1)
+        backend.submit(self.registry, 2)
+        backend.flush()
+        [(headers, body)] = self.receiver.server.requests
+        self.assertNotIn('Content-Encoding', headers)
+        _, _, metrics = decode_otlp_request(body)
+        self.assertEqual([4, 2], [len(metric[3]) for metric in metrics])
+
+    def test_max_buffer(self):
+        backend = self.backend(max_buffer=2)
+        backend.submit(self.registry, 0)
+        backend.flush()
+        [(_, body)] = self.receiver.server.requests
+        _, _, metrics = decode_otlp_request(gzip.decompress(body))
+        self.assertEqual(['baremetal_temperature_celsius',
+                          'baremetal_errors_total'],
+                         [metric[0] for metric in metrics])
+        self.assertEqual([1, 1], [len(metric[3]) for metric in metrics])
+
+
+class TestRemoteWriteDriver(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestRemoteWriteDriver, self).setUp()
+        self.receiver = self.useFixture(StubReceiverFixture())
+        # NOTE: the stub receiver only decodes the literals fallback.
+        patcher = mock.patch.object(compression, '_snappy', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_notify(self):
+        temp_dir = self.useFixture(fixtures.TempDir()).path
+        self.config(location=temp_dir, output_backend='remote_write',
+                    remote_write_url=self.receiver.url,
+                    group='oslo_messaging_notifications')
+        driver = PrometheusFileDriver(self.conf, None, None)
+        self.addCleanup(driver.backend.close)
+        sample_file = os.path.join(
+            os.path.dirname(ironic_prometheus_exporter.__file__),
+            'tests', 'json_samples', 'notification-ipmi-1.json')
+        with open(sample_file) as f:
+            msg = json.load(f)
+
+        driver.notify(None, msg, 'INFO', 0)
+        driver.backend.flush()
+
+        self.assertEqual([], os.listdir(temp_dir))
+        [(_, body)] = self.receiver.server.requests
+        series = decode_write_request(snappy_decompress(body))
+        self.assertIn(
+            ({'__name__': 'baremetal_last_payload_timestamp_seconds',
+              'node_name': 'knilab-master-u9',
+              'node_uuid': 'ac2aa2fd-6e1a-41c8-a114-2084c8705228',
+              'instance_uuid': 'ac2aa2fd-6e1a-41c8-a114-2084c8705228'},
+             [(1553890342.0, 1553890342989)]),
+            series)
+
+    def test_snappy_missing(self):
+        self.config(location=self.useFixture(fixtures.TempDir()).path,
+                    output_backend='remote_write',
+                    remote_write_url=self.receiver.url,
+                    group='oslo_messaging_notifications')
+        with mock.patch.object(remote_write.LOG, 'warning',
+                               autospec=True) as mock_warning:
+            driver = PrometheusFileDriver(self.conf, None, None)
+            driver.backend.close()
+            self.assertIn('python-snappy', mock_warning.call_args[0][0])
+
+            mock_warning.reset_mock()
+            with mock.patch.object(compression, '_snappy'):
+                driver = PrometheusFileDriver(self.conf, None, None)
+                driver.backend.close()
+            mock_warning.assert_not_called()
+
+    def test_url_required(self):
+        self.config(location=self.useFixture(fixtures.TempDir()).path,
+                    output_backend='remote_write',
+                    group='oslo_messaging_notifications')
+        with mock.patch.object(remote_write.RemoteWriteBackend,
+                               '__init__') as init:
+            self.assertRaises(cfg.RequiredOptError, PrometheusFileDriver,
+                              self.conf, None, None)
+            init.assert_not_called()
+
+
+class TestOTLPDriver(test_utils.BaseTestCase):
+
+    def test_notify(self):
+        receiver = self.useFixture(StubReceiverFixture())
+        temp_dir = self.useFixture(fixtures.TempDir()).path
+        self.config(location=temp_dir, output_backend='otlp',
+                    otlp_endpoint=receiver.url,
+                    group='oslo_messaging_notifications')
+        driver = PrometheusFileDriver(self.conf, None, None)
+        self.addCleanup(driver.backend.close)
+        sample_file = os.path.join(
+            os.path.dirname(ironic_prometheus_exporter.__file__),
+            'tests', 'json_samples', 'notification-redfish.json')
+        with open(sample_file) as f:
+            msg = json.load(f)
+
+        driver.notify(None, msg, 'INFO', 0)
+        driver.backend.flush()
+
+        self.assertEqual([], os.listdir(temp_dir))
+        [(_, body)] = receiver.server.requests
+        resource, _, metrics = decode_otlp_request(gzip.decompress(body))
+        self.assertEqual('ironic_prometheus_exporter',
+                         resource['service.name'])
+        self.assertIn('baremetal_last_payload_timestamp_seconds',
+                      [metric[0] for metric in metrics])
@@ -0,0 +1,160 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import os
+import unittest
+
+import fixtures
+from oslo_messaging.tests import utils as test_utils
+from prometheus_client import CollectorRegistry
+from prometheus_client import Gauge
+from prometheus_client import generate_latest
+
+import ironic_prometheus_exporter
+from ironic_prometheus_exporter import cardinality
+from ironic_prometheus_exporter.messaging import PrometheusFileDriver
+from ironic_prometheus_exporter import self_metrics
+
+
+EVENT_TYPE = 'hardware.redfish.metrics'
+
+
+def drops(reason):
+    return self_metrics.REGISTRY.get_sample_value(
+        'ironic_exporter_cardinality_drops_total',
+        {'event_type': EVENT_TYPE, 'reason': reason}) or 0
+
+
+def series(registry):
+    return [(sample.name, sample.labels)
+            for metric in registry.collect() for sample in metric.samples]
+
+
+class TestParseLabelRules(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(
+            {EVENT_TYPE: frozenset(['model', 'serial']),
+             '*': frozenset(['*'])},
+            cardinality.parse_label_rules(
+                [EVENT_TYPE + ':model', EVENT_TYPE + ':serial', '*:*']))
+
+    def test_invalid(self):
+        for entry in ('model', ':model', EVENT_TYPE + ':'):
+            self.assertRaises(ValueError, cardinality.parse_label_rules,
+                              [entry])
+
+
+class TestCardinalityGuard(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = CollectorRegistry()
+        gauge = Gauge('baremetal_temperature_celsius', 'Temperature',
+                      ['node_uuid', 'model', 'serial', 'sensor_id',
+                       'physical_context'], registry=self.registry)
+        for index in range(3):
+            gauge.labels('uuid', 'R640', 'ABC', 'CPU%d' % index,
+                         'CPU').set(40 + index)
+
+    def test_denylist(self):
+        guard = cardinality.CardinalityGuard(
+            denylist=[EVENT_TYPE + ':serial', '*:model', EVENT_TYPE +
+                      ':node_uuid', 'ironic.metrics:physical_context'])
+        self.assertEqual(
+            [{'node_uuid': 'uuid', 'sensor_id': 'CPU%d' % index,
+              'physical_context': 'CPU'} for index in range(3)],
+            [labels for _, labels in
+             series(guard.apply(EVENT_TYPE, self.registry))])
+
+    def test_allowlist(self):
+        guard = cardinality.CardinalityGuard(
+            allowlist=[EVENT_TYPE + ':model', 'ironic.metrics:serial'])
+        self.assertEqual(
+            [{'node_uuid': 'uuid', 'model': 'R640',
+              'sensor_id': 'CPU%d' % index} for index in range(3)],
+            [labels for _, labels in
+             series(guard.apply(EVENT_TYPE, self.registry))])
+        self.assertEqual(
+            series(self.registry),
+            series(guard.apply('hardware.idrac.metrics', self.registry)))
+
+    def test_max_labels(self):
+        guard = cardinality.CardinalityGuard(max_labels=3)
+        before = drops('max_labels')
+        self.assertEqual(
+            [{'node_uuid': 'uuid', 'model': 'R640',
+              'sensor_id': 'CPU%d' % index} for index in range(3)],
+            [labels for _, labels in
+             series(guard.apply(EVENT_TYPE, self.registry))])
+        self.assertEqual(3, drops('max_labels') - before)
+
+    def test_max_series(self):
+        guard = cardinality.CardinalityGuard(max_series=2)
+        before = drops('max_series')
+        self.assertEqual(
+            ['CPU0', 'CPU1'],
+            [labels['sensor_id'] for _, labels in
+             series(guard.apply(EVENT_TYPE, self.registry))])
+        self.assertEqual(1, drops('max_series') - before)
+
+    def test_duplicates_dropped(self):
+        registry = CollectorRegistry()
+        gauge = Gauge('baremetal_fan_speed', 'Fan', ['node_uuid', 'serial'],
+                      registry=registry)
+        gauge.labels('uuid', 'A').set(1)
+        gauge.labels('uuid', 'B').set(2)
+        guard = cardinality.CardinalityGuard(denylist=['*:serial'])
+        before = drops('duplicate')
+        self.assertEqual(
+            b'# HELP baremetal_fan_speed Fan\n'
+            b'# TYPE baremetal_fan_speed gauge\n'
+            b'baremetal_fan_speed{node_uuid="uuid"} 1.0\n',
+            generate_latest(guard.apply(EVENT_TYPE, registry)))
+        self.assertEqual(1, drops('duplicate') - before)
+
+
+class TestCardinalityDriver(test_utils.BaseTestCase):
+
+    def test_notify(self):
+        temp_dir = self.useFixture(fixtures.TempDir()).path
+        self.config(location=temp_dir, max_labels_per_series=5,
+                    label_denylist=['*:vendor'],
+                    group='oslo_messaging_notifications')
+        driver = PrometheusFileDriver(self.conf, None, None)
+        sample_file = os.path.join(
+            os.path.dirname(ironic_prometheus_exporter.__file__),
+            'tests', 'json_samples', 'notification-redfish.json')
+        with open(sample_file) as f:
+            msg = json.load(f)
+        msg['payload']['payload']['Extra'] = {'vendor': 'Dell',
+                                              'model': 'R640',
+                                              'serial': 'ABC'}
+
+        driver.notify(None, msg, 'INFO', 0)
+
+        with open(os.path.join(
+                temp_dir, 'knilab-master-u9-hardware.redfish.metrics')) as f:
+            content = f.read()
+        self.assertNotIn('vendor=', content)
+        self.assertNotIn('serial=', content)
+        self.assertIn(
+            'baremetal_temp_cpu_celsius{instance_uuid="ac2aa2fd-6e1a-41c8-'
+            'a114-2084c8705228",model="R640",node_name="knilab-master-u9",'
+            'node_uuid="ac2aa2fd-6e1a-41c8-a114-2084c8705228",sensor_id="XXX-'
+            'YYY-ZZZ@ZZZ-YYY-XXX"} 62.0', content)
+
+    def test_disabled(self):
+        self.config(location=self.useFixture(fixtures.TempDir()).path,
+                    group='oslo_messaging_notifications')
+        driver = PrometheusFileDriver(self.conf, None, None)
+        self.assertIsNone(driver.cardinality_guard)
@@ -0,0 +1,121 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import os
+import time
+from unittest import mock
+
+import fixtures
+import oslo_messaging
+from oslo_messaging.tests import utils as test_utils
+
+import ironic_prometheus_exporter
+from ironic_prometheus_exporter.cmd import consumer
+from ironic_prometheus_exporter.messaging import PrometheusFileDriver
+
+
+def load_sample(name):
+    sample_file = os.path.join(
+        os.path.dirname(ironic_prometheus_exporter.__file__),
+        'tests', 'json_samples', name)
+    with open(sample_file) as f:
+        return json.load(f)
+
+
+def batch_message(notification, publisher_id='ironic-conductor.host'):
+    return {'ctxt': {},
+            'publisher_id': publisher_id,
+            'event_type': notification['event_type'],
+            'payload': notification['payload'],
+            'metadata': {'message_id': 'id', 'timestamp': 'now'}}
+
+
+class TestNotificationEndpoint(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestNotificationEndpoint, self).setUp()
+        self.driver = mock.Mock()
+        self.endpoint = consumer.NotificationEndpoint(self.driver)
+        self.ipmi = load_sample('notification-ipmi-1.json')
+        self.redfish = load_sample('notification-redfish.json')
+
+    def test_info(self):
+        self.endpoint.info([batch_message(self.ipmi),
+                            batch_message(self.redfish)])
+        self.assertEqual(2, self.driver.notify.call_count)
+        notification = self.driver.notify.call_args_list[0][0][1]
+        self.assertEqual('hardware.ipmi.metrics',
+                         notification['event_type'])
+        self.assertEqual(self.ipmi['payload'], notification['payload'])
+        self.assertEqual('INFO', notification['priority'])
+
+    def test_superseded_messages_skipped(self):
+        newer = load_sample('notification-ipmi-1.json')
+        newer['payload']['timestamp'] = '2019-03-29T20:22:22.989020'
+        self.endpoint.info([batch_message(self.ipmi),
+                            batch_message(self.redfish),
+                            batch_message(newer)])
+        self.assertEqual(
+            [self.redfish['payload'], newer['payload']],
+            [call[0][1]['payload']
+             for call in self.driver.notify.call_args_list])
+
+    def test_failure_does_not_stop_batch(self):
+        self.driver.notify.side_effect = [KeyError('payload'), None]
+        self.endpoint.info([batch_message(self.ipmi),
+                            batch_message(self.redfish)])
+        self.assertEqual(2, self.driver.notify.call_count)
+
+    def test_filter_rule(self):
+        match = self.endpoint.filter_rule.match
+        for event_type in ('hardware.ipmi.metrics', 'hardware.redfish.metrics',
+                           'hardware.idrac.metrics', 'ironic.metrics'):
+            self.assertTrue(match({}, 'publisher', event_type, {}, {}))
+        self.assertFalse(match({}, 'publisher', 'baremetal.node.update.end',
+                               {}, {}))
+
+
+class TestConsumer(test_utils.BaseTestCase):
+
+    def test_consume_fake_transport(self):
+        temp_dir = self.useFixture(fixtures.TempDir()).path
+        self.config(location=temp_dir, consumer_batch_size=2,
+                    consumer_batch_timeout=1,
+                    group='oslo_messaging_notifications')
+        transport = oslo_messaging.get_notification_transport(
+            self.conf, url='fake:')
+        self.addCleanup(transport.cleanup)
+        driver = PrometheusFileDriver(self.conf, None, transport)
+        listener = consumer.get_listener(self.conf, transport, driver)
+        listener.start()
+        self.addCleanup(listener.wait)
+        self.addCleanup(listener.stop)
+
+        notifier = oslo_messaging.Notifier(
+            transport, 'ironic-conductor.host', driver='messaging',
+            topics=self.conf.oslo_messaging_notifications.topics)
+        for name in ('notification-ipmi-1.json', 'notification-redfish.json',
+                     'notification-idrac.json'):
+            notification = load_sample(name)
+            notifier.info({}, notification['event_type'],
+                          notification['payload'])
+        notifier.info({}, 'baremetal.node.update.end', {})
+
+        expected = sorted(['knilab-master-u9-hardware.ipmi.metrics',
+                           'knilab-master-u9-hardware.redfish.metrics',
+                           'r640-u12-hardware.idrac.metrics'])
+        for _ in range(100):
+            if sorted(os.listdir(temp_dir)) == expected:
+                break
+            time.sleep(0.05)
+        self.assertEqual(expected, sorted(os.listdir(temp_dir)))
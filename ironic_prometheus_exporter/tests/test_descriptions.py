@@ -10,6 +10,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import operator
+
 from oslo_messaging.tests import utils as test_utils
 
 from ironic_prometheus_exporter.parsers import descriptions
@@ -40,3 +42,12 @@ class TestMetricsDescriptions(test_utils.BaseTestCase):
         expected = ''
 
         self.assertEqual(expected, desc)
+
+    def test_catalog_loaded_at_import(self):
+        self.assertEqual({'header', 'ipmi', 'redfish'},
+                         set(descriptions.DESCRIPTIONS))
+        self.assertRaises(TypeError, operator.setitem,
+                          descriptions.DESCRIPTIONS, 'bad_source', {})
+        self.assertRaises(TypeError, operator.setitem,
+                          descriptions.DESCRIPTIONS['header'],
+                          'bad_metrics', '')
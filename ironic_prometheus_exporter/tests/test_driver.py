@@ -12,6 +12,7 @@
 
 import json
 import os
+import socket
 
 import fixtures
 import oslo_messaging
@@ -19,6 +20,9 @@ from oslo_messaging.tests import utils as test_utils
 
 import ironic_prometheus_exporter
 from ironic_prometheus_exporter.messaging import PrometheusFileDriver
+from ironic_prometheus_exporter.messaging import SimpleFileDriver
+from ironic_prometheus_exporter import recording
+from ironic_prometheus_exporter import self_metrics
 
 
 class TestPrometheusFileNotifier(test_utils.BaseTestCase):
@@ -145,3 +149,122 @@ class TestPrometheusFileNotifier(test_utils.BaseTestCase):
         self.assertIn(node1 + '-hardware.ipmi.metrics', all_files)
         self.assertIn(node2 + '-hardware.redfish.metrics', all_files)
         self.assertIn(node3 + '-hardware.idrac.metrics', all_files)
+
+    def test_self_metrics(self):
+        temp_dir = self.useFixture(fixtures.TempDir()).path
+        self.config(location=temp_dir, self_metrics=True,
+                    group='oslo_messaging_notifications')
+        transport = oslo_messaging.get_notification_transport(self.conf)
+        driver = PrometheusFileDriver(self.conf, None, transport)
+
+        sample_file = os.path.join(
+            os.path.dirname(ironic_prometheus_exporter.__file__),
+            'tests', 'json_samples', 'notification-ipmi-1.json')
+        msg = json.load(open(sample_file))
+        messages_before = self_metrics.REGISTRY.get_sample_value(
+            'ironic_exporter_messages_total',
+            {'event_type': 'hardware.ipmi.metrics'}) or 0
+
+        driver.notify(None, msg, 'info', 0)
+
+        all_files = [name for name in os.listdir(temp_dir)
+                     if os.path.isfile(os.path.join(temp_dir, name))]
+        self.assertEqual(2, len(all_files))
+        # Each process loading the driver has its own file
+        self.assertIn('%s.%d-ironic_prometheus_exporter'
+                      % (socket.gethostname(), os.getpid()), all_files)
+        with open(driver.self_metrics_file) as f:
+            content = f.read()
+        for name in ('ironic_exporter_parse_seconds_count',
+                     'ironic_exporter_render_seconds_count',
+                     'ironic_exporter_write_seconds_count',
+                     'ironic_exporter_series_total'):
+            self.assertIn(
+                '%s{event_type="hardware.ipmi.metrics",process="%d"}'
+                % (name, os.getpid()), content)
+        self.assertEqual(
+            messages_before + 1,
+            self_metrics.REGISTRY.get_sample_value(
+                'ironic_exporter_messages_total',
+                {'event_type': 'hardware.ipmi.metrics'}))
+        self.assertGreater(
+            self_metrics.REGISTRY.get_sample_value(
+                'ironic_exporter_series_total',
+                {'event_type': 'hardware.ipmi.metrics'}), 0)
+
+    def test_self_metrics_failure(self):
+        temp_dir = self.useFixture(fixtures.TempDir()).path
+        self.config(location=temp_dir, self_metrics=True,
+                    group='oslo_messaging_notifications')
+        transport = oslo_messaging.get_notification_transport(self.conf)
+        driver = PrometheusFileDriver(self.conf, None, transport)
+        failures_before = self_metrics.REGISTRY.get_sample_value(
+            'ironic_exporter_failures_total',
+            {'event_type': 'hardware.ipmi.metrics'}) or 0
+
+        self.assertRaises(KeyError, driver.notify, None,
+                          {'event_type': 'hardware.ipmi.metrics'}, 'info', 0)
+        self.assertEqual(
+            failures_before + 1,
+            self_metrics.REGISTRY.get_sample_value(
+                'ironic_exporter_failures_total',
+                {'event_type': 'hardware.ipmi.metrics'}))
+        self.assertTrue(os.path.isfile(driver.self_metrics_file))
+
+
+class TestSimpleFileNotifier(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestSimpleFileNotifier, self).setUp()
+        self.temp_dir = self.useFixture(fixtures.TempDir()).path
+        sample_file = os.path.join(
+            os.path.dirname(ironic_prometheus_exporter.__file__),
+            'tests', 'json_samples', 'notification-ipmi-1.json')
+        with open(sample_file) as f:
+            self.msg = json.load(f)
+
+    def test_record_notifications(self):
+        self.config(location=self.temp_dir,
+                    group='oslo_messaging_notifications')
+        transport = oslo_messaging.get_notification_transport(self.conf)
+        driver = SimpleFileDriver(self.conf, None, transport)
+        self.addCleanup(driver.writer.close)
+
+        driver.notify(None, self.msg, 'info', 0)
+        driver.notify(None, self.msg, 'warn', 0)
+
+        location = os.path.join(self.temp_dir, 'recordings')
+        self.assertEqual(location, driver.location)
+        self.assertEqual(['notifications.jsonl'], os.listdir(location))
+        records = list(recording.read_records(
+            os.path.join(location, 'notifications.jsonl')))
+        self.assertEqual(['info', 'warn'],
+                         [record['priority'] for record in records])
+        self.assertEqual([self.msg, self.msg],
+                         [record['message'] for record in records])
+        self.assertLessEqual(records[0]['received_at'],
+                             records[1]['received_at'])
+
+    def test_record_compressed_with_rotation(self):
+        location = os.path.join(self.temp_dir, 'nested', 'recordings')
+        self.config(location=self.temp_dir, recorder_location=location,
+                    recorder_compress=True, recorder_max_bytes=1,
+                    recorder_backup_count=2,
+                    group='oslo_messaging_notifications')
+        transport = oslo_messaging.get_notification_transport(self.conf)
+        driver = SimpleFileDriver(self.conf, None, transport)
+        self.addCleanup(driver.writer.close)
+
+        for priority in ('info', 'warn', 'error'):
+            driver.notify(None, self.msg, priority, 0)
+
+        self.assertEqual(['notifications.jsonl.gz.1',
+                          'notifications.jsonl.gz.2'],
+                         sorted(os.listdir(location)))
+        files = recording.recording_files(location)
+        self.assertEqual([os.path.join(location, name) for name in
+                          ('notifications.jsonl.gz.2',
+                           'notifications.jsonl.gz.1')], files)
+        self.assertEqual(['warn', 'error'],
+                         [record['priority'] for path in files
+                          for record in recording.read_records(path)])
@@ -0,0 +1,397 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import time
+from unittest import mock
+
+import fixtures
+from oslotest import base
+from werkzeug import test as werkzeug_test
+
+from ironic_prometheus_exporter.app import exporter
+from ironic_prometheus_exporter.app import minimal
+from ironic_prometheus_exporter.app import scrape
+
+
+class TestPrometheusMetrics(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestPrometheusMetrics, self).setUp()
+        self.location = self.useFixture(fixtures.TempDir()).path
+        self.config_file = os.path.join(
+            self.useFixture(fixtures.TempDir()).path, 'ironic.conf')
+        self._write_config()
+        self.useFixture(
+            fixtures.EnvironmentVariable('IRONIC_CONFIG', self.config_file))
+        self.client = exporter.application.test_client()
+        self.addCleanup(scrape.CURSOR.reset)
+
+    def _write_config(self, **options):
+        options['location'] = self.location
+        with open(self.config_file, 'w') as f:
+            f.write('[oslo_messaging_notifications]\n')
+            for name, value in options.items():
+                f.write('%s = %s\n' % (name, value))
+
+    def _write(self, name, content, mtime=None):
+        path = os.path.join(self.location, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def test_merge_files(self):
+        self._write('node1-hardware.ipmi.metrics', 'metric_a 1.0\n')
+        self._write('node2-hardware.ipmi.metrics', 'metric_b 2.0\n')
+        os.mkdir(os.path.join(self.location, 'subdir'))
+
+        response = self.client.get('/metrics')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('text/plain; charset=utf-8', response.content_type)
+        self.assertEqual(['metric_a 1.0', 'metric_b 2.0'],
+                         sorted(response.get_data(as_text=True).split('\n')
+                                [:-1]))
+        self.assertIsNotNone(response.headers.get('ETag'))
+        self.assertIsNotNone(response.headers.get('Last-Modified'))
+
+    def test_skip_temporary_files(self):
+        self._write('node1-hardware.ipmi.metrics', 'metric_a 1.0\n')
+        self._write('node2-hardware.ipmi.metrics.1234.140234',
+                    'metric_b 1.0\n')
+
+        response = self.client.get('/metrics')
+
+        self.assertEqual('metric_a 1.0\n', response.get_data(as_text=True))
+
+    def test_file_removed_while_listing(self):
+        self._write('node1-hardware.ipmi.metrics', 'metric_a 1.0\n')
+        path = self._write('node2-hardware.ipmi.metrics', 'metric_b 1.0\n')
+        with os.scandir(self.location) as entries:
+            entries = list(entries)
+        os.remove(path)
+
+        with mock.patch.object(scrape.os, 'scandir',
+                               autospec=True) as mock_scandir:
+            mock_scandir.return_value.__enter__.return_value = entries
+            response = self.client.get('/metrics')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('metric_a 1.0\n', response.get_data(as_text=True))
+
+    def test_if_none_match(self):
+        self._write('node1-hardware.ipmi.metrics', 'metric_a 1.0\n')
+        etag = self.client.get('/metrics').headers['ETag']
+
+        with mock.patch.object(scrape, 'open', create=True) as mock_open:
+            response = self.client.get('/metrics',
+                                       headers={'If-None-Match': etag})
+            mock_open.assert_not_called()
+
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(b'', response.get_data())
+        self.assertEqual(etag, response.headers['ETag'])
+
+    def test_if_none_match_file_replaced(self):
+        self._write('node1-hardware.ipmi.metrics', 'metric_a 1.0\n',
+                    mtime=1000000000)
+        etag = self.client.get('/metrics').headers['ETag']
+        self._write('node1-hardware.ipmi.metrics', 'metric_a 2.0\n')
+
+        response = self.client.get('/metrics',
+                                   headers={'If-None-Match': etag})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('metric_a 2.0\n', response.get_data(as_text=True))
+        self.assertNotEqual(etag, response.headers['ETag'])
+
+    def test_if_none_match_file_removed(self):
+        self._write('node1-hardware.ipmi.metrics', 'metric_a 1.0\n')
+        path = self._write('node2-hardware.ipmi.metrics', 'metric_b 1.0\n')
+        etag = self.client.get('/metrics').headers['ETag']
+        os.remove(path)
+
+        response = self.client.get('/metrics',
+                                   headers={'If-None-Match': etag})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('metric_a 1.0\n', response.get_data(as_text=True))
+
+    def test_if_modified_since(self):
+        self._write('node1-hardware.ipmi.metrics', 'metric_a 1.0\n',
+                    mtime=1000000000)
+        os.utime(self.location, (1000000000, 1000000000))
+        last_modified = self.client.get('/metrics').headers['Last-Modified']
+        self.assertEqual('Sun, 09 Sep 2001 01:46:40 GMT', last_modified)
+
+        response = self.client.get(
+            '/metrics', headers={'If-Modified-Since': last_modified})
+        self.assertEqual(304, response.status_code)
+
+        self._write('node2-hardware.ipmi.metrics', 'metric_b 1.0\n')
+        response = self.client.get(
+            '/metrics', headers={'If-Modified-Since': last_modified})
+        self.assertEqual(200, response.status_code)
+
+    def test_if_modified_since_file_removed(self):
+        self._write('node1-hardware.ipmi.metrics', 'metric_a 1.0\n',
+                    mtime=1000000000)
+        path = self._write('node2-hardware.ipmi.metrics', 'metric_b 1.0\n',
+                           mtime=1000000000)
+        os.utime(self.location, (1000000000, 1000000000))
+        last_modified = self.client.get('/metrics').headers['Last-Modified']
+        os.remove(path)
+
+        response = self.client.get(
+            '/metrics', headers={'If-Modified-Since': last_modified})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('metric_a 1.0\n', response.get_data(as_text=True))
+        self.assertNotEqual(last_modified, response.headers['Last-Modified'])
+
+    def test_if_modified_since_file_stale(self):
+        self._write_config(max_age=600)
+        self._write('node1-hardware.ipmi.metrics', 'metric_a 1.0\n',
+                    mtime=1000000000)
+        os.utime(self.location, (1000000000, 1000000000))
+        with mock.patch('time.time', return_value=1000000100):
+            last_modified = self.client.get(
+                '/metrics').headers['Last-Modified']
+        self.assertEqual('Sun, 09 Sep 2001 01:46:40 GMT', last_modified)
+
+        with mock.patch('time.time', return_value=1000000700):
+            response = self.client.get(
+                '/metrics', headers={'If-Modified-Since': last_modified})
+
+        self.assertEqual(200, response.status_code)
+        self.assertIn('node="node1"', response.get_data(as_text=True))
+        # The output changed when the file passed max_age
+        self.assertEqual('Sun, 09 Sep 2001 01:56:40 GMT',
+                         response.headers['Last-Modified'])
+
+    def test_max_age(self):
+        self._write_config(max_age=600)
+        self._write('node1-hardware.ipmi.metrics', 'metric_a 1.0\n')
+        self._write('node-2-hardware.redfish.metrics', 'metric_b 1.0\n',
+                    mtime=1000000000)
+
+        response = self.client.get('/metrics')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            'metric_a 1.0\n'
+            '# HELP ironic_exporter_stale_metrics_timestamp_seconds Last '
+            'update of the metrics excluded from the scrape for being older '
+            'than max_age.\n'
+            '# TYPE ironic_exporter_stale_metrics_timestamp_seconds gauge\n'
+            'ironic_exporter_stale_metrics_timestamp_seconds'
+            '{node="node-2",event_type="hardware.redfish.metrics"} '
+            '1000000000.0\n',
+            response.get_data(as_text=True))
+
+    def test_max_age_disabled(self):
+        self._write('node1-hardware.ipmi.metrics', 'metric_a 1.0\n',
+                    mtime=1000000000)
+
+        response = self.client.get('/metrics')
+
+        self.assertEqual('metric_a 1.0\n', response.get_data(as_text=True))
+
+    def test_max_age_changes_etag(self):
+        path = self._write('node1-hardware.ipmi.metrics', 'metric_a 1.0\n')
+        self._write_config(max_age=600)
+        etag = self.client.get('/metrics').headers['ETag']
+        mtime = time.time() - 3600
+        os.utime(path, (mtime, mtime))
+        # Make sure the file is seen as stale and not as updated
+        with mock.patch.object(scrape, 'version_token',
+                               wraps=scrape.version_token) as mock_token:
+            response = self.client.get('/metrics',
+                                       headers={'If-None-Match': etag})
+            self.assertEqual([], mock_token.call_args[0][0])
+
+        self.assertEqual(200, response.status_code)
+        self.assertIn('node="node1"', response.get_data(as_text=True))
+
+    def test_scrape_timeout(self):
+        self._write('node1-hardware.ipmi.metrics', 'metric_a 1.0\n')
+        headers = {'X-Prometheus-Scrape-Timeout-Seconds': '10'}
+
+        response = self.client.get('/metrics', headers=headers)
+
+        # Nothing tells yet how long reading the files takes
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            'metric_a 1.0\n' + scrape.render_scrape_status(0),
+            response.get_data(as_text=True))
+        self.assertNotIn('ETag', response.headers)
+        self.assertIsNotNone(scrape.CURSOR.read_time)
+
+        response = self.client.get('/metrics', headers=headers)
+
+        self.assertEqual('metric_a 1.0\n', response.get_data(as_text=True))
+        self.assertIn('ETag', response.headers)
+
+        headers['If-None-Match'] = response.headers['ETag']
+        response = self.client.get('/metrics', headers=headers)
+        self.assertEqual(304, response.status_code)
+
+    def test_scrape_timeout_slow_read(self):
+        self._write('node1-hardware.ipmi.metrics', 'metric_a 1.0\n')
+        headers = {'X-Prometheus-Scrape-Timeout-Seconds': '10'}
+        etag = self.client.get('/metrics').headers['ETag']
+        # The last complete read took longer than the scrape timeout
+        scrape.CURSOR.read_time = 60.0
+
+        response = self.client.get('/metrics', headers=headers)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            'metric_a 1.0\n' + scrape.render_scrape_status(0),
+            response.get_data(as_text=True))
+        self.assertNotIn('ETag', response.headers)
+        self.assertIn('ironic_exporter_scrape_truncated 0\n',
+                      response.get_data(as_text=True))
+        self.assertLess(scrape.CURSOR.read_time, 60.0)
+
+        # A client having all the metrics already is still answered
+        headers['If-None-Match'] = etag
+        scrape.CURSOR.read_time = 60.0
+        response = self.client.get('/metrics', headers=headers)
+        self.assertEqual(304, response.status_code)
+
+    def test_scrape_timeout_invalid(self):
+        self._write('node1-hardware.ipmi.metrics', 'metric_a 1.0\n')
+
+        response = self.client.get(
+            '/metrics', headers={'X-Prometheus-Scrape-Timeout-Seconds': 'x'})
+
+        self.assertEqual('metric_a 1.0\n', response.get_data(as_text=True))
+        self.assertIn('ETag', response.headers)
+
+    @mock.patch.object(scrape, 'scrape_deadline', autospec=True)
+    @mock.patch.object(scrape, 'time', autospec=True)
+    def test_scrape_timeout_truncated(self, mock_time, mock_deadline):
+        for index in range(3):
+            self._write('node%d-hardware.ipmi.metrics' % index,
+                        'metric_%d 1.0\n' % index)
+        listed = [os.path.basename(path)[:5] for path, _stat in
+                  scrape.list_metrics_files(self.location)]
+        headers = {'X-Prometheus-Scrape-Timeout-Seconds': '10'}
+        mock_deadline.return_value = 100.0
+        scrape.CURSOR.read_time = 150.0
+        # The deadline is reached after reading the first file
+        mock_time.monotonic.side_effect = [0.0, 0.0, 200.0]
+
+        response = self.client.get('/metrics', headers=headers)
+
+        self.assertEqual(
+            'metric_%s 1.0\n' % listed[0][-1] +
+            scrape.render_scrape_status(2),
+            response.get_data(as_text=True))
+        self.assertIn('ironic_exporter_scrape_truncated 1\n',
+                      response.get_data(as_text=True))
+        self.assertIn('ironic_exporter_scrape_skipped_files 2\n',
+                      response.get_data(as_text=True))
+
+        # The next scrape starts from the first file that was skipped
+        mock_time.monotonic.side_effect = None
+        mock_time.monotonic.return_value = 0.0
+        response = self.client.get('/metrics', headers=headers)
+
+        expected = ''.join('metric_%s 1.0\n' % name[-1]
+                           for name in listed[1:] + listed[:1])
+        self.assertEqual(expected + scrape.render_scrape_status(0),
+                         response.get_data(as_text=True))
+        self.assertIsNone(scrape.CURSOR.next_file)
+        self.assertEqual(0.0, scrape.CURSOR.read_time)
+
+
+class TestScrapeCursor(base.BaseTestCase):
+
+    def test_may_overrun(self):
+        cursor = scrape.ScrapeCursor()
+        # Nothing was read yet
+        self.assertTrue(cursor.may_overrun(10.0, 0.0))
+        cursor.finish(2.0)
+        self.assertFalse(cursor.may_overrun(10.0, 0.0))
+        self.assertTrue(cursor.may_overrun(10.0, 8.0))
+        cursor.stop_at('/metrics/node1')
+        self.assertTrue(cursor.may_overrun(10.0, 0.0))
+        cursor.finish(2.0)
+        self.assertIsNone(cursor.next_file)
+        cursor.interrupt(None, 1.0)
+        self.assertEqual(2.0, cursor.read_time)
+
+
+class TestMinimalPrometheusMetrics(TestPrometheusMetrics):
+
+    def setUp(self):
+        super(TestMinimalPrometheusMetrics, self).setUp()
+        self.client = werkzeug_test.Client(minimal.application)
+
+    def test_same_output_as_flask(self):
+        self._write('node1-hardware.ipmi.metrics', 'metric_a 1.0\n')
+        self._write('node2-hardware.ipmi.metrics', 'metric_b 2.0\n',
+                    mtime=1000000000)
+        self._write_config(max_age=600)
+        flask_client = exporter.application.test_client()
+
+        expected = flask_client.get('/metrics')
+        response = self.client.get('/metrics')
+
+        self.assertEqual(expected.get_data(), response.get_data())
+        for header in ('Content-Type', 'ETag', 'Last-Modified'):
+            self.assertEqual(expected.headers[header],
+                             response.headers[header])
+
+    def test_client_gone(self):
+        for index in range(3):
+            self._write('node%d-hardware.ipmi.metrics' % index,
+                        'metric_%d 1.0\n' % index)
+        listed = [path for path, _stat in
+                  scrape.list_metrics_files(self.location)]
+        environ = werkzeug_test.EnvironBuilder(
+            '/metrics',
+            headers={'X-Prometheus-Scrape-Timeout-Seconds': '10'}
+        ).get_environ()
+
+        chunks = minimal.application(environ, mock.Mock())
+        next(chunks)
+        # The server closes the response when Prometheus gives up
+        chunks.close()
+
+        self.assertEqual(listed[1], scrape.CURSOR.next_file)
+        self.assertIsNotNone(scrape.CURSOR.read_time)
+        self.assertTrue(scrape.CURSOR.may_overrun(10.0, 0.0))
+
+    def test_head(self):
+        self._write('node1-hardware.ipmi.metrics', 'metric_a 1.0\n')
+
+        response = self.client.head('/metrics')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(b'', response.get_data())
+
+    def test_not_found(self):
+        self.assertEqual(404, self.client.get('/other').status_code)
+
+    def test_method_not_allowed(self):
+        self.assertEqual(405, self.client.post('/metrics').status_code)
+
+    def test_missing_config(self):
+        with open(self.config_file, 'w') as f:
+            f.write('[DEFAULT]\n')
+
+        self.assertEqual(500, self.client.get('/metrics').status_code)
@@ -10,6 +10,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
 import json
 import os
 import unittest
@@ -142,3 +143,54 @@ class TestPayloadsParser(unittest.TestCase):
         payload = {'timestamp': '2019-03-29T20:12:22.989020'}
         header.timestamp_conductor_registry(payload, self.metric_registry)
         # Should skip silently without error - no metric registered
+
+    def test_timestamp_with_timezone(self):
+        payload = {'hostname': 'test-conductor',
+                   'timestamp': '2019-03-29T22:12:22.989020+02:00'}
+        header.timestamp_conductor_registry(payload, self.metric_registry)
+        self.assertEqual(1553890342.0, self.metric_registry.get_sample_value(
+            'conductor_service_last_payload_timestamp_seconds',
+            {'hostname': 'test-conductor'}
+        ))
+
+
+class TestParseTimestamp(unittest.TestCase):
+
+    def _strptime(self, value):
+        dt_timestamp = datetime.datetime.strptime(value,
+                                                  '%Y-%m-%dT%H:%M:%S.%f')
+        return (dt_timestamp - datetime.datetime(1970, 1, 1)).total_seconds()
+
+    def test_fixed_format(self):
+        for value in ('2019-03-29T20:12:22.989020',
+                      '1970-01-01T00:00:00.000000',
+                      '2024-02-29T23:59:59.999999',
+                      '2038-01-19T03:14:08.000001'):
+            self.assertAlmostEqual(self._strptime(value),
+                                   ipe_utils.parse_timestamp(value),
+                                   places=6)
+        self.assertEqual(1553890342,
+                         int(ipe_utils.parse_timestamp(
+                             '2019-03-29 20:12:22.989020')))
+
+    def test_iso_formats(self):
+        expected = 1553890342.98902
+        for value in ('2019-03-29T20:12:22.989020+00:00',
+                      '2019-03-29T20:12:22.989020Z',
+                      '2019-03-29T21:12:22.989020+01:00',
+                      '2019-03-29T15:12:22.989020-05:00'):
+            self.assertAlmostEqual(expected,
+                                   ipe_utils.parse_timestamp(value),
+                                   places=6)
+        self.assertEqual(1553890342.0,
+                         ipe_utils.parse_timestamp('2019-03-29T20:12:22'))
+
+    def test_invalid(self):
+        for value in ('invalid-timestamp-format',
+                      '2019-13-29T20:12:22.989020',
+                      '2019-03-29T24:12:22.989020',
+                      '2019-03-29T20:12:22.98902x',
+                      '',
+                      None,
+                      1553890342):
+            self.assertRaises(ValueError, ipe_utils.parse_timestamp, value)
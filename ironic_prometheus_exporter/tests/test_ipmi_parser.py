@@ -12,12 +12,15 @@
 
 import json
 import os
+import re
 import unittest
 
 from prometheus_client import CollectorRegistry
+from prometheus_client import generate_latest
 
 import ironic_prometheus_exporter
 from ironic_prometheus_exporter.parsers import ipmi
+from ironic_prometheus_exporter import self_metrics
 from ironic_prometheus_exporter import utils as ipe_utils
 
 
@@ -957,6 +960,56 @@ class TestPayloadsParser(unittest.TestCase):
              'entity_id': '7.1 (System Board)',
              'sensor_id': 'Front LED Panel (0x23)'}))
 
+    def test_metric_names_cache(self):
+        fan_category_info = ipmi.CATEGORY_PARAMS['fan'].copy()
+        fan_category_info['data'] = self.node_message['payload']['Fan']
+
+        expected = ipmi.metric_names(fan_category_info)
+        info = ipmi._metric_name.cache_info()
+        self.assertEqual(expected, ipmi.metric_names(fan_category_info))
+        self.assertEqual(info.hits + len(fan_category_info['data']),
+                         ipmi._metric_name.cache_info().hits)
+        self.assertEqual(info.misses, ipmi._metric_name.cache_info().misses)
+        self.assertEqual(
+            ipmi._metric_name.cache_info().hits,
+            self_metrics.REGISTRY.get_sample_value(
+                'ironic_exporter_cache_hits_total',
+                {'cache': 'ipmi_metric_names'}))
+
+    def test_parse_plan(self):
+        ipmi.category_registry(self.node_message, self.metric_registry)
+        info = ipmi._parse_plan.cache_info()
+
+        registry = CollectorRegistry()
+        ipmi.category_registry(self.node_message, registry)
+
+        self.assertEqual(info.hits + 1, ipmi._parse_plan.cache_info().hits)
+        self.assertEqual(info.misses, ipmi._parse_plan.cache_info().misses)
+        self.assertEqual(generate_latest(self.metric_registry),
+                         generate_latest(registry))
+        plan = ipmi._parse_plan(ipmi._fingerprint(self.payload))
+        for ipmi_category, category_params, available_metrics in plan:
+            category_info = category_params.copy()
+            category_info['data'] = self.payload[ipmi_category]
+            self.assertEqual(
+                {metric: list(entries)
+                 for metric, entries in available_metrics.items()},
+                ipmi.metric_names(category_info))
+
+    def test_parse_plan_units(self):
+        payload = {'Fan': {
+            'Fan1A (0x30)': {'Sensor Reading': '5880 (+/- 0) RPM'}}}
+        fingerprint = ipmi._fingerprint(payload)
+        payload['Fan']['Fan1A (0x30)']['Sensor Reading'] = 'No Reading'
+
+        self.assertNotEqual(fingerprint, ipmi._fingerprint(payload))
+        self.assertEqual(
+            ['baremetal_fan_rpm'],
+            list(ipmi._parse_plan(fingerprint)[0][2]))
+        self.assertEqual(
+            ['baremetal_fan'],
+            list(ipmi._parse_plan(ipmi._fingerprint(payload))[0][2]))
+
 
 class TestPayloadsParserNoneNodeName(unittest.TestCase):
 
@@ -1041,3 +1094,89 @@ class TestPayloadsParserNoneNodeName(unittest.TestCase):
                                        'instance_uuid': self.instance_uuid,
                                        'entity_id': '3.2 (Processor)',
                                        'status': 'ok'}))
+
+
+def _reference_sensor_value(sensor_reading, use_ipmi_format):
+    """The regex based value extraction the tokenizer replaced."""
+    sensor_values = sensor_reading.split()
+    if not use_ipmi_format:
+        if not re.search(r'(\d+(\.\d*)?|\.\d+)', sensor_values[0]):
+            raise ValueError("No valid value in Sensor Reading")
+    if len(sensor_values) > 1:
+        return float(sensor_values[0])
+    elif sensor_values[0] == "0h":
+        return 0
+    return 1
+
+
+class TestSensorReadingTokenizer(unittest.TestCase):
+
+    def test_analog_reading(self):
+        self.assertEqual(
+            ipmi.SensorReading(23.0, 'C', None, True),
+            ipmi.parse_sensor_reading('23 (+/- 0) degrees C'))
+        self.assertEqual(
+            ipmi.SensorReading(0.6, 'Amps', None, True),
+            ipmi.parse_sensor_reading('0.600 (+/- 0) Amps'))
+        self.assertEqual(
+            ipmi.SensorReading(5880.0, 'RPM', None, True),
+            ipmi.parse_sensor_reading('5880 (+/- 0) RPM'))
+
+    def test_discrete_reading(self):
+        self.assertEqual(ipmi.SensorReading(0.0, '', '0h', True),
+                         ipmi.parse_sensor_reading('0h'))
+        self.assertEqual(ipmi.SensorReading(1.0, '', '2eh', True),
+                         ipmi.parse_sensor_reading('2eh'))
+        self.assertEqual(ipmi.SensorReading(1.0, '', 'abh', False),
+                         ipmi.parse_sensor_reading('abh'))
+
+    def test_no_reading(self):
+        for sensor_reading in ('No Reading', 'Disabled'):
+            self.assertEqual(
+                ipmi.SensorReading(None, '', sensor_reading, False),
+                ipmi.parse_sensor_reading(sensor_reading))
+        self.assertIsNone(ipmi.parse_sensor_reading('').value)
+
+    def test_invalid_value(self):
+        self.assertIsNone(
+            ipmi.parse_sensor_reading('Not Available').value)
+        self.assertRaises(ValueError, ipmi._sensor_value, 'Not Available',
+                          True)
+        self.assertRaises(ValueError, ipmi._sensor_value, 'abh', False)
+
+    def test_discrete_reading_cache(self):
+        ipmi.parse_sensor_reading('4eh')
+        hits = ipmi.parse_sensor_reading.cache_info().hits
+        ipmi.parse_sensor_reading('4eh')
+        self.assertEqual(hits + 1, ipmi.parse_sensor_reading.cache_info().hits)
+
+    def test_conformance_with_samples(self):
+        samples_dir = os.path.join(
+            os.path.dirname(ironic_prometheus_exporter.__file__),
+            'tests', 'json_samples')
+        checked = 0
+        for sample in sorted(os.listdir(samples_dir)):
+            if not sample.startswith('notification-ipmi'):
+                continue
+            with open(os.path.join(samples_dir, sample)) as f:
+                payload = json.load(f)['payload']['payload']
+            for category, entries in payload.items():
+                for entry, sensor in entries.items():
+                    sensor_reading = sensor['Sensor Reading']
+                    if sensor_reading in ipmi.NO_READING_VALUES:
+                        continue
+                    for use_ipmi_format in (True, False):
+                        try:
+                            expected = _reference_sensor_value(
+                                sensor_reading, use_ipmi_format)
+                        except ValueError:
+                            self.assertRaises(
+                                ValueError, ipmi._sensor_value,
+                                sensor_reading, use_ipmi_format)
+                        else:
+                            self.assertEqual(
+                                expected, ipmi._sensor_value(
+                                    sensor_reading, use_ipmi_format),
+                                '%s: %s' % (sample, entry))
+                        checked += 1
+        self.assertGreater(checked, 0)
@@ -15,6 +15,7 @@ import os
 import unittest
 
 from prometheus_client import CollectorRegistry
+from prometheus_client import generate_latest
 
 import ironic_prometheus_exporter
 from ironic_prometheus_exporter.parsers import ironic
@@ -108,3 +109,86 @@ class TestIronicPayloadParser(unittest.TestCase):
         metrics = list(registry.collect())
         # Only the conductor metrics should be created (2 for timer)
         self.assertEqual(2, len(metrics))
+
+    def test_translate_key_cached(self):
+        ironic._translate_key.cache_clear()
+        key = ('ironic.drivers.modules.redfish.power.RedfishPower.'
+               'get_power_state')
+        expected = ('ironic_redfishpower_get_power_state', 'driver',
+                    'redfish')
+        self.assertEqual(expected, ironic._translate_key(key))
+        self.assertEqual(expected, ironic._translate_key(key))
+        info = ironic._translate_key.cache_info()
+        self.assertEqual((1, 1), (info.hits, info.misses))
+        self.assertIsNone(ironic._translate_key('UnknownKey.SomeMetric'))
+
+    def test_translated_keys_stable_across_messages(self):
+        first = CollectorRegistry()
+        ironic.category_registry(self.message, first)
+        second = CollectorRegistry()
+        ironic.category_registry(self.message, second)
+        self.assertEqual(generate_latest(first), generate_latest(second))
+
+
+class TestTimerRates(unittest.TestCase):
+
+    KEY = 'ironic.conductor.manager.ConductorManager._sync_power_states'
+    NAME = 'ironic_conductormanager_sync_power_states'
+    LABELS = {'hostname': 'a-conductor', 'service': 'ironic',
+              'component': 'conductor'}
+
+    def setUp(self):
+        super(TestTimerRates, self).setUp()
+        ironic.TIMER_HISTORY.reset()
+        self.addCleanup(ironic.TIMER_HISTORY.reset)
+
+    def _parse(self, timestamp, total, count):
+        message = {'hostname': 'a-conductor',
+                   'timestamp': timestamp,
+                   'payload': {self.KEY: {'sum': total, 'count': count,
+                                          'type': 'timer'}}}
+        registry = CollectorRegistry()
+        ironic.category_registry(message, registry, derive_timer_rates=True)
+        return registry
+
+    def _value(self, registry, suffix):
+        return registry.get_sample_value(self.NAME + suffix, self.LABELS)
+
+    def test_first_message(self):
+        registry = self._parse('2019-03-29T20:10:00.000000', 100.0, 10)
+        self.assertEqual(100.0, self._value(registry, '_time'))
+        self.assertIsNone(self._value(registry, '_calls_per_second'))
+        self.assertIsNone(self._value(registry, '_call_count_delta'))
+        self.assertIsNone(self._value(registry, '_mean_ms'))
+
+    def test_rates(self):
+        self._parse('2019-03-29T20:10:00.000000', 100.0, 10)
+        registry = self._parse('2019-03-29T20:11:00.000000', 400.0, 40)
+        self.assertEqual(0.5, self._value(registry, '_calls_per_second'))
+        self.assertEqual(30, self._value(registry, '_call_count_delta'))
+        self.assertEqual(10.0, self._value(registry, '_mean_ms'))
+
+    def test_no_calls(self):
+        self._parse('2019-03-29T20:10:00.000000', 100.0, 10)
+        registry = self._parse('2019-03-29T20:11:00.000000', 100.0, 10)
+        self.assertEqual(0, self._value(registry, '_calls_per_second'))
+        self.assertEqual(0, self._value(registry, '_call_count_delta'))
+        self.assertIsNone(self._value(registry, '_mean_ms'))
+
+    def test_conductor_restart(self):
+        self._parse('2019-03-29T20:10:00.000000', 400.0, 40)
+        registry = self._parse('2019-03-29T20:11:00.000000', 60.0, 3)
+        self.assertEqual(0.05, self._value(registry, '_calls_per_second'))
+        self.assertEqual(3, self._value(registry, '_call_count_delta'))
+        self.assertEqual(20.0, self._value(registry, '_mean_ms'))
+
+    def test_out_of_order(self):
+        self._parse('2019-03-29T20:11:00.000000', 400.0, 40)
+        registry = self._parse('2019-03-29T20:10:00.000000', 100.0, 10)
+        self.assertIsNone(self._value(registry, '_calls_per_second'))
+        registry = self._parse('2019-03-29T20:12:00.000000', 1000.0, 100)
+        self.assertEqual(1.0, self._value(registry, '_calls_per_second'))
+
+    def test_disabled_by_default(self):
+        ironic.category_registry(DATA['payload'], CollectorRegistry())
+        self.assertEqual({}, ironic.TIMER_HISTORY.samples)
@@ -11,8 +11,10 @@
 #    under the License.
 
 import json
+import operator
 import os
 import unittest
+from unittest import mock
 
 from prometheus_client import CollectorRegistry
 
@@ -220,6 +222,115 @@ class TestPayloadsParser(unittest.TestCase):
         self.assertIn('model', metrics[expected_metric][0][1])
         self.assertIn('redfish_system_uuid', metrics[expected_metric][0][1])
 
+    def test_node_info(self):
+        sample_file = os.path.join(
+            os.path.dirname(ironic_prometheus_exporter.__file__),
+            'tests', 'json_samples',
+            'notification-redfish-extra-info.json')
+        msg = json.load(open(sample_file))
+        registry = CollectorRegistry()
+
+        redfish.category_registry(msg['payload'], registry, node_info=True)
+
+        node_labels = dict(redfish._build_node_labels(msg['payload']))
+        self.assertIn('manufacturer', node_labels)
+        self.assertEqual(
+            1, registry.get_sample_value('baremetal_node_info', node_labels))
+        for metric in registry.collect():
+            if metric.name == 'baremetal_node_info':
+                continue
+            for sample in metric.samples:
+                self.assertEqual(node_labels['node_uuid'],
+                                 sample.labels['node_uuid'])
+                self.assertIn('sensor_id', sample.labels)
+                self.assertNotIn('manufacturer', sample.labels)
+                self.assertNotIn('node_name', sample.labels)
+
+    def test_node_labels_shared(self):
+        sample_file = os.path.join(
+            os.path.dirname(ironic_prometheus_exporter.__file__),
+            'tests', 'json_samples',
+            'notification-redfish-extra-info.json')
+        msg = json.load(open(sample_file))
+        node_labels = redfish._build_node_labels(msg['payload'])
+
+        metrics = redfish.build_temperature_metrics(msg['payload'],
+                                                    node_labels)
+        metrics.update(redfish.build_drive_metrics(msg['payload'],
+                                                   node_labels))
+
+        for details in metrics.values():
+            for value, labels in details:
+                self.assertIs(node_labels, labels.maps[-1])
+                self.assertNotIn('node_uuid', labels.maps[0])
+        self.assertRaises(TypeError, operator.setitem, node_labels, 'a', 'b')
+
+    def test_build_metrics(self):
+        metrics = redfish.build_metrics(self.node_message)
+
+        expected = {}
+        for build in (redfish.build_temperature_metrics,
+                      redfish.build_power_metrics,
+                      redfish.build_fan_metrics,
+                      redfish.build_drive_metrics):
+            expected.update(build(self.node_message))
+        self.assertEqual(expected, metrics)
+
+    def test_build_metrics_merges_same_metric(self):
+        self.node_message['payload']['Voltage'] = {
+            '0:Voltage@ZZZ-YYY-XXX': {'state': 'enabled', 'health': 'OK',
+                                      'reading_volts': 12.1},
+        }
+        voltage_rule = redfish.SensorRule(
+            sensor_type='Voltage',
+            reading_field='reading_volts',
+            reading_metric='baremetal_voltage_volts',
+            name_fields=(),
+            status_metric='baremetal_power_status',
+            health_map=redfish.HEALTH_MAP,
+            require_health=True,
+            ignore_keys=('reading_volts',))
+
+        metrics = redfish.build_metrics(
+            self.node_message,
+            rules=redfish.SENSOR_RULES + (voltage_rule,))
+
+        self.assertEqual([(12.1, mock.ANY)],
+                         metrics['baremetal_voltage_volts'])
+        sensor_ids = [labels['sensor_id'] for _value, labels
+                      in metrics['baremetal_power_status']]
+        self.assertEqual(['0:Power@ZZZ-YYY-XXX', '0:Voltage@ZZZ-YYY-XXX'],
+                         sensor_ids)
+
+    def test_category_registry_merges_different_labels(self):
+        self.node_message['payload']['Voltage'] = {
+            '0:Voltage@ZZZ-YYY-XXX': {'state': 'enabled', 'health': 'OK',
+                                      'reading_volts': 12.1},
+        }
+        voltage_rule = redfish.SensorRule(
+            sensor_type='Voltage',
+            reading_field='reading_volts',
+            reading_metric='baremetal_voltage_volts',
+            name_fields=(),
+            status_metric='baremetal_power_status',
+            health_map=redfish.HEALTH_MAP,
+            require_health=True,
+            ignore_keys=('reading_volts',))
+        registry = CollectorRegistry()
+
+        redfish.category_registry(
+            self.node_message, registry,
+            rules=redfish.SENSOR_RULES + (voltage_rule,))
+
+        [metric] = [metric for metric in registry.collect()
+                    if metric.name == 'baremetal_power_status']
+        power, voltage = metric.samples
+        self.assertEqual(set(power.labels), set(voltage.labels))
+        self.assertEqual('0:Voltage@ZZZ-YYY-XXX',
+                         voltage.labels['sensor_id'])
+        self.assertEqual('', voltage.labels['serial_number'])
+        self.assertEqual('SN010203040506', power.labels['serial_number'])
+
 
 class TestPayloadsParserNoneNodeName(unittest.TestCase):
 
@@ -0,0 +1,160 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import os
+import unittest
+
+import fixtures
+from oslo_messaging.tests import utils as test_utils
+from prometheus_client import CollectorRegistry
+from prometheus_client import Counter
+from prometheus_client import Gauge
+from prometheus_client import generate_latest
+
+import ironic_prometheus_exporter
+from ironic_prometheus_exporter.messaging import PrometheusFileDriver
+from ironic_prometheus_exporter import relabel
+
+
+def series(registry):
+    return [(sample.name, sample.labels)
+            for metric in registry.collect() for sample in metric.samples]
+
+
+class TestRelabelRules(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = CollectorRegistry()
+        gauge = Gauge('baremetal_temp_cpu_celsius', 'CPU temperature',
+                      ['node_uuid', 'sensor_id'], registry=self.registry)
+        gauge.labels('uuid', 'CPU1@System.Embedded.1').set(42)
+        Gauge('baremetal_temperature_status', 'Status', ['node_uuid'],
+              registry=self.registry).labels('uuid').set(0)
+        Counter('baremetal_errors', 'Errors', ['node_uuid'],
+                registry=self.registry).labels('uuid').inc()
+
+    def test_drop(self):
+        rules = relabel.RelabelRules([
+            {'action': 'drop', 'regex': '.*_status'}])
+        self.assertEqual(
+            ['baremetal_temp_cpu_celsius', 'baremetal_errors_total',
+             'baremetal_errors_created'],
+            [name for name, _ in series(rules.apply(self.registry))])
+
+    def test_keep(self):
+        rules = relabel.RelabelRules([
+            {'action': 'keep', 'regex': 'baremetal_temp.*'}])
+        self.assertEqual(
+            ['baremetal_temp_cpu_celsius', 'baremetal_temperature_status'],
+            [name for name, _ in series(rules.apply(self.registry))])
+
+    def test_rename(self):
+        rules = relabel.RelabelRules([
+            {'action': 'rename', 'regex': 'baremetal_(.*)',
+             'replacement': 'bm_\\1'},
+            {'action': 'drop', 'regex': 'bm_temperature_status'}])
+        self.assertEqual(
+            b'# HELP bm_temp_cpu_celsius CPU temperature\n'
+            b'# TYPE bm_temp_cpu_celsius gauge\n'
+            b'bm_temp_cpu_celsius{node_uuid="uuid",'
+            b'sensor_id="CPU1@System.Embedded.1"} 42.0\n',
+            generate_latest(rules.apply(self.registry)).split(
+                b'# HELP bm_errors')[0])
+        self.assertEqual(
+            ['bm_temp_cpu_celsius', 'bm_errors_total', 'bm_errors_created'],
+            [name for name, _ in series(rules.apply(self.registry))])
+
+    def test_rename_merges(self):
+        rules = relabel.RelabelRules([
+            {'action': 'rename', 'regex': 'baremetal_temp.*',
+             'replacement': 'baremetal_temperature'}])
+        families = list(rules.apply(self.registry).collect())
+        self.assertEqual(['baremetal_temperature', 'baremetal_errors'],
+                         [family.name for family in families])
+        self.assertEqual(2, len(families[0].samples))
+
+    def test_label_replace(self):
+        rules = relabel.RelabelRules([
+            {'action': 'label_replace', 'metric': '.*_celsius',
+             'source_label': 'sensor_id', 'regex': '([^@]*)@.*',
+             'target_label': 'sensor'},
+            {'action': 'label_replace', 'source_label': 'sensor_id',
+             'target_label': 'sensor_id', 'replacement': ''}])
+        self.assertEqual(
+            [('baremetal_temp_cpu_celsius',
+              {'node_uuid': 'uuid', 'sensor': 'CPU1'}),
+             ('baremetal_temperature_status', {'node_uuid': 'uuid'})],
+            series(rules.apply(self.registry))[:2])
+
+    def test_plan_cached(self):
+        rules = relabel.RelabelRules([
+            {'action': 'rename', 'regex': 'baremetal_(.*)',
+             'replacement': 'bm_\\1'}])
+        rules.apply(self.registry)
+        rules.apply(self.registry)
+        info = rules.plan.cache_info()
+        self.assertEqual(3, info.misses)
+        self.assertEqual(3, info.hits)
+
+    def test_invalid_rules(self):
+        for rules in ({'action': 'drop'},
+                      [{'action': 'relabel', 'regex': '.*'}],
+                      [{'action': 'drop'}],
+                      [{'action': 'keep', 'regex': '('}],
+                      [{'action': 'rename', 'regex': '.*'}],
+                      [{'action': 'rename', 'regex': '(.*)',
+                        'replacement': '\\2'}],
+                      [{'action': 'label_replace', 'source_label': 'a',
+                        'target_label': 'b-c'}]):
+            self.assertRaises(ValueError, relabel.RelabelRules, rules)
+
+
+class TestRelabelDriver(test_utils.BaseTestCase):
+
+    def test_notify(self):
+        temp_dir = self.useFixture(fixtures.TempDir()).path
+        rules_file = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                                  'rules.json')
+        with open(rules_file, 'w') as f:
+            json.dump([{'action': 'keep', 'regex': 'baremetal_temp_.*'},
+                       {'action': 'rename', 'regex': 'baremetal_temp_(.*)',
+                        'replacement': 'baremetal_temperature_\\1'}], f)
+        self.config(location=temp_dir, relabel_rules_file=rules_file,
+                    group='oslo_messaging_notifications')
+        driver = PrometheusFileDriver(self.conf, None, None)
+        sample_file = os.path.join(
+            os.path.dirname(ironic_prometheus_exporter.__file__),
+            'tests', 'json_samples', 'notification-redfish.json')
+        with open(sample_file) as f:
+            msg = json.load(f)
+
+        driver.notify(None, msg, 'INFO', 0)
+
+        with open(os.path.join(
+                temp_dir, 'knilab-master-u9-hardware.redfish.metrics')) as f:
+            content = f.read()
+        self.assertEqual(
+            ['baremetal_temperature_cpu_celsius'],
+            [line.split()[2] for line in content.splitlines()
+             if line.startswith('# TYPE')])
+
+    def test_invalid_file(self):
+        rules_file = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                                  'rules.json')
+        with open(rules_file, 'w') as f:
+            f.write('[{"action": ')
+        self.config(location=self.useFixture(fixtures.TempDir()).path,
+                    relabel_rules_file=rules_file,
+                    group='oslo_messaging_notifications')
+        self.assertRaises(ValueError, PrometheusFileDriver, self.conf, None,
+                          None)
@@ -0,0 +1,141 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import os
+from unittest import mock
+
+import fixtures
+from oslo_messaging.tests import utils as test_utils
+
+import ironic_prometheus_exporter
+from ironic_prometheus_exporter.cmd import replay
+from ironic_prometheus_exporter import recording
+
+
+SAMPLES = ('notification-ipmi-1.json', 'notification-redfish.json',
+           'notification-idrac.json')
+
+
+def load_sample(name):
+    sample_file = os.path.join(
+        os.path.dirname(ironic_prometheus_exporter.__file__),
+        'tests', 'json_samples', name)
+    with open(sample_file) as f:
+        return json.load(f)
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+class TestReplay(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestReplay, self).setUp()
+        self.temp_dir = self.useFixture(fixtures.TempDir()).path
+        self.recordings = os.path.join(self.temp_dir, 'recordings')
+        os.makedirs(self.recordings)
+        writer = recording.RecordingWriter(self.recordings, max_bytes=1,
+                                           backup_count=5)
+        for received_at, name in enumerate(SAMPLES):
+            writer.write(load_sample(name), 'info',
+                         received_at=1000.0 + received_at * 10)
+        writer.close()
+
+    def test_iter_recordings_in_order(self):
+        records = list(replay.iter_recordings([self.recordings]))
+        self.assertEqual(
+            ['hardware.ipmi.metrics', 'hardware.redfish.metrics',
+             'hardware.idrac.metrics'],
+            [record['message']['event_type'] for record in records])
+
+    def test_compressed_writer_not_closed(self):
+        location = os.path.join(self.temp_dir, 'compressed')
+        os.makedirs(location)
+        # A process stopped without closing its writer
+        writer = recording.RecordingWriter(location, compress=True)
+        self.addCleanup(writer.close)
+        writer.write(load_sample(SAMPLES[0]), 'info', received_at=1000.0)
+        writer = recording.RecordingWriter(location, compress=True)
+        self.addCleanup(writer.close)
+        writer.write(load_sample(SAMPLES[1]), 'info', received_at=1010.0)
+
+        records = list(replay.iter_recordings([location]))
+        self.assertEqual(
+            ['hardware.ipmi.metrics', 'hardware.redfish.metrics'],
+            [record['message']['event_type'] for record in records])
+
+    def test_replay_scaled_speed(self):
+        driver = mock.Mock()
+        fake = FakeClock()
+        stats = replay.replay(driver,
+                              replay.iter_recordings([self.recordings]),
+                              speed=2.0, clock=fake.clock,
+                              sleep=fake.sleep)
+        self.assertEqual([5.0, 5.0], fake.sleeps)
+        self.assertEqual(3, driver.notify.call_count)
+        self.assertEqual(10.0, stats['elapsed'])
+        self.assertEqual(3, sum(stats['notifications'].values()))
+
+    def test_replay_max_speed_with_limit(self):
+        driver = mock.Mock()
+        fake = FakeClock()
+        stats = replay.replay(driver,
+                              replay.iter_recordings([self.recordings]),
+                              speed=0, limit=2, clock=fake.clock,
+                              sleep=fake.sleep)
+        self.assertEqual([], fake.sleeps)
+        self.assertEqual(2, driver.notify.call_count)
+        self.assertEqual({'hardware.ipmi.metrics': 1,
+                          'hardware.redfish.metrics': 1},
+                         dict(stats['notifications']))
+
+    def test_replay_failures(self):
+        driver = mock.Mock()
+        driver.notify.side_effect = [None, KeyError('payload'), None]
+        stats = replay.replay(driver,
+                              replay.iter_recordings([self.recordings]),
+                              speed=0)
+        self.assertEqual({'hardware.redfish.metrics': 1},
+                         dict(stats['failures']))
+        self.assertIn('3 notifications', replay.format_report(stats))
+
+    def test_main(self):
+        location = os.path.join(self.temp_dir, 'metrics')
+        config_file = os.path.join(self.temp_dir, 'replay.conf')
+        with open(config_file, 'w') as f:
+            f.write('[oslo_messaging_notifications]\n'
+                    'location = %s\n' % location)
+
+        with mock.patch('builtins.print') as mock_print:
+            result = replay.main(['--config-file', config_file,
+                                  '--speed', '0', self.recordings])
+
+        self.assertEqual(0, result)
+        self.assertEqual(
+            sorted(['knilab-master-u9-hardware.ipmi.metrics',
+                    'knilab-master-u9-hardware.redfish.metrics',
+                    'r640-u12-hardware.idrac.metrics']),
+            sorted(os.listdir(location)))
+        self.assertIn('Replayed 3 notifications',
+                      mock_print.call_args[0][0])
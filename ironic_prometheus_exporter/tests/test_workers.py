@@ -0,0 +1,131 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import copy
+import json
+import os
+import socket
+from unittest import mock
+
+import fixtures
+from oslo_messaging.tests import utils as test_utils
+
+import ironic_prometheus_exporter
+from ironic_prometheus_exporter import workers
+
+
+def load_sample(name):
+    sample_file = os.path.join(
+        os.path.dirname(ironic_prometheus_exporter.__file__),
+        'tests', 'json_samples', name)
+    with open(sample_file) as f:
+        return json.load(f)
+
+
+class TestPartition(test_utils.BaseTestCase):
+
+    def test_stable(self):
+        message = load_sample('notification-ipmi-1.json')
+        # zlib.crc32 does not depend on the hash seed of the process.
+        self.assertEqual(
+            [workers.partition(message, count) for count in (1, 2, 3, 4)],
+            [0, 0, 2, 0])
+
+    def test_same_node(self):
+        ipmi = load_sample('notification-ipmi-1.json')
+        redfish = load_sample('notification-redfish.json')
+        self.assertEqual(ipmi['payload']['node_uuid'],
+                         redfish['payload']['node_uuid'])
+        for count in range(1, 8):
+            self.assertEqual(workers.partition(ipmi, count),
+                             workers.partition(redfish, count))
+
+    def test_conductor(self):
+        message = {'event_type': 'ironic.metrics',
+                   'payload': {'hostname': 'a-conductor'}}
+        self.assertEqual(workers.partition(message, 5),
+                         workers.partition(copy.deepcopy(message), 5))
+
+
+class TestWorkerPool(test_utils.BaseTestCase):
+
+    def test_notify(self):
+        temp_dir = self.useFixture(fixtures.TempDir()).path
+        self.config(location=temp_dir, self_metrics=True,
+                    group='oslo_messaging_notifications')
+        pool = workers.WorkerPool(self.conf, 2)
+        pool.start()
+        self.addCleanup(pool.stop)
+
+        ipmi = load_sample('notification-ipmi-1.json')
+        newer = copy.deepcopy(ipmi)
+        newer['payload']['timestamp'] = '2019-03-29T20:22:22.989020'
+        idrac = load_sample('notification-idrac.json')
+        for message in (ipmi, idrac, newer):
+            pool.notify(None, message, 'info', 0)
+        pool.stop()
+
+        files = set(os.listdir(temp_dir))
+        self.assertIn('knilab-master-u9-hardware.ipmi.metrics', files)
+        self.assertIn('r640-u12-hardware.idrac.metrics', files)
+        workers_used = {workers.partition(ipmi, 2),
+                        workers.partition(idrac, 2)}
+        for index in workers_used:
+            name = '%s.worker%d-ironic_prometheus_exporter' % (
+                socket.gethostname(), index)
+            self.assertIn(name, files)
+            with open(os.path.join(temp_dir, name)) as f:
+                self.assertIn('process="worker%d"' % index, f.read())
+        with open(os.path.join(
+                temp_dir, 'knilab-master-u9-hardware.ipmi.metrics')) as f:
+            # The notifications of a node are written in order.
+            self.assertIn('} 1.553890942e+09', f.read())
+
+    def test_restart_dead_worker(self):
+        temp_dir = self.useFixture(fixtures.TempDir()).path
+        self.config(location=temp_dir,
+                    group='oslo_messaging_notifications')
+        pool = workers.WorkerPool(self.conf, 1)
+        pool.start()
+        self.addCleanup(pool.stop)
+        pool.processes[0].terminate()
+        pool.processes[0].join()
+
+        # The notifications of a dead worker are dropped
+        pool.notify(None, load_sample('notification-ipmi-1.json'), 'info', 0)
+        pool.check()
+        self.assertTrue(pool.processes[0].is_alive())
+
+        pool.notify(None, load_sample('notification-ipmi-1.json'), 'info', 0)
+        pool.stop()
+        self.assertIn('knilab-master-u9-hardware.ipmi.metrics',
+                      os.listdir(temp_dir))
+
+    def test_full_queue(self):
+        pool = workers.WorkerPool(self.conf, 1, queue_size=1)
+        pool.queues[0] = workers.CONTEXT.Queue(1)
+        pool.queues[0].put(('queued', 'info'))
+        # The worker dies while its queue is full
+        pool.processes[0] = mock.Mock(spec=['is_alive'])
+        pool.processes[0].is_alive.side_effect = [True, True, False]
+        self.useFixture(fixtures.MockPatchObject(workers, 'PUT_TIMEOUT',
+                                                 0.01))
+
+        with mock.patch.object(workers.LOG, 'warning',
+                               autospec=True) as mock_warning:
+            pool.notify(None, load_sample('notification-ipmi-1.json'),
+                        'info', 0)
+
+        self.assertEqual(3, pool.processes[0].is_alive.call_count)
+        self.assertEqual(3, mock_warning.call_count)
+        self.assertEqual(('queued', 'info'), pool.queues[0].get(timeout=1))
+        self.assertTrue(pool.queues[0].empty())
@@ -10,8 +10,90 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+import functools
+
+from prometheus_client.metrics_core import Metric
+
+from ironic_prometheus_exporter import self_metrics
+
+
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+class MetricFamilies(object):
+    """Registry like object serving already collected metric families.
+
+    ``generate_latest`` and the output backends only call ``collect()``, so
+    the families post processed after parsing are given to them wrapped in
+    this object.
+    """
+
+    def __init__(self, families):
+        self.families = families
+
+    def collect(self):
+        return iter(self.families)
+
+
+def copy_family(metric, samples):
+    """Copy of a metric family with other samples."""
+    family = Metric(metric.name, metric.documentation, metric.type,
+                    metric.unit)
+    family.samples = samples
+    return family
+
 
 def update_instance_uuid(labels):
     if labels['instance_uuid'] is None and labels['node_uuid']:
         labels['instance_uuid'] = labels.get('node_uuid')
     return labels
+
+
+@functools.lru_cache(maxsize=1024)
+def _day_seconds(date):
+    """Seconds between the epoch and the start of a YYYY-MM-DD UTC day."""
+    return (datetime.date.fromisoformat(date).toordinal()
+            - EPOCH_ORDINAL) * 86400
+
+
+self_metrics.register_cache('timestamp_days', _day_seconds)
+
+
+def parse_timestamp(value):
+    """Convert a payload timestamp to seconds since the epoch.
+
+    Ironic sends ``YYYY-MM-DDTHH:MM:SS.ffffff`` timestamps in UTC, they are
+    converted by slicing the string, with the date part cached since all
+    the payloads of a day share it. Any other ISO 8601 timestamp, with or
+    without a timezone, is parsed with ``datetime.fromisoformat``; naive
+    timestamps are taken as UTC.
+
+    :param value: Timestamp string
+    :returns: Seconds since the epoch, as a float keeping the microseconds.
+    :raises ValueError: if the timestamp can not be parsed.
+    """
+    if not isinstance(value, str):
+        raise ValueError('Invalid timestamp: %r' % (value,))
+
+    if (len(value) == 26 and value[4] == '-' and value[7] == '-'
+            and value[10] in 'T ' and value[13] == ':' and value[16] == ':'
+            and value[19] == '.'):
+        digits = (value[:4] + value[5:7] + value[8:10] + value[11:13]
+                  + value[14:16] + value[17:19] + value[20:])
+        if digits.isascii() and digits.isdigit():
+            hour = int(value[11:13])
+            minute = int(value[14:16])
+            second = int(value[17:19])
+            if hour < 24 and minute < 60 and second < 60:
+                return (_day_seconds(value[:10]) + hour * 3600
+                        + minute * 60 + second + int(value[20:]) / 1e6)
+
+    if value.endswith(('Z', 'z')):
+        # NOTE: datetime.fromisoformat only understands the Z suffix since
+        # Python 3.11.
+        value = value[:-1] + '+00:00'
+    dt_timestamp = datetime.datetime.fromisoformat(value)
+    if dt_timestamp.tzinfo is None:
+        dt_timestamp = dt_timestamp.replace(tzinfo=datetime.timezone.utc)
+    return dt_timestamp.timestamp()
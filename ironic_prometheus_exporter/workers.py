@@ -0,0 +1,149 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Pool of processes parsing the notifications.
+
+A single process parsing the notifications of a large deployment is bound
+by the GIL. The pool spreads them over worker processes, each running its
+own ``PrometheusFileDriver``. Notifications are partitioned by a stable hash
+of the node UUID, or of the conductor hostname, so each metrics file is only
+written by one worker, in the order the notifications were received.
+"""
+
+import logging
+import multiprocessing
+import queue
+import signal
+import zlib
+
+from ironic_prometheus_exporter import messaging
+
+
+LOG = logging.getLogger(__name__)
+
+# NOTE: the workers inherit the configuration of the consumer, which can't
+# be pickled, so they are forked. They are only forked from the main thread
+# of the consumer, by start() before the listener threads run and by check()
+# afterwards, never from the listener threads.
+CONTEXT = multiprocessing.get_context('fork')
+
+STOP_TIMEOUT = 10
+
+# Seconds notify() waits for room in the queue of a worker before checking
+# the worker is still running.
+PUT_TIMEOUT = 1
+
+
+def partition(message, workers):
+    """Index of the worker handling a notification.
+
+    :param message: Notification, as given to the notifier driver.
+    :param workers: Number of workers.
+    """
+    payload = message.get('payload') or {}
+    key = payload.get('node_uuid') or payload.get('hostname') or ''
+    return zlib.crc32(key.encode('utf-8')) % workers
+
+
+def _run_worker(conf, index, work_queue):
+    # NOTE: the consumer stops the workers once its listener is stopped,
+    # an interrupt sent to the process group must not stop them earlier.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    driver = messaging.PrometheusFileDriver(conf, None, None)
+    # Each worker has its own self metrics, named after its index rather
+    # than its process id, which changes when it is restarted.
+    driver.self_metrics_process = 'worker%d' % index
+    while True:
+        item = work_queue.get()
+        if item is None:
+            return
+        message, priority = item
+        try:
+            driver.notify(None, message, priority, 0)
+        except Exception:
+            # NOTE: the driver already logged the error.
+            pass
+
+
+class WorkerPool(object):
+    """Notifier driver like object handing notifications to workers.
+
+    :param conf: Configuration of the ``PrometheusFileDriver`` of the
+        workers.
+    :param workers: Number of worker processes.
+    :param queue_size: Notifications waiting for each worker before
+        :meth:`notify` blocks.
+
+    The workers that exit are restarted by :meth:`check`, which the owner of
+    the pool calls periodically from its main thread.
+    """
+
+    def __init__(self, conf, workers, queue_size=100):
+        self.conf = conf
+        self.queue_size = queue_size
+        self.queues = [None] * workers
+        self.processes = [None] * workers
+
+    def _start_worker(self, index):
+        # NOTE: a worker killed while reading its queue leaves the queue
+        # lock acquired, each worker starts with a new queue. The
+        # notifications still queued for a dead worker are lost.
+        self.queues[index] = CONTEXT.Queue(self.queue_size)
+        process = CONTEXT.Process(
+            target=_run_worker, args=(self.conf, index, self.queues[index]),
+            name='ironic-prometheus-exporter-worker-%d' % index, daemon=True)
+        process.start()
+        self.processes[index] = process
+
+    def start(self):
+        for index in range(len(self.processes)):
+            self._start_worker(index)
+
+    def check(self):
+        """Restart the workers that exited."""
+        for index, process in enumerate(self.processes):
+            if not process.is_alive():
+                LOG.warning('Worker %d exited with code %s, restarting it',
+                            index, process.exitcode)
+                self._start_worker(index)
+
+    def notify(self, ctxt, message, priority, retry):
+        index = partition(message, len(self.queues))
+        while self.processes[index].is_alive():
+            try:
+                self.queues[index].put((message, priority),
+                                       timeout=PUT_TIMEOUT)
+                return
+            except queue.Full:
+                LOG.warning('The queue of worker %d is full, waiting for it',
+                            index)
+        # NOTE: the notification can't be handed to the worker restarting
+        # it, which is done from the main thread.
+        LOG.warning('Worker %d is not running, dropping a %s notification',
+                    index, message.get('event_type'))
+
+    def stop(self):
+        """Stop the workers once they handled the queued notifications."""
+        for work_queue, process in zip(self.queues, self.processes):
+            if process is not None and process.is_alive():
+                try:
+                    work_queue.put(None, timeout=STOP_TIMEOUT)
+                except queue.Full:
+                    pass
+        for process in self.processes:
+            if process is None:
+                continue
+            process.join(STOP_TIMEOUT)
+            if process.is_alive():
+                LOG.warning('Terminating worker %s', process.name)
+                process.terminate()
+                process.join()
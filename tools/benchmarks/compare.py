@@ -0,0 +1,63 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare two result files written by ``parsers.py``.
+
+Usage::
+
+    python tools/benchmarks/compare.py before.json after.json
+"""
+
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('before', help='Results of the reference checkout.')
+    parser.add_argument('after', help='Results of the checkout to compare.')
+    args = parser.parse_args()
+
+    before = load(args.before)
+    after = load(args.after)
+    if (before['metadata']['parameters']
+            != after['metadata']['parameters']):
+        print('warning: the results were produced with different '
+              'parameters', file=sys.stderr)
+
+    print('%-38s %12s %12s %8s %12s %12s' % (
+        'parser', 'before ops/s', 'after ops/s', 'speedup',
+        'before peak', 'after peak'))
+    for name, result in sorted(after['results'].items()):
+        reference = before['results'].get(name)
+        if reference is None:
+            print('%-38s %12s %12.0f' % (name, '-',
+                                         result['ops_per_second']))
+            continue
+        print('%-38s %12.0f %12.0f %7.2fx %12d %12d' % (
+            name, reference['ops_per_second'], result['ops_per_second'],
+            result['ops_per_second'] / reference['ops_per_second'],
+            reference['peak_bytes'], result['peak_bytes']))
+        if reference['series'] != result['series']:
+            print('warning: %s produced %d series instead of %d'
+                  % (name, result['series'], reference['series']),
+                  file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark the single pass IPMI parser against the three pass one.
+
+The IPMI samples used by the unit tests are scaled up by duplicating the
+sensors of the known categories under new sensor ids, then parsed with
+``ipmi.category_registry`` and with the previous implementation, which
+walked the entries of each metric with ``extract_labels`` and
+``extract_values``. Both must produce the same output.
+
+Usage::
+
+    tox -e venv -- python tools/benchmarks/ipmi_parser.py --sensors 240
+"""
+
+import argparse
+import copy
+import json
+import os
+import re
+import timeit
+
+from prometheus_client import CollectorRegistry
+from prometheus_client import Gauge
+from prometheus_client import generate_latest
+
+from ironic_prometheus_exporter.parsers import descriptions
+from ironic_prometheus_exporter.parsers import ipmi
+from ironic_prometheus_exporter import utils as ipe_utils
+
+
+SAMPLES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__)))),
+    'ironic_prometheus_exporter', 'tests', 'json_samples')
+SAMPLES = ('notification-ipmi-1.json', 'notification-ipmi-2.json')
+
+SENSOR_NUMBER_RE = re.compile(r'\(0x[0-9a-f]+\)$')
+
+
+def scale_payload(node_message, sensors):
+    """Duplicate the sensors of the known categories up to ``sensors``."""
+    node_message = copy.deepcopy(node_message)
+    payload = node_message['payload']
+    known = [category for category in payload
+             if category.lower() in ipmi.CATEGORY_PARAMS]
+    originals = {category: list(payload[category].items())
+                 for category in known}
+    total = sum(len(entries) for entries in originals.values())
+    number = 0x100
+    while total < sensors:
+        for category in known:
+            for entry, data in originals[category]:
+                new_id = '(0x%x)' % number
+                number += 1
+                data = dict(data)
+                data['Sensor ID'] = SENSOR_NUMBER_RE.sub(
+                    new_id, data['Sensor ID'])
+                payload[category][SENSOR_NUMBER_RE.sub(new_id, entry)] = data
+                total += 1
+    return node_message, total
+
+
+def three_pass_category_registry(node_message, ipmi_metric_registry):
+    """The IPMI parser as it was before it was fused in a single pass."""
+    for ipmi_category in node_message['payload']:
+        if ipmi_category.lower() not in ipmi.CATEGORY_PARAMS:
+            continue
+        category_info = ipmi.CATEGORY_PARAMS[ipmi_category.lower()].copy()
+        category_info['data'] = node_message['payload'][ipmi_category]
+        category_info['node_name'] = node_message['node_name']
+        category_info['node_uuid'] = node_message['node_uuid']
+        category_info['instance_uuid'] = node_message['instance_uuid']
+        available_metrics = ipmi.metric_names(category_info)
+        for metric, entries in available_metrics.items():
+            labels = ipmi.extract_labels(entries, category_info)
+            values = ipmi.extract_values(entries, category_info)
+            if all(v is None for v in values.values()):
+                continue
+            desc = descriptions.get_metric_description('ipmi', metric)
+            g = Gauge(metric, desc, labelnames=list(labels.get(entries[0])),
+                      registry=ipmi_metric_registry)
+            for e in entries:
+                if values[e] is None:
+                    continue
+                valid_labels = ipe_utils.update_instance_uuid(labels[e])
+                g.labels(**valid_labels).set(values[e])
+
+
+def run(parser, node_message, iterations):
+    def parse():
+        parser(node_message, CollectorRegistry())
+    return min(timeit.repeat(parse, number=iterations, repeat=5)) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sensors', type=int, default=240,
+                        help='Number of sensors of the known categories in '
+                             'each scaled payload.')
+    parser.add_argument('--iterations', type=int, default=200,
+                        help='Number of payloads parsed per measurement.')
+    args = parser.parse_args()
+
+    for sample in SAMPLES:
+        with open(os.path.join(SAMPLES_DIR, sample)) as f:
+            node_message = json.load(f)['payload']
+        node_message, sensors = scale_payload(node_message, args.sensors)
+
+        expected = CollectorRegistry()
+        three_pass_category_registry(node_message, expected)
+        result = CollectorRegistry()
+        ipmi.category_registry(node_message, result)
+        if generate_latest(expected) != generate_latest(result):
+            raise SystemExit('%s: outputs differ' % sample)
+
+        before = run(three_pass_category_registry, node_message,
+                     args.iterations)
+        after = run(ipmi.category_registry, node_message, args.iterations)
+        print('%s (%d sensors): three pass %.3f ms, single pass %.3f ms, '
+              'speedup x%.2f' % (sample, sensors, before * 1000,
+                                 after * 1000, before / after))
+
+
+if __name__ == '__main__':
+    main()
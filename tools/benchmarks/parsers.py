@@ -0,0 +1,159 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark the notification parsers on synthetic payloads.
+
+Each parser is run on a notification built by ``payloads.py`` and timed with
+``timeit``, keeping the best of several repetitions, then run once more
+under ``tracemalloc`` to record its peak allocations. The results are
+written as JSON so two checkouts can be compared with ``compare.py``::
+
+    tox -e venv -- python tools/benchmarks/parsers.py --output before.json
+    git checkout my-branch
+    tox -e venv -- python tools/benchmarks/parsers.py --output after.json
+    tox -e venv -- python tools/benchmarks/compare.py before.json after.json
+
+The parser caches are warm after the first iteration, as they are for a
+conductor reporting the same nodes on every interval.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import timeit
+import tracemalloc
+
+from prometheus_client import CollectorRegistry
+from prometheus_client import generate_latest
+
+from ironic_prometheus_exporter.parsers import header
+from ironic_prometheus_exporter.parsers import ipmi
+from ironic_prometheus_exporter.parsers import ironic
+from ironic_prometheus_exporter.parsers import redfish
+
+import payloads
+
+
+def build_cases(args):
+    """Return the benchmark cases as (name, parser, payload, units)."""
+    ipmi_msg = payloads.ipmi_message(args.sensors, seed=args.seed)
+    redfish_msg = payloads.redfish_message(args.sensors, args.extra_fields,
+                                           seed=args.seed)
+    idrac_msg = payloads.idrac_message(args.sensors, args.extra_fields,
+                                       seed=args.seed)
+    ironic_msg = payloads.ironic_metrics_message(args.metric_keys,
+                                                 seed=args.seed)
+    return [
+        ('ipmi.category_registry', ipmi.category_registry,
+         ipmi_msg['payload'], args.sensors),
+        ('redfish.category_registry', redfish.category_registry,
+         redfish_msg['payload'], args.sensors),
+        ('redfish.category_registry[idrac]', redfish.category_registry,
+         idrac_msg['payload'], args.sensors),
+        ('ironic.category_registry', ironic.category_registry,
+         ironic_msg['payload'], args.metric_keys),
+        ('header.timestamp_registry', header.timestamp_registry,
+         ipmi_msg['payload'], 1),
+        ('header.timestamp_conductor_registry',
+         header.timestamp_conductor_registry, ironic_msg['payload'], 1),
+    ]
+
+
+def count_series(parser, payload):
+    registry = CollectorRegistry()
+    parser(payload, registry)
+    return sum(1 for line in generate_latest(registry).splitlines()
+               if not line.startswith(b'#'))
+
+
+def measure(parser, payload, units, iterations, repeat):
+    def parse():
+        parser(payload, CollectorRegistry())
+
+    parse()
+    per_op = min(timeit.repeat(parse, number=iterations,
+                               repeat=repeat)) / iterations
+
+    tracemalloc.start()
+    try:
+        parse()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'ops_per_second': 1 / per_op,
+            'ns_per_op': per_op * 1e9,
+            'ns_per_unit': per_op * 1e9 / units,
+            'units': units,
+            'series': count_series(parser, payload),
+            'peak_bytes': peak}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sensors', type=int, default=240,
+                        help='Sensors in each IPMI, Redfish and iDRAC '
+                             'payload.')
+    parser.add_argument('--extra-fields', type=int, default=3,
+                        help='Entries of the Redfish Extra payload field.')
+    parser.add_argument('--metric-keys', type=int, default=500,
+                        help='Keys of the ironic.metrics payload.')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the generated payloads.')
+    parser.add_argument('--iterations', type=int, default=100,
+                        help='Payloads parsed per measurement.')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Measurements per parser, the best is kept.')
+    parser.add_argument('--filter', default='',
+                        help='Only run the parsers containing this string.')
+    parser.add_argument('--output', default='-',
+                        help='File the JSON results are written to, '
+                             'standard output by default.')
+    args = parser.parse_args()
+
+    results = {}
+    for name, case_parser, payload, units in build_cases(args):
+        if args.filter not in name:
+            continue
+        results[name] = measure(case_parser, payload, units,
+                                args.iterations, args.repeat)
+        print('%s: %.0f ops/s, %.0f ns/unit, %d series, peak %d bytes'
+              % (name, results[name]['ops_per_second'],
+                 results[name]['ns_per_unit'], results[name]['series'],
+                 results[name]['peak_bytes']), file=sys.stderr)
+
+    report = {'metadata': {'python': platform.python_version(),
+                           'revision': git_revision(),
+                           'parameters': {k: v for k, v in vars(args).items()
+                                          if k != 'output'}},
+              'results': results}
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
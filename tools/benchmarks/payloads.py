@@ -0,0 +1,233 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Deterministic synthetic notifications for the benchmarks.
+
+The payloads follow the structure of the samples in
+``ironic_prometheus_exporter/tests/json_samples`` but their size can be
+chosen: sensors per node, IPMI categories, Redfish ``Extra`` fields and
+``ironic.metrics`` keys. The same arguments and seed always build the same
+notification, so results from two checkouts can be compared.
+"""
+
+import random
+import uuid
+
+
+TIMESTAMP = '2019-03-29T20:12:22.989020'
+
+ENTITY_ID = '7.1 (System Board)'
+
+
+def _threshold(unit, low, high, digits=0):
+    def reading(rand):
+        return '%.*f (+/- 0) %s' % (digits, rand.uniform(low, high), unit)
+    return reading
+
+
+def _discrete(rand):
+    return rand.choice(('0h', '0h', '0h', '1h', 'No Reading'))
+
+
+# NOTE: Category: (sensor name, reading generator, threshold sensor).
+IPMI_SENSORS = {
+    'Temperature': ('Temp', _threshold('degrees C', 20, 90), True),
+    'Fan': ('Fan%d%s', _threshold('RPM', 3000, 16000), True),
+    'Current': ('Current', _threshold('Amps', 0, 2, 3), True),
+    'Voltage': ('Voltage', _threshold('Volts', 1, 12, 3), True),
+    'Power': ('PS Status', _discrete, False),
+    'Memory': ('Mem ECC Warning', _discrete, False),
+    'Management': ('Front LED Panel', _discrete, False),
+    'System': ('POST Err', _discrete, False),
+    'Version': ('Hdwr version err', _discrete, False),
+    'Watchdog2': ('OS Watchdog', _discrete, False),
+}
+
+IRONIC_METRIC_KEYS = (
+    'ironic.conductor.manager.ConductorManager.%s',
+    'ironic.conductor.deployments.%s',
+    'ironic.drivers.modules.redfish.power.RedfishPower.%s',
+    'ironic.drivers.modules.redfish.management.RedfishManagement.%s',
+    'ironic.drivers.modules.ipmitool.IPMIPower.%s',
+    'ironic.drivers.modules.agent_base.%s',
+    'ironic.drivers.modules.pxe_base.PXEBaseMixin.%s',
+    'ironic.drivers.modules.drac.raid.DracRedfishRAID.%s',
+    'ironic.api.controllers.v1.node.NodesController.%s',
+)
+
+
+def _node_header(rand, event_type, node):
+    node_uuid = str(uuid.UUID(int=rand.getrandbits(128)))
+    return {
+        'message_id': str(uuid.UUID(int=rand.getrandbits(128))),
+        'instance_uuid': str(uuid.UUID(int=rand.getrandbits(128))),
+        'node_uuid': node_uuid,
+        'timestamp': TIMESTAMP,
+        'node_name': 'node-%d' % node,
+        'event_type': event_type + '.update',
+    }
+
+
+def ipmi_message(sensors=240, categories=None, node=0, seed=0):
+    """Build a ``hardware.ipmi.metrics`` notification.
+
+    :param sensors: Number of sensor entries, spread over the categories
+    :param categories: Names of the IPMI categories to include, all the
+        categories of :data:`IPMI_SENSORS` by default
+    :param node: Index of the node, used for its name
+    :param seed: Seed of the generated values
+    """
+    rand = random.Random('ipmi-%d-%d' % (seed, node))
+    categories = list(categories or IPMI_SENSORS)
+    payload = {category: {} for category in categories}
+    for number in range(sensors):
+        category = categories[number % len(categories)]
+        name, reading, threshold = IPMI_SENSORS[category]
+        index = number // len(categories)
+        if '%' in name:
+            name = name % (index // 2, 'AB'[index % 2])
+        else:
+            name = '%s %d' % (name, index)
+        sensor_id = '%s (0x%x)' % (name, 0x100 + number)
+        data = {
+            'Sensor ID': sensor_id,
+            'Entity ID': ENTITY_ID,
+            'Sensor Reading': reading(rand),
+            'Event Message Control': 'Per-threshold',
+        }
+        if threshold:
+            data['Status'] = 'ok'
+        payload[category][sensor_id] = data
+
+    message = _node_header(rand, 'hardware.ipmi.metrics', node)
+    message['payload'] = payload
+    return {'event_type': 'hardware.ipmi.metrics',
+            'priority': 'INFO',
+            'payload': message}
+
+
+def _redfish_sensor(rand, sensor_type, number):
+    health = rand.choice(('OK', 'OK', 'OK', 'Warning', 'Critical'))
+    if sensor_type == 'Temperature':
+        return '%d@System.Embedded.1' % number, {
+            'identity': str(number),
+            'max_reading_range_temp': 120,
+            'min_reading_range_temp': 0,
+            'physical_context': rand.choice(('CPU', 'SystemBoard')),
+            'reading_celsius': rand.randint(20, 90),
+            'sensor_number': number,
+            'state': 'Enabled',
+            'health': health}
+    if sensor_type == 'Power':
+        return '%d:Power@System.Embedded.1' % number, {
+            'power_capacity_watts': 750,
+            'line_input_voltage': 208,
+            'last_power_output_watts': rand.randint(100, 700),
+            'serial_number': 'SN%012d' % number,
+            'state': 'Enabled',
+            'health': health}
+    if sensor_type == 'Fan':
+        return '%d@System.Embedded.1' % number, {
+            'identity': str(number),
+            'max_reading_range': None,
+            'min_reading_range': None,
+            'reading': rand.randint(3000, 16000),
+            'reading_units': 'RPM',
+            'serial_number': None,
+            'physical_context': 'SystemBoard',
+            'state': 'Enabled',
+            'health': health}
+    name = 'Disk %d in Bay 1' % number
+    return '%s:CPU.1@System.Embedded.1' % name, {
+        'name': name,
+        'model': 'Express Flash NVMe 1.0TB SFF',
+        'capacity_bytes': 1000204886016,
+        'state': 'Enabled',
+        'health': health}
+
+
+def redfish_message(sensors=240, extra_fields=3, node=0, seed=0,
+                    event_type='hardware.redfish.metrics'):
+    """Build a ``hardware.redfish.metrics`` notification.
+
+    :param sensors: Number of sensors, spread over the four sensor types
+    :param extra_fields: Number of entries in the ``Extra`` payload field,
+        each of them becomes a label of every series
+    :param node: Index of the node, used for its name
+    :param seed: Seed of the generated values
+    :param event_type: Event type, ``hardware.idrac.metrics`` for iDRAC
+    """
+    rand = random.Random('%s-%d-%d' % (event_type, seed, node))
+    sensor_types = ('Temperature', 'Power', 'Fan', 'Drive')
+    payload = {sensor_type: {} for sensor_type in sensor_types}
+    for number in range(sensors):
+        sensor_type = sensor_types[number % len(sensor_types)]
+        sensor_id, data = _redfish_sensor(rand, sensor_type, number)
+        payload[sensor_type][sensor_id] = data
+
+    extra = {}
+    for number in range(extra_fields):
+        if number == 0:
+            extra['Manufacturer'] = 'Dell Inc.'
+        elif number == 1:
+            extra['UUID'] = str(uuid.UUID(int=rand.getrandbits(128)))
+        else:
+            extra['Field%d' % number] = 'value-%d' % number
+    if extra:
+        payload['Extra'] = extra
+
+    message = _node_header(rand, event_type, node)
+    message['payload'] = payload
+    return {'event_type': event_type,
+            'priority': 'INFO',
+            'payload': message}
+
+
+def idrac_message(sensors=240, extra_fields=3, node=0, seed=0):
+    """Build a ``hardware.idrac.metrics`` notification."""
+    return redfish_message(sensors, extra_fields, node, seed,
+                           event_type='hardware.idrac.metrics')
+
+
+def ironic_metrics_message(keys=500, conductor=0, seed=0):
+    """Build an ``ironic.metrics`` notification of a conductor.
+
+    :param keys: Number of metric keys, a half of them timers and the rest
+        split between gauges and counters
+    :param conductor: Index of the conductor, used for its hostname
+    :param seed: Seed of the generated values
+    """
+    rand = random.Random('ironic-%d-%d' % (seed, conductor))
+    payload = {}
+    for number in range(keys):
+        key = IRONIC_METRIC_KEYS[number % len(IRONIC_METRIC_KEYS)] % (
+            'method_%d' % number)
+        kind = ('timer', 'gauge', 'timer', 'counter')[number % 4]
+        if kind == 'timer':
+            count = rand.randint(1, 10000)
+            payload[key] = {'count': count,
+                            'sum': count * rand.uniform(0.1, 500),
+                            'type': 'timer'}
+        elif kind == 'gauge':
+            payload[key] = {'value': rand.randint(0, 100), 'type': 'gauge'}
+        else:
+            payload[key] = {'count': rand.randint(0, 10000),
+                            'type': 'counter'}
+
+    return {'event_type': 'ironic.metrics',
+            'priority': 'INFO',
+            'payload': {
+                'message_id': str(uuid.UUID(int=rand.getrandbits(128))),
+                'timestamp': TIMESTAMP,
+                'hostname': 'conductor-%d' % conductor,
+                'event_type': 'ironic.metrics.update',
+                'payload': payload}}
@@ -0,0 +1,254 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark the exporter application on a large metrics directory.
+
+A directory is filled with the files ``PrometheusFileDriver`` writes for N
+nodes, a mix of IPMI and Redfish ones built by ``payloads.py``, then the
+Flask or the plain WSGI application is called by concurrent scrapers
+through ``werkzeug.test.Client``, in a process spawned for it so that the
+notifier driver used to fill the directory does not count. The scrape
+latency percentiles, the bytes served per second, the read and write system
+calls per scrape (from ``/proc/self/io``) and the resident memory of that
+process are written as JSON::
+
+    tox -e venv -- python tools/benchmarks/scrape.py --nodes 10000 --tmpfs
+    tox -e venv -- python tools/benchmarks/scrape.py --nodes 10000 \\
+        --directory /var/tmp/ipe-bench --app minimal
+
+Without ``--tmpfs`` nor ``--directory`` the files are written to the default
+temporary directory. A populated ``--directory`` is reused as is unless
+``--populate`` is given. The page cache is not dropped between scrapes, so
+results on a regular disk are for a warm cache.
+"""
+
+import argparse
+from concurrent import futures
+import importlib
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from werkzeug.test import Client
+
+
+TMPFS = '/dev/shm'
+
+
+def populate(directory, nodes, sensors, ipmi_ratio):
+    """Write the metrics files of ``nodes`` nodes with the notifier driver.
+
+    A single IPMI and a single Redfish payload are generated, each node
+    reuses one of them with its own name and UUIDs, the parsing being what
+    ``PrometheusFileDriver`` does for every node anyway.
+    """
+    # NOTE: imported here so that the process serving the application,
+    # which imports this module, does not load the driver and the parsers.
+    from oslo_config import cfg
+
+    from ironic_prometheus_exporter import messaging
+
+    import payloads
+
+    conf = cfg.ConfigOpts()
+    messaging.register_opts(conf)
+    conf.set_override('location', directory,
+                      group='oslo_messaging_notifications')
+    conf([], project='ironic', default_config_files=[])
+    driver = messaging.PrometheusFileDriver(conf, None, None)
+
+    ipmi_nodes = int(nodes * ipmi_ratio)
+    templates = (payloads.ipmi_message(sensors),
+                 payloads.redfish_message(sensors))
+    for node in range(nodes):
+        template = templates[0] if node < ipmi_nodes else templates[1]
+        message = dict(template)
+        message['payload'] = dict(template['payload'])
+        message['payload']['node_name'] = 'node-%d' % node
+        message['payload']['node_uuid'] = '%08x-0000-4000-8000-%012x' % (
+            node, node)
+        message['payload']['instance_uuid'] = None
+        driver.notify(None, message, 'info', 0)
+
+
+def directory_size(directory):
+    with os.scandir(directory) as entries:
+        return sum(entry.stat().st_size for entry in entries
+                   if entry.is_file())
+
+
+def read_proc_io():
+    counters = {}
+    with open('/proc/self/io') as f:
+        for line in f:
+            name, value = line.split(':')
+            counters[name] = int(value)
+    return counters
+
+
+def read_proc_status(*fields):
+    values = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            name, value = line.split(':', 1)
+            if name in fields:
+                # NOTE: the memory fields are reported in kB.
+                values[name] = int(value.split()[0]) * 1024
+    return values
+
+
+def scraper(application, scrapes, latencies, sizes, errors):
+    client = Client(application)
+    for _ in range(scrapes):
+        start = time.perf_counter()
+        response = client.get('/metrics')
+        size = len(response.get_data())
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+        sizes.append(size)
+
+
+def run(application, scrapers, scrapes):
+    latencies = []
+    sizes = []
+    errors = []
+    threads = [threading.Thread(target=scraper,
+                                args=(application, scrapes, latencies,
+                                      sizes, errors))
+               for _ in range(scrapers)]
+    io_before = read_proc_io()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    io_after = read_proc_io()
+
+    total = len(latencies)
+    percentiles = statistics.quantiles(latencies, n=100,
+                                       method='inclusive')
+    syscalls = (io_after['syscr'] - io_before['syscr']
+                + io_after['syscw'] - io_before['syscw'])
+    memory = read_proc_status('VmRSS', 'VmHWM')
+    return {'scrapes': total,
+            'errors': len(errors),
+            'p50_seconds': percentiles[49],
+            'p99_seconds': percentiles[98],
+            'max_seconds': max(latencies),
+            'scrapes_per_second': total / elapsed,
+            'bytes_per_scrape': sum(sizes) / total,
+            'bytes_per_second': sum(sizes) / elapsed,
+            'syscalls_per_scrape': syscalls / total,
+            'rss_bytes': memory.get('VmRSS'),
+            'peak_rss_bytes': memory.get('VmHWM')}
+
+
+def serve(app, config_file, scrapers, scrapes):
+    """Import and scrape the application, in the process spawned for it."""
+    os.environ['IRONIC_CONFIG'] = config_file
+    module = importlib.import_module(
+        'ironic_prometheus_exporter.app.%s'
+        % ('exporter' if app == 'flask' else 'minimal'))
+    return run(module.application, scrapers, scrapes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nodes', type=int, default=10000,
+                        help='Nodes in the metrics directory.')
+    parser.add_argument('--sensors', type=int, default=60,
+                        help='Sensors of each node.')
+    parser.add_argument('--ipmi-ratio', type=float, default=0.5,
+                        help='Fraction of the nodes using IPMI, the others '
+                             'use Redfish.')
+    parser.add_argument('--app', choices=('flask', 'minimal'),
+                        default='flask',
+                        help='Exporter application to scrape.')
+    parser.add_argument('--scrapers', type=int, default=4,
+                        help='Concurrent scrapers.')
+    parser.add_argument('--scrapes', type=int, default=10,
+                        help='Scrapes done by each scraper.')
+    location = parser.add_mutually_exclusive_group()
+    location.add_argument('--tmpfs', action='store_true',
+                          help='Write the metrics files to %s.' % TMPFS)
+    location.add_argument('--directory',
+                          help='Directory of the metrics files, kept '
+                               'after the run.')
+    parser.add_argument('--populate', action='store_true',
+                        help='Write the metrics files even if --directory '
+                             'already has files.')
+    parser.add_argument('--output', default='-',
+                        help='File the JSON results are written to, '
+                             'standard output by default.')
+    args = parser.parse_args()
+
+    if args.directory:
+        directory = args.directory
+        os.makedirs(directory, exist_ok=True)
+    else:
+        directory = tempfile.mkdtemp(prefix='ipe-bench-',
+                                     dir=TMPFS if args.tmpfs else None)
+
+    config = tempfile.NamedTemporaryFile('w', suffix='.conf', delete=False)
+    try:
+        if args.populate or not os.listdir(directory):
+            start = time.perf_counter()
+            populate(directory, args.nodes, args.sensors, args.ipmi_ratio)
+            print('populated %s with %d nodes in %.1f s'
+                  % (directory, args.nodes, time.perf_counter() - start),
+                  file=sys.stderr)
+
+        with config:
+            config.write('[oslo_messaging_notifications]\n'
+                         'location = %s\n' % directory)
+        with futures.ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context('spawn')) as executor:
+            results = executor.submit(serve, args.app, config.name,
+                                      args.scrapers, args.scrapes).result()
+        results['files'] = len(os.listdir(directory))
+        results['directory_bytes'] = directory_size(directory)
+        print('%s: p50 %.1f ms, p99 %.1f ms, %.1f MB/s, %.0f syscalls per '
+              'scrape, RSS %.1f MB'
+              % (args.app, results['p50_seconds'] * 1000,
+                 results['p99_seconds'] * 1000,
+                 results['bytes_per_second'] / 1e6,
+                 results['syscalls_per_scrape'],
+                 results['rss_bytes'] / 1e6), file=sys.stderr)
+    finally:
+        os.remove(config.name)
+        if not args.directory:
+            shutil.rmtree(directory)
+
+    parameters = {k: v for k, v in vars(args).items() if k != 'output'}
+    report = {'metadata': {'parameters': parameters,
+                           'filesystem': directory if args.directory else
+                           (TMPFS if args.tmpfs else tempfile.gettempdir())},
+              'results': results}
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()